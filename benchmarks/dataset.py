@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+
+__all__ = ("PASSWORD", "ADMIN", "phone", "plate", "owner")
+PASSWORD = "benchmark"
+ADMIN = 1  # The first generated user is an administrator
+
+
+def phone(user: int) -> str:
+    """The phone number (login username) of the `user`-th generated user (1-based)."""
+    return f"07{user:09}"
+
+
+def plate(vehicle: int) -> str:
+    """The plate of the `vehicle`-th generated vehicle (1-based)."""
+    return f"BM{vehicle:07}"
+
+
+def owner(vehicle: int, users: int) -> int:
+    """The index of the generated user owning the `vehicle`-th generated vehicle."""
+    return (vehicle - 1) % users + 1
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, TYPE_CHECKING
+
+from server.database import Database
+from server.utils import hash_password
+
+from .dataset import PASSWORD
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        users: int
+        vehicles: int
+        violations: int
+        refutations: float
+        transactions: float
+        detected: int
+        days: int
+        batch_size: int
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Generate a benchmark dataset with set-based inserts. The target database should not contain other data.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--users", type=int, default=10000, help="The number of users to generate")
+__parser.add_argument("--vehicles", type=int, default=20000, help="The number of vehicles to generate")
+__parser.add_argument("--violations", type=int, default=100000, help="The number of violations to generate")
+__parser.add_argument("--refutations", type=float, default=0.2, help="The number of refutations, as a ratio of the number of violations")
+__parser.add_argument("--transactions", type=float, default=0.3, help="The number of transactions, as a ratio of the number of violations")
+__parser.add_argument("--detected", type=int, default=10000, help="The number of detected violations to generate")
+__parser.add_argument("--days", type=int, default=365, help="Spread the creation time of the generated rows over this many days until now")
+__parser.add_argument("--batch-size", type=int, default=100000, help="The number of rows inserted by a single statement")
+__parser.parse_args(namespace=namespace)
+
+
+# Row numbers n = 1, 2, ... of a batch, generated without touching any user table
+TALLY = """WITH tally AS (
+    SELECT TOP ({count}) CAST({offset} + ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS BIGINT) AS n
+    FROM sys.all_columns a CROSS JOIN sys.all_columns b
+)
+"""
+
+
+def plate_sql(vehicle: str) -> str:
+    return f"'BM' + RIGHT('0000000' + CAST({vehicle} AS VARCHAR(7)), 7)"
+
+
+async def main() -> None:
+    users = namespace.users
+    vehicles = namespace.vehicles
+    violations = namespace.violations
+    refutations = min(violations, round(violations * namespace.refutations))
+    transactions = min(violations, round(violations * namespace.transactions))
+    detected = namespace.detected
+    if min(users, vehicles, violations) < 1:
+        raise ValueError("At least 1 user, vehicle and violation must be generated")
+
+    async with Database.instance.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT value FROM IT3930_ConfigDateTime2 WHERE name = 'epoch'")
+            epoch: datetime = await cursor.fetchval()
+
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            span_ms = namespace.days * 86400000
+            start_ms = (now - epoch) // timedelta(milliseconds=1) - span_ms
+
+            def id_sql(kind: int, n: str, total: int) -> str:
+                # Same layout as SnowflakeGenerator, with the worker bits identifying the table so that IDs never collide.
+                # Rows are spread evenly over the time span, at most 1024 rows per millisecond.
+                return f"(({start_ms} + ({n} - 1) * {span_ms} / {total}) * 65536 + {kind} * 1024 + ({n} - 1) % 1024)"
+
+            admin_id = id_sql(1, "1", users)
+
+            async def insert(table: str, total: int, statement: str, *params: Any) -> None:
+                start = time.perf_counter()
+                for offset in range(0, total, namespace.batch_size):
+                    count = min(namespace.batch_size, total - offset)
+                    await cursor.execute(TALLY.format(count=count, offset=offset) + statement, *params)
+                    elapsed = time.perf_counter() - start
+                    done = offset + count
+                    print(f"{table}: {done}/{total} rows ({done / elapsed:.0f} rows/s)", file=sys.stderr)
+
+            await insert(
+                "IT3930_Users",
+                users,
+                f"""INSERT INTO IT3930_Users (id, fullname, phone, permissions, hashed_password)
+                SELECT {id_sql(1, "n", users)}, N'Benchmark user ' + CAST(n AS NVARCHAR(16)),
+                    '07' + RIGHT('000000000' + CAST(n AS VARCHAR(9)), 9), IIF(n = 1, 1, 0), ?
+                FROM tally""",
+                hash_password(PASSWORD),
+            )
+            await insert(
+                "IT3930_Vehicles",
+                vehicles,
+                f"""INSERT INTO IT3930_Vehicles (plate, user_id)
+                SELECT {plate_sql("n")}, {id_sql(1, f"(n - 1) % {users} + 1", users)}
+                FROM tally""",
+            )
+            await insert(
+                "IT3930_Violations",
+                violations,
+                f"""INSERT INTO IT3930_Violations (id, creator_id, category, plate, fine_vnd, video_url)
+                SELECT {id_sql(2, "n", violations)}, {admin_id}, n % 3, {plate_sql(f"(n - 1) % {vehicles} + 1")},
+                    (n * 7919 % 5900 + 100) * 1000, N'https://files.catbox.moe/t32ctt.mp4'
+                FROM tally""",
+            )
+            if refutations > 0:
+                await insert(
+                    "IT3930_Refutations",
+                    refutations,
+                    f"""INSERT INTO IT3930_Refutations (id, violation_id, user_id, message, response)
+                    SELECT {id_sql(3, "n", refutations)}, {id_sql(2, "v.violation", violations)},
+                        {id_sql(1, f"((v.violation - 1) % {vehicles}) % {users} + 1", users)},
+                        N'Benchmark refutation ' + CAST(n AS NVARCHAR(16)), NULL
+                    FROM tally
+                    CROSS APPLY (SELECT (n - 1) * {violations} / {refutations} + 1 AS violation) v""",
+                )
+            if transactions > 0:
+                await insert(
+                    "IT3930_Transactions",
+                    transactions,
+                    f"""INSERT INTO IT3930_Transactions (id, violation_id, user_id)
+                    SELECT {id_sql(4, "n", transactions)}, {id_sql(2, "v.violation", violations)},
+                        {id_sql(1, f"((v.violation - 1) % {vehicles}) % {users} + 1", users)}
+                    FROM tally
+                    CROSS APPLY (SELECT (n - 1) * {violations} / {transactions} + 1 AS violation) v""",
+                )
+            if detected > 0:
+                await insert(
+                    "IT3930_Detected",
+                    detected,
+                    f"""INSERT INTO IT3930_Detected (id, category, plate, video_url)
+                    SELECT {id_sql(5, "n", detected)}, n % 3, {plate_sql(f"(n - 1) % {vehicles} + 1")},
+                        N'https://files.catbox.moe/t32ctt.mp4'
+                    FROM tally""",
+                )
+
+            # The counters are not maintained by the bulk inserts above
+            start = time.perf_counter()
+            await cursor.execute(
+                """UPDATE vl SET refutations_count = ISNULL(r.count, 0)
+                FROM IT3930_Violations vl
+                LEFT JOIN (SELECT violation_id, COUNT(*) AS count FROM IT3930_Refutations GROUP BY violation_id) r ON r.violation_id = vl.id
+
+                UPDATE vh SET violations_count = ISNULL(vl.count, 0)
+                FROM IT3930_Vehicles vh
+                LEFT JOIN (SELECT plate, COUNT(*) AS count FROM IT3930_Violations GROUP BY plate) vl ON vl.plate = vh.plate
+
+                UPDATE u SET vehicles_count = ISNULL(vh.vehicles_count, 0), violations_count = ISNULL(vh.violations_count, 0)
+                FROM IT3930_Users u
+                LEFT JOIN (
+                    SELECT user_id, COUNT(*) AS vehicles_count, SUM(violations_count) AS violations_count
+                    FROM IT3930_Vehicles
+                    GROUP BY user_id
+                ) vh ON vh.user_id = u.id""",
+            )
+            print(f"Counters updated in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    await Database.instance.close()
+
+
+asyncio.run(main())
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Dict, List, Optional, TYPE_CHECKING
+
+import httpx
+
+from server.config import PORT
+
+from .dataset import ADMIN, PASSWORD, owner, phone, plate
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        base_url: str
+        workloads: List[str]
+        concurrency: int
+        duration: float
+        warmup: float
+        users: int
+        vehicles: int
+        seed: int
+        output: Optional[Path]
+        baseline: Optional[Path]
+
+
+WORKLOADS = ("auth", "list-by-plate", "list-violations", "create-detected", "refutation")
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Run HTTP workloads against a running API server (on a dataset created by benchmarks.generate) and report latency percentiles and throughput",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--base-url", type=str, default=f"http://localhost:{PORT}", help="The base URL of the API server")
+__parser.add_argument("--workloads", type=str, nargs="+", choices=WORKLOADS, default=list(WORKLOADS), help="The workloads to run, one after another")
+__parser.add_argument("--concurrency", type=int, default=32, help="The number of concurrent clients")
+__parser.add_argument("--duration", type=float, default=30.0, help="The measured duration of each workload in seconds")
+__parser.add_argument("--warmup", type=float, default=5.0, help="Run each workload for this many seconds before measuring")
+__parser.add_argument("--users", type=int, default=10000, help="The number of generated users (see benchmarks.generate)")
+__parser.add_argument("--vehicles", type=int, default=20000, help="The number of generated vehicles (see benchmarks.generate)")
+__parser.add_argument("--seed", type=int, default=0, help="The random seed")
+__parser.add_argument("--output", type=Path, required=False, help="Write the report to this JSON file")
+__parser.add_argument("--baseline", type=Path, required=False, help="Compare the report with a JSON file written by a previous run")
+__parser.parse_args(namespace=namespace)
+
+
+class Recorder:
+    """Collect the latency (in seconds) of each request, grouped by operation."""
+
+    __slots__ = ("enabled", "latencies", "errors")
+    if TYPE_CHECKING:
+        enabled: bool
+        latencies: Dict[str, List[float]]
+        errors: Dict[str, int]
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, operation: str, request: Awaitable[httpx.Response]) -> Optional[httpx.Response]:
+        """Send a request and record its latency. Return `None` if the request failed."""
+        start = time.perf_counter()
+        try:
+            response = await request
+            response.raise_for_status()
+        except httpx.HTTPError:
+            if self.enabled:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+            return None
+
+        if self.enabled:
+            self.latencies.setdefault(operation, []).append(time.perf_counter() - start)
+
+        return response
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return float("nan")
+
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+async def login(client: httpx.AsyncClient, user: int) -> Dict[str, str]:
+    response = await client.post("/users/login", data={"username": phone(user), "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run(workload: str, client: httpx.AsyncClient, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    admin = await login(client, ADMIN)
+    # Tokens of vehicle owners, logged in once so that the refutation workload measures the refutation flow only
+    owners: Dict[int, Dict[str, str]] = {}
+    recorder = Recorder()
+
+    async def step() -> None:
+        vehicle = rng.randint(1, namespace.vehicles)
+        if workload == "auth":
+            response = await recorder.request(
+                "POST /users/login",
+                client.post("/users/login", data={"username": phone(rng.randint(1, namespace.users)), "password": PASSWORD}),
+            )
+            if response is not None:
+                headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+                await recorder.request("GET /users/@me", client.get("/users/@me", headers=headers))
+
+        elif workload == "list-by-plate":
+            await recorder.request("GET /violations/{plate}", client.get(f"/violations/{plate(vehicle)}"))
+
+        elif workload == "list-violations":
+            await recorder.request("GET /violations/", client.get("/violations/", headers=admin))
+
+        elif workload == "create-detected":
+            await recorder.request(
+                "POST /detected/",
+                client.post(
+                    "/detected/",
+                    params={
+                        "detected_category": rng.randint(0, 2),
+                        "vehicle_plate": plate(vehicle),
+                        "detected_video_url": "https://files.catbox.moe/t32ctt.mp4",
+                    },
+                ),
+            )
+
+        elif workload == "refutation":
+            user = owner(vehicle, namespace.users)
+            if user not in owners:
+                owners[user] = await login(client, user)
+
+            response = await recorder.request(
+                "GET /violations/{plate}",
+                client.get(f"/violations/{plate(vehicle)}", params={"limit": 1}),
+            )
+            if response is None or not response.json():
+                return
+
+            response = await recorder.request(
+                "POST /refutations/",
+                client.post(
+                    "/refutations/",
+                    headers=owners[user],
+                    json={"violation_id": response.json()[0]["id"], "message": "Benchmark refutation"},
+                ),
+            )
+            if response is not None:
+                await recorder.request(
+                    "POST /refutations/response",
+                    client.post("/refutations/response", headers=admin, json={"refutation_id": response.json(), "response": "Benchmark response"}),
+                )
+
+    async def worker(until: float) -> None:
+        while time.perf_counter() < until:
+            await step()
+
+    if namespace.warmup > 0:
+        await asyncio.gather(*(worker(time.perf_counter() + namespace.warmup) for _ in range(namespace.concurrency)))
+
+    recorder.enabled = True
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(start + namespace.duration) for _ in range(namespace.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    report: Dict[str, Dict[str, float]] = {}
+    for operation in sorted(recorder.latencies.keys() | recorder.errors.keys()):
+        latencies = sorted(recorder.latencies.get(operation, []))
+        report[operation] = {
+            "count": len(latencies),
+            "errors": recorder.errors.get(operation, 0),
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p90_ms": 1000 * percentile(latencies, 90),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "max_ms": 1000 * latencies[-1] if latencies else float("nan"),
+        }
+
+    return report
+
+
+def print_report(
+    reports: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Optional[Dict[str, Dict[str, Dict[str, float]]]],
+) -> None:
+    print(f"{'workload':<16} {'operation':<28} {'count':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for workload, report in reports.items():
+        for operation, r in report.items():
+            print(
+                f"{workload:<16} {operation:<28} {r['count']:>8.0f} {r['errors']:>6.0f} {r['throughput']:>9.1f} "
+                f"{r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}"
+            )
+
+            if baseline is not None:
+                try:
+                    b = baseline[workload][operation]
+                except KeyError:
+                    continue
+
+                def change(key: str) -> str:
+                    return f"{100 * (r[key] / b[key] - 1):>+8.1f}%" if b[key] else f"{'n/a':>9}"
+
+                print(
+                    f"{'':<16} {'  vs. baseline':<28} {'':>8} {'':>6} {change('throughput')} "
+                    f"{change('p50_ms')} {change('p90_ms')} {change('p99_ms')} {change('max_ms')}"
+                )
+
+
+async def main() -> None:
+    rng = random.Random(namespace.seed)
+    limits = httpx.Limits(max_connections=namespace.concurrency, max_keepalive_connections=namespace.concurrency)
+    reports: Dict[str, Dict[str, Dict[str, float]]] = {}
+    async with httpx.AsyncClient(base_url=namespace.base_url, limits=limits, timeout=60.0) as client:
+        for workload in namespace.workloads:
+            print(f"Running {workload!r} ({namespace.concurrency} clients, {namespace.duration}s)...", file=sys.stderr)
+            reports[workload] = await run(workload, client, rng)
+
+    baseline = None
+    if namespace.baseline is not None:
+        baseline = json.loads(namespace.baseline.read_text(encoding="utf-8"))
+
+    print_report(reports, baseline)
+    if namespace.output is not None:
+        namespace.output.write_text(json.dumps(reports, indent=4), encoding="utf-8")
+
+
+asyncio.run(main())
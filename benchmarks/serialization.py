@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+from collections import namedtuple
+from typing import Any, Callable, List, TYPE_CHECKING
+
+from pydantic import TypeAdapter
+
+from server.models import Projection, Violation
+from server.utils import json_response
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        sizes: List[int]
+        repeat: int
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Measure the per-row cost of turning view_violations rows into a JSON response, with and without validation",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000], help="The numbers of rows per response")
+__parser.add_argument("--repeat", type=int, default=5, help="Keep the best of this many measurements")
+__parser.parse_args(namespace=namespace)
+
+
+# Rows of pyodbc support both attribute and index access, just like named tuples
+FakeRow = namedtuple(  # type: ignore[misc]
+    "FakeRow",
+    "violation_id creator_id creator_fullname creator_phone creator_permissions creator_vehicles_count creator_violations_count "
+    "violation_category violation_fine_vnd violation_video_url violation_refutations_count vehicle_plate vehicle_violations_count "
+    "user_id user_fullname user_phone user_permissions user_vehicles_count user_violations_count",
+)
+ADAPTER = TypeAdapter(List[Violation])
+
+
+def make_rows(count: int) -> List[Any]:
+    return [
+        FakeRow(
+            (1 << 40) + (i << 16), 1 << 32, "Nguyễn Văn A", "0900000000", 1, 3, 7,
+            i % 3, 1000000, "https://files.catbox.moe/t32ctt.mp4", i % 4, f"29T1-{i:05}", 4,
+            (1 << 33) + i, "Trần Thị B", f"09{i:08}", 0, 2, 4,
+        )
+        for i in range(count)
+    ]
+
+
+def fastapi_response(result: List[Violation]) -> bytes:
+    """What FastAPI does with a returned list: validate it against the response model, dump it to Python objects, then encode it."""
+    content = ADAPTER.dump_python(ADAPTER.validate_python(result), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def measure(func: Callable[[], Any], rows: int) -> float:
+    """Best time per row in microseconds."""
+    number = max(1, 20000 // rows)
+    return 1e6 * min(timeit.repeat(func, number=number, repeat=namespace.repeat)) / number / rows
+
+
+def main() -> None:
+    projection = Projection(Violation.COLUMNS, None, key="violation_id")
+    print(f"{'rows':>6} {'path':<40} {'us/row':>8}")
+    for size in namespace.sizes:
+        rows = make_rows(size)
+        # `Projection` selects only the columns it needs, in its own order
+        projected = [tuple(getattr(row, column) for column in projection.sql.split(", ")) for row in rows]
+        models = [Violation.from_row(row) for row in rows]
+        assert json.loads(fastapi_response(models)) == json.loads(bytes(projection.page(projected, size).to_response().body))
+
+        paths = {
+            "from_row + response_model validation": lambda: fastapi_response([Violation.from_row(row) for row in rows]),
+            "from_row + json_response": lambda: json_response([Violation.from_row(row) for row in rows]),
+            "Projection + json_response": lambda: projection.page(projected, size).to_response(),
+        }
+        for name, func in paths.items():
+            print(f"{size:>6} {name:<40} {measure(func, size):>8.2f}")
+
+
+main()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from typing import TYPE_CHECKING
+
+from server.database import Database
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        repair: bool
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Verify the denormalized counters (vehicles, violations and refutations counts) against the base tables",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--repair", action="store_true", help="Overwrite drifted counters with the recomputed values")
+__parser.parse_args(namespace=namespace)
+
+
+async def main() -> int:
+    pool = await Database.instance.pool()
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("EXECUTE verify_counters @Repair = ?", namespace.repair)
+            rows = await cursor.fetchall()
+
+    await Database.instance.close()
+
+    for row in rows:
+        key = row.plate if row.id is None else row.id
+        print(f"{row.counter}[{key}]: stored {row.stored}, expected {row.expected}")
+
+    if not rows:
+        print("All counters are consistent.", file=sys.stderr)
+        return 0
+
+    if namespace.repair:
+        print(f"Repaired {len(rows)} counter(s).", file=sys.stderr)
+        return 0
+
+    print(f"Found {len(rows)} drifted counter(s). Run again with --repair to fix them.", file=sys.stderr)
+    return 1
+
+
+sys.exit(asyncio.run(main()))
@@ -9,7 +9,7 @@ import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 
 from server.app import app
-from server.config import PORT
+from server.config import NEXT_CURSOR_HEADER, PORT, READ_PRIMARY_HEADER
 
 
 class __Namespace(argparse.Namespace):
@@ -28,7 +28,12 @@ __parser = argparse.ArgumentParser(
 )
 __parser.add_argument("--host", type=str, default="0.0.0.0", help="The host to bind the HTTP server to")
 __parser.add_argument("--port", type=int, default=PORT, help="The port to bind the HTTP server to")
-__parser.add_argument("--workers", type=int, required=False, help="The number of worker processes to run")
+__parser.add_argument(
+    "--workers",
+    type=int,
+    required=False,
+    help="The number of worker processes to run (each one opens up to MSSQL_POOL_MAX_SIZE database connections)",
+)
 __parser.add_argument("--log-level", type=str, default="debug", help="The log level for the application")
 __parser.add_argument("--cors", action="store_true", help="Enable CORS for the HTTP server")
 
@@ -42,6 +47,7 @@ if namespace.cors:
         allow_methods=["*"],
         allow_headers=["*"],
         allow_credentials=False,
+        expose_headers=[NEXT_CURSOR_HEADER, READ_PRIMARY_HEADER, "ETag"],
     )
 
 
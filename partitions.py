@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING
+
+from server.config import PARTITION_MONTHS_AHEAD
+from server.database import Database
+from server.partitions import PartitionExtender
+from server.utils import snowflake_range, snowflake_time
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        months_ahead: int
+        archive_before: Optional[datetime]
+
+
+def __utc(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Maintain the monthly partitions of violations, detected violations and transactions (the API server also "
+    "extends them every PARTITION_EXTEND_INTERVAL seconds)",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="Create empty partitions for this many months after the current one")
+__parser.add_argument(
+    "--archive-before",
+    type=__utc,
+    default=None,
+    help="Switch the partitions of detected violations created entirely before this ISO date (UTC by default) out to "
+    "IT3930_DetectedArchive",
+)
+__parser.parse_args(namespace=namespace)
+
+
+async def main() -> None:
+    for boundary in await PartitionExtender.extend(namespace.months_ahead):
+        print(f"Created partition from {snowflake_time(boundary).isoformat()}", file=sys.stderr)
+
+    pool = await Database.instance.pool()
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            if namespace.archive_before is not None:
+                before_id = snowflake_range(namespace.archive_before, None)[0]
+                await cursor.execute("EXECUTE archive_detected @BeforeId = ?", before_id)
+                rows = await cursor.fetchall()
+                for row in rows:
+                    print(
+                        f"Archived partition {row.partition_number} (before {snowflake_time(row.boundary).isoformat()}): {row.rows} row(s)",
+                        file=sys.stderr,
+                    )
+
+                if not rows:
+                    print("No partition of detected violations to archive.", file=sys.stderr)
+
+    await Database.instance.close()
+
+
+asyncio.run(main())
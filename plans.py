@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from typing import TYPE_CHECKING
+
+from server.database import Database
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        top: int
+        max_plans: int
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Report the cached query plans of this database, to check that statement shapes stay few and reused",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--top", type=int, default=20, help="The number of statements to list, by number of cached plans")
+__parser.add_argument("--max-plans", type=int, default=0, help="Exit with status 1 if more plans are cached (0 to disable)")
+__parser.parse_args(namespace=namespace)
+
+
+# Plans of parameterized statements (sp_executesql) have no database ID in their SQL text, only in their attributes
+PLANS = """
+WITH plans AS (
+    SELECT p.plan_handle, p.objtype, p.usecounts, p.size_in_bytes
+    FROM sys.dm_exec_cached_plans p
+    CROSS APPLY sys.dm_exec_plan_attributes(p.plan_handle) a
+    WHERE a.attribute = 'dbid' AND CAST(a.value AS INT) = DB_ID()
+)
+"""
+SUMMARY = PLANS + """
+SELECT objtype, COUNT(*) AS plans, SUM(CAST(usecounts AS BIGINT)) AS uses, SUM(CAST(size_in_bytes AS BIGINT)) AS bytes
+FROM plans
+GROUP BY objtype
+ORDER BY plans DESC
+"""
+STATEMENTS = PLANS + """
+SELECT TOP (?)
+    s.query_hash,
+    COUNT(DISTINCT s.plan_handle) AS plans,
+    SUM(s.execution_count) AS executions,
+    SUM(s.total_worker_time) / SUM(s.execution_count) AS cpu_us,
+    MIN(LEFT(REPLACE(REPLACE(t.text, CHAR(13), ' '), CHAR(10), ' '), 120)) AS sample
+FROM sys.dm_exec_query_stats s
+INNER JOIN plans p ON p.plan_handle = s.plan_handle
+CROSS APPLY sys.dm_exec_sql_text(s.sql_handle) t
+GROUP BY s.query_hash
+ORDER BY plans DESC, executions DESC
+"""
+
+
+async def main() -> int:
+    pool = await Database.instance.pool()
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(SUMMARY)
+            summary = await cursor.fetchall()
+            await cursor.execute(STATEMENTS, namespace.top)
+            statements = await cursor.fetchall()
+
+    await Database.instance.close()
+
+    total = sum(row.plans for row in summary)
+    for row in summary:
+        print(f"{row.objtype}: {row.plans} plan(s), {row.uses} use(s), {row.bytes / 1024:.0f} KiB")
+
+    print(f"Total: {total} plan(s)")
+    print()
+    for row in statements:
+        print(f"{row.plans:>4} plan(s) {row.executions:>10} execution(s) {row.cpu_us:>8} us/execution  {row.sample}")
+
+    if namespace.max_plans > 0 and total > namespace.max_plans:
+        print(f"{total} cached plans exceed the limit of {namespace.max_plans}.", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+sys.exit(asyncio.run(main()))
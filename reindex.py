@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, Dict, List, TYPE_CHECKING
+
+from server.database import Database
+from server.search import terms
+
+
+class __Namespace(argparse.Namespace):
+    if TYPE_CHECKING:
+        batch_size: int
+
+
+namespace = __Namespace()
+__parser = argparse.ArgumentParser(
+    description="Rebuild the search index of refutation messages and responses, e.g. for refutations inserted without the API",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+__parser.add_argument("--batch-size", type=int, default=1000, help="The number of refutations to index per transaction")
+__parser.parse_args(namespace=namespace)
+
+
+REINDEX = """
+SET XACT_ABORT ON
+BEGIN TRANSACTION
+    DELETE FROM IT3930_RefutationTerms
+    WHERE refutation_id BETWEEN ? AND ?
+
+    INSERT INTO IT3930_RefutationTerms (term, refutation_id, field, weight)
+    SELECT term, id, field, SUM(weight)
+    FROM OPENJSON(?) WITH (id BIGINT, field TINYINT, term NVARCHAR(64), weight INT)
+    GROUP BY id, field, term
+COMMIT TRANSACTION
+"""
+
+
+async def main() -> None:
+    pool = await Database.instance.pool()
+    indexed = 0
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            last_id = -1
+            while True:
+                await cursor.execute(
+                    "SELECT TOP (?) id, message, response FROM IT3930_Refutations WHERE id > ? ORDER BY id",
+                    namespace.batch_size, last_id,
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+
+                postings: List[Dict[str, Any]] = []
+                for row in rows:
+                    for field, text in enumerate((row.message, row.response)):
+                        if text is not None:
+                            postings.extend(
+                                {"id": row.id, "field": field, "term": term, "weight": weight}
+                                for term, weight in terms(text).items()
+                            )
+
+                await cursor.execute(REINDEX, rows[0].id, rows[-1].id, json.dumps(postings, ensure_ascii=False))
+
+                last_id = rows[-1].id
+                indexed += len(rows)
+                print(f"Indexed {indexed} refutation(s)...", file=sys.stderr)
+
+    await Database.instance.close()
+
+
+asyncio.run(main())
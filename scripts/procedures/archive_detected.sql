@@ -0,0 +1,42 @@
+CREATE OR ALTER PROCEDURE archive_detected
+    @BeforeId BIGINT  /* Partitions whose IDs are all lower than this one are archived */
+AS
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Partition INT
+    DECLARE @Archived TABLE (partition_number INT, boundary BIGINT, rows BIGINT)
+
+    /* With RANGE RIGHT, partition N holds the IDs lower than boundary N. A switch needs an empty target partition:
+       DetectedRetention only archives whole months, so this only skips months that purge_detected moved row by row
+       before, which it then finishes. */
+    INSERT INTO @Archived (partition_number, boundary, rows)
+    SELECT p.partition_number, CAST(rv.value AS BIGINT), p.rows
+    FROM sys.partitions p
+    INNER JOIN sys.partition_functions pf ON pf.name = 'PF_IT3930_Month'
+    INNER JOIN sys.partition_range_values rv ON rv.function_id = pf.function_id AND rv.boundary_id = p.partition_number
+    WHERE p.object_id = OBJECT_ID('IT3930_Detected') AND p.index_id = 1 AND p.rows > 0 AND CAST(rv.value AS BIGINT) <= @BeforeId
+    AND NOT EXISTS (
+        SELECT 1
+        FROM sys.partitions a
+        WHERE a.object_id = OBJECT_ID('IT3930_DetectedArchive') AND a.index_id = 1 AND a.partition_number = p.partition_number AND a.rows > 0
+    )
+
+    /* Each switch only changes metadata, the rows are not copied */
+    DECLARE archived CURSOR LOCAL FAST_FORWARD FOR
+        SELECT partition_number FROM @Archived ORDER BY partition_number
+
+    OPEN archived
+    FETCH NEXT FROM archived INTO @Partition
+    WHILE @@FETCH_STATUS = 0
+    BEGIN
+        ALTER TABLE IT3930_Detected SWITCH PARTITION @Partition TO IT3930_DetectedArchive PARTITION @Partition
+        FETCH NEXT FROM archived INTO @Partition
+    END
+
+    CLOSE archived
+    DEALLOCATE archived
+
+    SELECT partition_number, boundary, rows FROM @Archived ORDER BY partition_number
+END
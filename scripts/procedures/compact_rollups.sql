@@ -0,0 +1,88 @@
+CREATE OR ALTER PROCEDURE compact_rollups
+    @Lookback INT = 2  /* Hours before the current one that are recomputed, to catch rows committed late */
+AS
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    /* Snowflake IDs of an hour: 3600000 milliseconds, shifted by the 16 bits of worker ID and sequence */
+    DECLARE @HourIds BIGINT = 235929600000
+
+    DECLARE @Epoch DATETIME2
+    SELECT @Epoch = value FROM IT3930_ConfigDateTime2 WHERE name = 'epoch'
+
+    DECLARE @Now INT = DATEDIFF_BIG(MILLISECOND, @Epoch, SYSUTCDATETIME()) / 3600000
+    DECLARE @From INT
+    DECLARE @Result INT
+    DECLARE @Hours TABLE (hour INT PRIMARY KEY)
+
+    BEGIN TRANSACTION
+        /* Other processes skip their compaction instead of waiting, the running one covers the same hours */
+        EXECUTE @Result = sp_getapplock @Resource = 'IT3930_Rollups', @LockMode = 'Exclusive', @LockOwner = 'Transaction', @LockTimeout = 0
+        IF @Result < 0
+        BEGIN
+            ROLLBACK TRANSACTION
+            SELECT CAST(0 AS BIT) AS compacted, 0 AS hours
+            RETURN
+        END
+
+        SELECT @From = value FROM IT3930_ConfigBigInt WHERE name = 'rollups_watermark'
+        IF @From > @Now - @Lookback
+            SET @From = @Now - @Lookback
+
+        IF @From < 0
+            SET @From = 0
+
+        /* Claimed before the base tables are read: deletes committed later mark their hours again */
+        DELETE FROM IT3930_RollupsDirty
+        OUTPUT DELETED.hour INTO @Hours
+
+        ;WITH recent AS (
+            SELECT @From AS hour
+            UNION ALL
+            SELECT hour + 1 FROM recent WHERE hour <= @Now
+        )
+        INSERT INTO @Hours (hour)
+        SELECT r.hour
+        FROM recent r
+        WHERE NOT EXISTS (SELECT 1 FROM @Hours h WHERE h.hour = r.hour)
+        OPTION (MAXRECURSION 0)
+
+        DELETE r
+        FROM IT3930_ViolationsHourly r
+        INNER JOIN @Hours h ON h.hour = r.hour
+
+        INSERT INTO IT3930_ViolationsHourly (hour, category, violations_count, fines_vnd)
+        SELECT h.hour, vl.category, COUNT(*), SUM(vl.fine_vnd)
+        FROM @Hours h
+        INNER JOIN IT3930_Violations vl ON vl.id >= h.hour * @HourIds AND vl.id < (h.hour + 1) * @HourIds
+        GROUP BY h.hour, vl.category
+
+        DELETE r
+        FROM IT3930_DetectedHourly r
+        INNER JOIN @Hours h ON h.hour = r.hour
+
+        INSERT INTO IT3930_DetectedHourly (hour, category, detected_count)
+        SELECT h.hour, d.category, COUNT(*)
+        FROM @Hours h
+        INNER JOIN IT3930_Detected d ON d.id >= h.hour * @HourIds AND d.id < (h.hour + 1) * @HourIds
+        GROUP BY h.hour, d.category
+
+        DELETE r
+        FROM IT3930_TransactionsHourly r
+        INNER JOIN @Hours h ON h.hour = r.hour
+
+        INSERT INTO IT3930_TransactionsHourly (hour, transactions_count, paid_vnd)
+        SELECT h.hour, COUNT(*), SUM(vl.fine_vnd)
+        FROM @Hours h
+        INNER JOIN IT3930_Transactions t ON t.id >= h.hour * @HourIds AND t.id < (h.hour + 1) * @HourIds
+        INNER JOIN IT3930_Violations vl ON vl.id = t.violation_id
+        GROUP BY h.hour
+
+        UPDATE IT3930_ConfigBigInt
+        SET value = @Now - @Lookback
+        WHERE name = 'rollups_watermark' AND value < @Now - @Lookback
+    COMMIT TRANSACTION
+
+    SELECT CAST(1 AS BIT) AS compacted, COUNT(*) AS hours FROM @Hours
+END
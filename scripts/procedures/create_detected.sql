@@ -1,13 +1,14 @@
 CREATE OR ALTER PROCEDURE create_detected
     @Category TINYINT,
     @Plate VARCHAR(12),
-    @VideoUrl NVARCHAR(2048)
+    @VideoUrl NVARCHAR(2048),
+    @Id BIGINT = NULL  /* Generated by generate_id if not provided */
 AS
 BEGIN
     SET NOCOUNT ON
 
-    DECLARE @Id BIGINT
-    EXECUTE generate_id @Id = @Id OUTPUT
+    IF @Id IS NULL
+        EXECUTE generate_id @Id = @Id OUTPUT
 
     INSERT INTO IT3930_Detected (id, category, plate, video_url)
     OUTPUT INSERTED.id
@@ -0,0 +1,13 @@
+CREATE OR ALTER PROCEDURE create_detected_batch
+    @Items DetectedBatch READONLY
+AS
+BEGIN
+    SET NOCOUNT ON
+
+    /* Items with an unknown plate are skipped and have no row in the result set */
+    INSERT INTO IT3930_Detected (id, category, plate, video_url)
+    OUTPUT INSERTED.id
+    SELECT i.id, i.category, i.plate, i.video_url
+    FROM @Items i
+    WHERE EXISTS (SELECT 1 FROM IT3930_Vehicles vh WHERE vh.plate = i.plate)
+END
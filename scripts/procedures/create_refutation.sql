@@ -1,15 +1,33 @@
 CREATE OR ALTER PROCEDURE create_refutation
     @ViolationId BIGINT,
     @UserId BIGINT,
-    @Message NVARCHAR(MAX)
+    @Message NVARCHAR(MAX),
+    @Id BIGINT = NULL,  /* Generated by generate_id if not provided */
+    @Terms NVARCHAR(MAX) = NULL  /* JSON array of {"term", "weight"} objects of the message, see server/search.py */
 AS
 BEGIN
     SET NOCOUNT ON
+    SET XACT_ABORT ON
 
-    DECLARE @Id BIGINT
-    EXECUTE generate_id @Id = @Id OUTPUT
+    IF @Id IS NULL
+        EXECUTE generate_id @Id = @Id OUTPUT
 
-    INSERT INTO IT3930_Refutations (id, violation_id, user_id, message, response)
-    OUTPUT INSERTED.id
-    VALUES (@Id, @ViolationId, @UserId, @Message, NULL)
+    BEGIN TRANSACTION
+        INSERT INTO IT3930_Refutations (id, violation_id, user_id, message, response)
+        VALUES (@Id, @ViolationId, @UserId, @Message, NULL)
+
+        UPDATE IT3930_Violations
+        SET refutations_count = refutations_count + 1
+        WHERE id = @ViolationId
+
+        INSERT INTO IT3930_RefutationTerms (term, refutation_id, field, weight)
+        SELECT term, @Id, 0, SUM(weight)
+        FROM OPENJSON(@Terms) WITH (term NVARCHAR(64), weight INT)
+        GROUP BY term
+    COMMIT TRANSACTION
+
+    /* The plate lets the API invalidate cached lookups of this vehicle */
+    SELECT @Id AS id, plate
+    FROM IT3930_Violations
+    WHERE id = @ViolationId
 END
@@ -1,12 +1,13 @@
 CREATE OR ALTER PROCEDURE create_transaction
     @ViolationId BIGINT,
-    @UserId BIGINT
+    @UserId BIGINT,
+    @Id BIGINT = NULL  /* Generated by generate_id if not provided */
 AS
 BEGIN
     SET NOCOUNT ON
 
-    DECLARE @Id BIGINT
-    EXECUTE generate_id @Id = @Id OUTPUT
+    IF @Id IS NULL
+        EXECUTE generate_id @Id = @Id OUTPUT
 
     INSERT INTO IT3930_Transactions (id, violation_id, user_id)
     VALUES (@Id, @ViolationId, @UserId)
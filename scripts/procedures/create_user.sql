@@ -1,13 +1,14 @@
 CREATE OR ALTER PROCEDURE create_user
     @Fullname NVARCHAR(255),
     @Phone VARCHAR(15),
-    @HashedPassword VARCHAR(136)
+    @HashedPassword VARCHAR(136),
+    @Id BIGINT = NULL  /* Generated by generate_id if not provided */
 AS
 BEGIN
     SET NOCOUNT ON
 
-    DECLARE @Id BIGINT
-    EXECUTE generate_id @Id = @Id OUTPUT
+    IF @Id IS NULL
+        EXECUTE generate_id @Id = @Id OUTPUT
 
     INSERT INTO IT3930_Users (id, fullname, phone, permissions, hashed_password)
     OUTPUT INSERTED.id
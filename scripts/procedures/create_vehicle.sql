@@ -2,5 +2,16 @@ CREATE OR ALTER PROCEDURE create_vehicle
     @Plate VARCHAR(12),
     @UserId BIGINT
 AS
-    INSERT INTO IT3930_Vehicles (plate, user_id)
-    VALUES (@Plate, @UserId)
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    BEGIN TRANSACTION
+        INSERT INTO IT3930_Vehicles (plate, user_id)
+        VALUES (@Plate, @UserId)
+
+        UPDATE IT3930_Users
+        SET vehicles_count = vehicles_count + 1
+        WHERE id = @UserId
+    COMMIT TRANSACTION
+END
@@ -3,15 +3,30 @@ CREATE OR ALTER PROCEDURE create_violation
     @Category TINYINT,
     @Plate VARCHAR(12),
     @FineVnd BIGINT,
-    @VideoUrl NVARCHAR(2048)
+    @VideoUrl NVARCHAR(2048),
+    @Id BIGINT = NULL  /* Generated by generate_id if not provided */
 AS
 BEGIN
     SET NOCOUNT ON
+    SET XACT_ABORT ON
 
-    DECLARE @Id BIGINT
-    EXECUTE generate_id @Id = @Id OUTPUT
+    IF @Id IS NULL
+        EXECUTE generate_id @Id = @Id OUTPUT
 
-    INSERT INTO IT3930_Violations (id, creator_id, category, plate, fine_vnd, video_url)
-    OUTPUT INSERTED.id
-    VALUES (@Id, @CreatorId, @Category, @Plate, @FineVnd, @VideoUrl)
+    BEGIN TRANSACTION
+        INSERT INTO IT3930_Violations (id, creator_id, category, plate, fine_vnd, video_url)
+        VALUES (@Id, @CreatorId, @Category, @Plate, @FineVnd, @VideoUrl)
+
+        UPDATE IT3930_Vehicles
+        SET violations_count = violations_count + 1
+        WHERE plate = @Plate
+
+        UPDATE u
+        SET violations_count = u.violations_count + 1
+        FROM IT3930_Users u
+        INNER JOIN IT3930_Vehicles vh ON vh.user_id = u.id
+        WHERE vh.plate = @Plate
+    COMMIT TRANSACTION
+
+    SELECT @Id AS id
 END
@@ -3,8 +3,19 @@ CREATE OR ALTER PROCEDURE delete_detected
 AS
 BEGIN
     SET NOCOUNT ON
+    SET XACT_ABORT ON
 
-    DELETE FROM IT3930_Detected
-    OUTPUT DELETED.id
-    WHERE id = @Id
+    DECLARE @Deleted TABLE (id BIGINT)
+
+    BEGIN TRANSACTION
+        DELETE FROM IT3930_Detected
+        OUTPUT DELETED.id INTO @Deleted
+        WHERE id = @Id
+
+        /* Hours of the hourly rollups (see compact_rollups) that no longer match the base tables */
+        INSERT INTO IT3930_RollupsDirty (hour)
+        SELECT id / 235929600000 FROM @Deleted
+    COMMIT TRANSACTION
+
+    SELECT id FROM @Deleted
 END
@@ -1,6 +1,22 @@
 CREATE OR ALTER PROCEDURE delete_refutation
     @Id BIGINT
 AS
-    DELETE FROM IT3930_Refutations
-    OUTPUT DELETED.id
-    WHERE id = @Id
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Deleted TABLE (id BIGINT, violation_id BIGINT)
+
+    BEGIN TRANSACTION
+        DELETE FROM IT3930_Refutations
+        OUTPUT DELETED.id, DELETED.violation_id INTO @Deleted
+        WHERE id = @Id
+
+        UPDATE vl
+        SET refutations_count = vl.refutations_count - 1
+        FROM IT3930_Violations vl
+        INNER JOIN @Deleted d ON d.violation_id = vl.id
+    COMMIT TRANSACTION
+
+    SELECT id FROM @Deleted
+END
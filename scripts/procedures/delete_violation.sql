@@ -3,16 +3,40 @@ CREATE OR ALTER PROCEDURE delete_violation
 AS
 BEGIN
     SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Deleted TABLE (id BIGINT, plate VARCHAR(12))
+    DECLARE @Paid TABLE (id BIGINT)
 
     BEGIN TRANSACTION
         DELETE FROM IT3930_Transactions
+        OUTPUT DELETED.id INTO @Paid
         WHERE violation_id = @Id
 
         DELETE FROM IT3930_Refutations
         WHERE violation_id = @Id
 
         DELETE FROM IT3930_Violations
-        OUTPUT DELETED.id
+        OUTPUT DELETED.id, DELETED.plate INTO @Deleted
         WHERE id = @Id
+
+        UPDATE vh
+        SET violations_count = vh.violations_count - 1
+        FROM IT3930_Vehicles vh
+        INNER JOIN @Deleted d ON d.plate = vh.plate
+
+        UPDATE u
+        SET violations_count = u.violations_count - 1
+        FROM IT3930_Users u
+        INNER JOIN IT3930_Vehicles vh ON vh.user_id = u.id
+        INNER JOIN @Deleted d ON d.plate = vh.plate
+
+        /* Hours of the hourly rollups (see compact_rollups) that no longer match the base tables */
+        INSERT INTO IT3930_RollupsDirty (hour)
+        SELECT id / 235929600000 FROM @Deleted
+        UNION
+        SELECT id / 235929600000 FROM @Paid
     COMMIT TRANSACTION
+
+    SELECT id FROM @Deleted
 END
@@ -0,0 +1,50 @@
+CREATE OR ALTER PROCEDURE extend_partitions
+    @MonthsAhead INT = 12
+AS
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Epoch DATETIME2
+    SELECT @Epoch = value FROM IT3930_ConfigDateTime2 WHERE name = 'epoch'
+
+    DECLARE @FirstMonth DATETIME2 = DATEFROMPARTS(YEAR(@Epoch), MONTH(@Epoch), 1)
+    DECLARE @LastMonth INT = DATEDIFF(MONTH, @FirstMonth, SYSUTCDATETIME()) + @MonthsAhead
+    DECLARE @Month INT = 1
+    DECLARE @Boundary BIGINT
+    DECLARE @MaxBoundary BIGINT
+    DECLARE @Result INT
+    DECLARE @Added TABLE (boundary BIGINT)
+
+    BEGIN TRANSACTION
+        /* Every API process runs this periodically: the others skip their turn instead of splitting the same boundaries */
+        EXECUTE @Result = sp_getapplock @Resource = 'IT3930_Partitions', @LockMode = 'Exclusive', @LockOwner = 'Transaction', @LockTimeout = 0
+        IF @Result < 0
+        BEGIN
+            ROLLBACK TRANSACTION
+            SELECT boundary FROM @Added
+            RETURN
+        END
+
+        SELECT @MaxBoundary = MAX(CAST(rv.value AS BIGINT))
+        FROM sys.partition_range_values rv
+        INNER JOIN sys.partition_functions pf ON pf.function_id = rv.function_id
+        WHERE pf.name = 'PF_IT3930_Month'
+
+        /* Splitting the last partition only moves the rows after the new boundary, i.e. none when it is done ahead of time */
+        WHILE @Month <= @LastMonth
+        BEGIN
+            SET @Boundary = DATEDIFF_BIG(MILLISECOND, @Epoch, DATEADD(MONTH, @Month, @FirstMonth)) * 65536
+            IF @Boundary > @MaxBoundary
+            BEGIN
+                ALTER PARTITION SCHEME PS_IT3930_Month NEXT USED [PRIMARY]
+                ALTER PARTITION FUNCTION PF_IT3930_Month() SPLIT RANGE (@Boundary)
+                INSERT INTO @Added (boundary) VALUES (@Boundary)
+            END
+
+            SET @Month = @Month + 1
+        END
+    COMMIT TRANSACTION
+
+    SELECT boundary FROM @Added ORDER BY boundary
+END
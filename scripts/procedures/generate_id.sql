@@ -9,13 +9,8 @@ BEGIN
 
     DECLARE @Now DATETIME2 = SYSUTCDATETIME()
     DECLARE @TimestampMs BIGINT = DATEDIFF_BIG(MILLISECOND, @Epoch, @Now)
-    DECLARE @TailTable TABLE (value BIGINT)
 
-    UPDATE IT3930_ConfigBigInt
-    SET value = (value + 1) & 0xFFFF
-    OUTPUT DELETED.value INTO @TailTable
-    WHERE name = 'id_counter'
-
-    DECLARE @Tail BIGINT = (SELECT value FROM @TailTable)
-    SET @Id = (@TimestampMs << 16) | @Tail
+    /* Worker ID 0 (bits 10-15 of the tail) is reserved for this procedure, API processes lease worker IDs 1-63 */
+    DECLARE @Sequence BIGINT = NEXT VALUE FOR IT3930_IdSequence
+    SET @Id = (@TimestampMs << 16) | @Sequence
 END
@@ -0,0 +1,29 @@
+CREATE OR ALTER PROCEDURE purge_detected
+    @BeforeId BIGINT,  /* Only rows with a lower ID are purged */
+    @BatchSize INT = 1000,
+    @Archive BIT = 0  /* Move the rows to IT3930_DetectedArchive instead of dropping them */
+AS
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Deleted TABLE (id BIGINT PRIMARY KEY, category TINYINT, plate VARCHAR(12), video_url NVARCHAR(2048))
+
+    /* Unlike delete_detected, hours of the rollups are not marked dirty: statistics keep counting purged rows */
+    BEGIN TRANSACTION
+        ;WITH batch AS (
+            SELECT TOP (@BatchSize) id, category, plate, video_url
+            FROM IT3930_Detected
+            WHERE id < @BeforeId
+            ORDER BY id
+        )
+        DELETE FROM batch
+        OUTPUT DELETED.id, DELETED.category, DELETED.plate, DELETED.video_url INTO @Deleted
+
+        IF @Archive = 1
+            INSERT INTO IT3930_DetectedArchive (id, category, plate, video_url)
+            SELECT id, category, plate, video_url FROM @Deleted
+    COMMIT TRANSACTION
+
+    SELECT COUNT(*) AS purged, MAX(id) AS last_id FROM @Deleted
+END
@@ -1,8 +1,30 @@
 CREATE OR ALTER PROCEDURE respond_refutation
     @Id BIGINT,
-    @Response NVARCHAR(MAX)
+    @Response NVARCHAR(MAX),
+    @Terms NVARCHAR(MAX) = NULL  /* JSON array of {"term", "weight"} objects of the response, see server/search.py */
 AS
-    UPDATE IT3930_Refutations
-    SET response = @Response
-    OUTPUT INSERTED.id
-    WHERE id = @Id
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+
+    DECLARE @Updated TABLE (id BIGINT)
+
+    BEGIN TRANSACTION
+        UPDATE IT3930_Refutations
+        SET response = @Response
+        OUTPUT INSERTED.id INTO @Updated
+        WHERE id = @Id
+
+        /* A new response replaces the terms of the previous one */
+        DELETE FROM IT3930_RefutationTerms
+        WHERE refutation_id = @Id AND field = 1
+
+        INSERT INTO IT3930_RefutationTerms (term, refutation_id, field, weight)
+        SELECT j.term, u.id, 1, SUM(j.weight)
+        FROM @Updated u
+        CROSS JOIN OPENJSON(@Terms) WITH (term NVARCHAR(64), weight INT) j
+        GROUP BY u.id, j.term
+    COMMIT TRANSACTION
+
+    SELECT id FROM @Updated
+END
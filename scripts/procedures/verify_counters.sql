@@ -0,0 +1,72 @@
+CREATE OR ALTER PROCEDURE verify_counters
+    @Repair BIT = 0
+AS
+BEGIN
+    SET NOCOUNT ON
+    SET XACT_ABORT ON
+    SET TRANSACTION ISOLATION LEVEL SERIALIZABLE
+
+    DECLARE @Drift TABLE (
+        counter VARCHAR(32) NOT NULL,
+        id BIGINT NULL,
+        plate VARCHAR(12) NULL,
+        stored INT NOT NULL,
+        expected INT NOT NULL
+    )
+
+    BEGIN TRANSACTION
+        INSERT INTO @Drift (counter, id, plate, stored, expected)
+        SELECT 'user_vehicles_count', u.id, NULL, u.vehicles_count, COUNT(vh.plate)
+        FROM IT3930_Users u
+        LEFT JOIN IT3930_Vehicles vh ON vh.user_id = u.id
+        GROUP BY u.id, u.vehicles_count
+        HAVING u.vehicles_count <> COUNT(vh.plate)
+
+        INSERT INTO @Drift (counter, id, plate, stored, expected)
+        SELECT 'user_violations_count', u.id, NULL, u.violations_count, COUNT(vl.id)
+        FROM IT3930_Users u
+        LEFT JOIN IT3930_Vehicles vh ON vh.user_id = u.id
+        LEFT JOIN IT3930_Violations vl ON vl.plate = vh.plate
+        GROUP BY u.id, u.violations_count
+        HAVING u.violations_count <> COUNT(vl.id)
+
+        INSERT INTO @Drift (counter, id, plate, stored, expected)
+        SELECT 'vehicle_violations_count', NULL, vh.plate, vh.violations_count, COUNT(vl.id)
+        FROM IT3930_Vehicles vh
+        LEFT JOIN IT3930_Violations vl ON vl.plate = vh.plate
+        GROUP BY vh.plate, vh.violations_count
+        HAVING vh.violations_count <> COUNT(vl.id)
+
+        INSERT INTO @Drift (counter, id, plate, stored, expected)
+        SELECT 'violation_refutations_count', vl.id, NULL, vl.refutations_count, COUNT(r.id)
+        FROM IT3930_Violations vl
+        LEFT JOIN IT3930_Refutations r ON r.violation_id = vl.id
+        GROUP BY vl.id, vl.refutations_count
+        HAVING vl.refutations_count <> COUNT(r.id)
+
+        IF @Repair = 1
+        BEGIN
+            UPDATE u
+            SET vehicles_count = d.expected
+            FROM IT3930_Users u
+            INNER JOIN @Drift d ON d.counter = 'user_vehicles_count' AND d.id = u.id
+
+            UPDATE u
+            SET violations_count = d.expected
+            FROM IT3930_Users u
+            INNER JOIN @Drift d ON d.counter = 'user_violations_count' AND d.id = u.id
+
+            UPDATE vh
+            SET violations_count = d.expected
+            FROM IT3930_Vehicles vh
+            INNER JOIN @Drift d ON d.counter = 'vehicle_violations_count' AND d.plate = vh.plate
+
+            UPDATE vl
+            SET refutations_count = d.expected
+            FROM IT3930_Violations vl
+            INNER JOIN @Drift d ON d.counter = 'violation_refutations_count' AND d.id = vl.id
+        END
+    COMMIT TRANSACTION
+
+    SELECT counter, id, plate, stored, expected FROM @Drift
+END
@@ -3,6 +3,8 @@ DECLARE
     @SessionSecretKey NVARCHAR(MAX) = ?,
     @Epoch DATETIME2 = ?
 
+SET NOCOUNT ON
+
 IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_Config' AND type = 'U')
 BEGIN
     CREATE TABLE IT3930_Config (
@@ -11,8 +13,6 @@ BEGIN
     )
     INSERT INTO IT3930_Config VALUES ('session_secret_key', @SessionSecretKey)
 END
-ELSE
-    UPDATE IT3930_Config SET value = @SessionSecretKey WHERE name = 'session_secret_key'
 
 IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_ConfigBigInt' AND type = 'U')
 BEGIN
@@ -32,6 +32,31 @@ BEGIN
     INSERT INTO IT3930_ConfigDateTime2 VALUES ('epoch', @Epoch)
 END
 
+-- Violations, detected violations and transactions are partitioned by the month of their snowflake IDs (RANGE RIGHT on
+-- the first ID of each month since the epoch). Boundaries are created up to 12 months ahead, extend_partitions adds
+-- later ones. The function is created with dynamic SQL because its boundaries depend on the stored epoch.
+IF NOT EXISTS (SELECT 1 FROM sys.partition_functions WHERE name = 'PF_IT3930_Month')
+BEGIN
+    DECLARE @StoredEpoch DATETIME2, @FirstMonth DATETIME2, @Boundaries NVARCHAR(MAX)
+    SELECT @StoredEpoch = value FROM IT3930_ConfigDateTime2 WHERE name = 'epoch'
+    SET @FirstMonth = DATEFROMPARTS(YEAR(@StoredEpoch), MONTH(@StoredEpoch), 1)
+
+    ;WITH months AS (
+        SELECT 1 AS n
+        UNION ALL
+        SELECT n + 1 FROM months WHERE n < DATEDIFF(MONTH, @FirstMonth, SYSUTCDATETIME()) + 12
+    )
+    SELECT @Boundaries = STRING_AGG(
+        CAST(DATEDIFF_BIG(MILLISECOND, @StoredEpoch, DATEADD(MONTH, n, @FirstMonth)) * 65536 AS NVARCHAR(MAX)),
+        N', '
+    ) WITHIN GROUP (ORDER BY n)
+    FROM months
+    OPTION (MAXRECURSION 0)
+
+    EXECUTE (N'CREATE PARTITION FUNCTION PF_IT3930_Month (BIGINT) AS RANGE RIGHT FOR VALUES (' + @Boundaries + N')')
+    EXECUTE (N'CREATE PARTITION SCHEME PS_IT3930_Month AS PARTITION PF_IT3930_Month ALL TO ([PRIMARY])')
+END
+
 IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_Users' AND type = 'U')
 BEGIN
     CREATE TABLE IT3930_Users (
@@ -39,9 +64,11 @@ BEGIN
         fullname NVARCHAR(255) NOT NULL,
         phone VARCHAR(15) UNIQUE NOT NULL,
         permissions BIGINT NOT NULL,
-        hashed_password VARCHAR(136) NOT NULL
+        hashed_password VARCHAR(136) NOT NULL,
+        vehicles_count INT NOT NULL CONSTRAINT DF_Users_vehicles_count DEFAULT 0,
+        violations_count INT NOT NULL CONSTRAINT DF_Users_violations_count DEFAULT 0
     )
-    INSERT INTO IT3930_Users
+    INSERT INTO IT3930_Users (id, fullname, phone, permissions, hashed_password)
     VALUES (0, N'Nguyễn Thế Nhật Minh', '0856650960', 1, '2d7748e501f6b8aa941a884b8bc03d2825fcc4897b58631f3a0a48ebcda1094a128cf9fedfd3209251a1f3f71f3b45c95ba2bfd63f6badc10ef3dca304f10684D1a3D7AA')
 END
 
@@ -50,6 +77,7 @@ BEGIN
     CREATE TABLE IT3930_Vehicles (
         plate VARCHAR(12) PRIMARY KEY,
         user_id BIGINT NOT NULL,
+        violations_count INT NOT NULL CONSTRAINT DF_Vehicles_violations_count DEFAULT 0,
         CONSTRAINT FK_Vehicles_Accounts FOREIGN KEY (user_id) REFERENCES IT3930_Users(id)
     )
     CREATE NONCLUSTERED INDEX IDX_Vehicles_user_id ON IT3930_Vehicles(user_id)
@@ -64,6 +92,7 @@ BEGIN
         plate VARCHAR(12) NOT NULL,
         fine_vnd BIGINT NOT NULL,
         video_url NVARCHAR(2048) NOT NULL,
+        refutations_count INT NOT NULL CONSTRAINT DF_Violations_refutations_count DEFAULT 0,
         CONSTRAINT FK_Violations_Users FOREIGN KEY (creator_id) REFERENCES IT3930_Users(id),
         CONSTRAINT FK_Violations_Vehicles FOREIGN KEY (plate) REFERENCES IT3930_Vehicles(plate)
     )
@@ -82,6 +111,30 @@ BEGIN
     CREATE NONCLUSTERED INDEX IDX_Detected_plate ON IT3930_Detected(plate)
 END
 
+-- IDs are generated by the API processes (see SnowflakeGenerator). This sequence only feeds generate_id, which
+-- fills the 10-bit sequence part of worker ID 0.
+IF NOT EXISTS (SELECT 1 FROM sys.sequences WHERE name = 'IT3930_IdSequence')
+    CREATE SEQUENCE IT3930_IdSequence AS INT START WITH 0 INCREMENT BY 1 MINVALUE 0 MAXVALUE 1023 CYCLE CACHE 128
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.table_types tt
+    INNER JOIN sys.columns c ON c.object_id = tt.type_table_object_id
+    WHERE tt.name = 'DetectedBatch' AND c.name = 'id'
+) AND TYPE_ID('DetectedBatch') IS NOT NULL
+BEGIN
+    DROP PROCEDURE IF EXISTS create_detected_batch
+    DROP TYPE DetectedBatch
+END
+
+IF TYPE_ID('DetectedBatch') IS NULL
+    CREATE TYPE DetectedBatch AS TABLE (
+        id BIGINT PRIMARY KEY,
+        category TINYINT NOT NULL,
+        plate VARCHAR(12) NOT NULL,
+        video_url NVARCHAR(2048) NOT NULL
+    )
+
 IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_Refutations' AND type = 'U')
 BEGIN
     CREATE TABLE IT3930_Refutations (
@@ -108,3 +161,174 @@ BEGIN
     )
     CREATE NONCLUSTERED INDEX IDX_Transactions_user_id ON IT3930_Transactions(user_id)
 END
+
+-- Denormalized counters are maintained by the create_*/delete_* procedures (use verify_counters to detect drift).
+-- Databases created before these columns existed get them here, backfilled from the base tables. The backfill is
+-- dynamic SQL because the batch is compiled before the columns are added.
+IF COL_LENGTH('IT3930_Users', 'vehicles_count') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Users ADD
+        vehicles_count INT NOT NULL CONSTRAINT DF_Users_vehicles_count DEFAULT 0,
+        violations_count INT NOT NULL CONSTRAINT DF_Users_violations_count DEFAULT 0
+    EXECUTE (N'
+        UPDATE u
+        SET
+            vehicles_count = (SELECT COUNT(*) FROM IT3930_Vehicles vh WHERE vh.user_id = u.id),
+            violations_count = (
+                SELECT COUNT(*)
+                FROM IT3930_Vehicles vh
+                INNER JOIN IT3930_Violations vl ON vl.plate = vh.plate
+                WHERE vh.user_id = u.id
+            )
+        FROM IT3930_Users u
+    ')
+END
+
+IF COL_LENGTH('IT3930_Vehicles', 'violations_count') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Vehicles ADD
+        violations_count INT NOT NULL CONSTRAINT DF_Vehicles_violations_count DEFAULT 0
+    EXECUTE (N'
+        UPDATE vh
+        SET violations_count = (SELECT COUNT(*) FROM IT3930_Violations vl WHERE vl.plate = vh.plate)
+        FROM IT3930_Vehicles vh
+    ')
+END
+
+IF COL_LENGTH('IT3930_Violations', 'refutations_count') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Violations ADD
+        refutations_count INT NOT NULL CONSTRAINT DF_Violations_refutations_count DEFAULT 0
+    EXECUTE (N'
+        UPDATE vl
+        SET refutations_count = (SELECT COUNT(*) FROM IT3930_Refutations r WHERE r.violation_id = vl.id)
+        FROM IT3930_Violations vl
+    ')
+END
+
+-- Plates are filtered on a normalized key (uppercase, without separators) so that exact and prefix lookups are index
+-- seeks. The expression must match `normalize_plate` in server/utils.py. The indexes are created with dynamic SQL
+-- because the batch is compiled before the columns are added.
+IF COL_LENGTH('IT3930_Vehicles', 'plate_key') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Vehicles ADD plate_key AS UPPER(REPLACE(REPLACE(REPLACE(plate, '-', ''), '.', ''), ' ', '')) PERSISTED
+    EXECUTE (N'CREATE NONCLUSTERED INDEX IDX_Vehicles_plate_key ON IT3930_Vehicles(plate_key)')
+END
+
+IF COL_LENGTH('IT3930_Violations', 'plate_key') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Violations ADD plate_key AS UPPER(REPLACE(REPLACE(REPLACE(plate, '-', ''), '.', ''), ' ', '')) PERSISTED
+    EXECUTE (N'CREATE NONCLUSTERED INDEX IDX_Violations_plate_key ON IT3930_Violations(plate_key)')
+END
+
+IF COL_LENGTH('IT3930_Detected', 'plate_key') IS NULL
+BEGIN
+    ALTER TABLE IT3930_Detected ADD plate_key AS UPPER(REPLACE(REPLACE(REPLACE(plate, '-', ''), '.', ''), ' ', '')) PERSISTED
+    EXECUTE (N'CREATE NONCLUSTERED INDEX IDX_Detected_plate_key ON IT3930_Detected(plate_key)')
+END
+
+-- Search index of refutation messages (field 0) and responses (field 1). Terms are folded and counted by
+-- server/search.py, the create_refutation/respond_refutation procedures only store them.
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_RefutationTerms' AND type = 'U')
+BEGIN
+    CREATE TABLE IT3930_RefutationTerms (
+        term NVARCHAR(64) NOT NULL,
+        refutation_id BIGINT NOT NULL,
+        field TINYINT NOT NULL CHECK (field IN (0, 1)),
+        weight INT NOT NULL,
+        CONSTRAINT PK_RefutationTerms PRIMARY KEY (term, refutation_id, field),
+        CONSTRAINT FK_RefutationTerms_Refutations FOREIGN KEY (refutation_id) REFERENCES IT3930_Refutations(id) ON DELETE CASCADE
+    )
+    CREATE NONCLUSTERED INDEX IDX_RefutationTerms_refutation_id ON IT3930_RefutationTerms(refutation_id)
+END
+
+-- Hourly rollups of the statistics endpoints, keyed by the hour of the snowflake IDs (hours since the epoch). They are
+-- recomputed from the base tables by compact_rollups rather than incremented by the create_* procedures, so that
+-- concurrent inserts of the same hour do not serialize on a single rollup row.
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_ViolationsHourly' AND type = 'U')
+    CREATE TABLE IT3930_ViolationsHourly (
+        hour INT NOT NULL,
+        category TINYINT NOT NULL,
+        violations_count INT NOT NULL,
+        fines_vnd BIGINT NOT NULL,
+        CONSTRAINT PK_ViolationsHourly PRIMARY KEY (hour, category)
+    )
+
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_DetectedHourly' AND type = 'U')
+    CREATE TABLE IT3930_DetectedHourly (
+        hour INT NOT NULL,
+        category TINYINT NOT NULL,
+        detected_count INT NOT NULL,
+        CONSTRAINT PK_DetectedHourly PRIMARY KEY (hour, category)
+    )
+
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_TransactionsHourly' AND type = 'U')
+    CREATE TABLE IT3930_TransactionsHourly (
+        hour INT NOT NULL,
+        transactions_count INT NOT NULL,
+        paid_vnd BIGINT NOT NULL,
+        CONSTRAINT PK_TransactionsHourly PRIMARY KEY (hour)
+    )
+
+-- Hours of rows deleted by the delete_* procedures, recomputed by the next compaction even if they are already closed
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_RollupsDirty' AND type = 'U')
+    CREATE TABLE IT3930_RollupsDirty (
+        hour INT NOT NULL,
+        CONSTRAINT PK_RollupsDirty PRIMARY KEY (hour) WITH (IGNORE_DUP_KEY = ON)
+    )
+
+-- Hours before this one are closed: compactions only recompute later hours (and dirty ones). 0 backfills everything.
+IF NOT EXISTS (SELECT 1 FROM IT3930_ConfigBigInt WHERE name = 'rollups_watermark')
+    INSERT INTO IT3930_ConfigBigInt VALUES ('rollups_watermark', 0)
+
+-- Tables created before partitioning get their clustered primary key rebuilt on the partition scheme, which keeps the
+-- constraint (and the foreign keys referencing it). Only the indexes of IT3930_Detected are aligned: its partitions can
+-- be switched out to IT3930_DetectedArchive (see archive_detected). Partitions of IT3930_Violations cannot be switched
+-- out while other tables reference it, nor those of IT3930_Transactions while UNIQUE(violation_id) spans all of them,
+-- so their nonclustered indexes stay unpartitioned and keep a single seek per lookup.
+DECLARE @PartitionedTable SYSNAME, @PrimaryKey SYSNAME, @Statement NVARCHAR(MAX)
+DECLARE partitioned_tables CURSOR LOCAL FAST_FORWARD FOR
+    SELECT t.name, i.name
+    FROM (VALUES ('IT3930_Violations'), ('IT3930_Detected'), ('IT3930_Transactions')) AS t(name)
+    INNER JOIN sys.indexes i ON i.object_id = OBJECT_ID(t.name) AND i.index_id = 1
+    WHERE i.data_space_id NOT IN (SELECT data_space_id FROM sys.partition_schemes)
+
+OPEN partitioned_tables
+FETCH NEXT FROM partitioned_tables INTO @PartitionedTable, @PrimaryKey
+WHILE @@FETCH_STATUS = 0
+BEGIN
+    SET @Statement = N'CREATE UNIQUE CLUSTERED INDEX ' + QUOTENAME(@PrimaryKey) + N' ON ' + QUOTENAME(@PartitionedTable)
+        + N'(id) WITH (DROP_EXISTING = ON) ON PS_IT3930_Month(id)'
+    EXECUTE (@Statement)
+    FETCH NEXT FROM partitioned_tables INTO @PartitionedTable, @PrimaryKey
+END
+
+CLOSE partitioned_tables
+DEALLOCATE partitioned_tables
+
+IF EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE object_id = OBJECT_ID('IT3930_Detected') AND index_id > 1
+    AND data_space_id NOT IN (SELECT data_space_id FROM sys.partition_schemes)
+)
+BEGIN
+    EXECUTE (N'CREATE NONCLUSTERED INDEX IDX_Detected_plate ON IT3930_Detected(plate) WITH (DROP_EXISTING = ON) ON PS_IT3930_Month(id)')
+    EXECUTE (N'CREATE NONCLUSTERED INDEX IDX_Detected_plate_key ON IT3930_Detected(plate_key) WITH (DROP_EXISTING = ON) ON PS_IT3930_Month(id)')
+END
+
+-- Switch target of archive_detected. Its columns, constraints and indexes must stay identical to IT3930_Detected's
+-- (without the foreign key, so that archived plates may be deleted).
+IF NOT EXISTS (SELECT 1 FROM sys.objects WHERE name = 'IT3930_DetectedArchive' AND type = 'U')
+BEGIN
+    CREATE TABLE IT3930_DetectedArchive (
+        id BIGINT NOT NULL,
+        category TINYINT NOT NULL CHECK (category IN (0, 1, 2)),
+        plate VARCHAR(12) NOT NULL,
+        video_url NVARCHAR(2048) NOT NULL,
+        plate_key AS UPPER(REPLACE(REPLACE(REPLACE(plate, '-', ''), '.', ''), ' ', '')) PERSISTED,
+        CONSTRAINT PK_DetectedArchive PRIMARY KEY CLUSTERED (id) ON PS_IT3930_Month(id)
+    )
+    CREATE NONCLUSTERED INDEX IDX_DetectedArchive_plate ON IT3930_DetectedArchive(plate) ON PS_IT3930_Month(id)
+    CREATE NONCLUSTERED INDEX IDX_DetectedArchive_plate_key ON IT3930_DetectedArchive(plate_key) ON PS_IT3930_Month(id)
+END
@@ -13,6 +13,7 @@ CREATE OR ALTER VIEW view_transactions AS
         vl.violation_video_url,
         vl.violation_refutations_count,
         vl.vehicle_plate,
+        vl.vehicle_plate_key,
         vl.vehicle_violations_count,
         vl.user_id,
         vl.user_fullname,
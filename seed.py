@@ -6,7 +6,8 @@ import random
 from typing import Dict, List
 
 from server.database import Database
-from server.utils import hash_password
+from server.search import terms_json
+from server.utils import hash_password, run_password_hasher
 
 
 BATCH_SIZE = 32
@@ -19,9 +20,10 @@ async def main() -> None:
             cursor._impl.fast_executemany = True
 
             for indices in itertools.batched(range(1000), BATCH_SIZE):
+                hashed_passwords = await asyncio.gather(*(run_password_hasher(hash_password, f"test{i:08}") for i in indices))
                 await cursor.executemany(
                     "EXECUTE create_user @Fullname = ?, @Phone = ?, @HashedPassword = ?",
-                    [(f"Nguyễn Văn A {i}", f"09{i:08}", hash_password(f"test{i:08}")) for i in indices],
+                    [(f"Nguyễn Văn A {i}", f"09{i:08}", hashed) for i, hashed in zip(indices, hashed_passwords)],
                 )
 
             await cursor.execute("SELECT id FROM IT3930_Users ORDER BY id")
@@ -43,9 +45,12 @@ async def main() -> None:
             violation_ids: Dict[int, str] = {row.id: row.plate for row in rows}
 
             for id, plate in violation_ids.items():
-                vl = [(id, owners[plate], f"Khiếu nại {i} cho xe {plate}") for i in range(random.randint(0, 4))]
-                if vl:
-                    await cursor.executemany("EXECUTE create_refutation @ViolationId = ?, @UserId = ?, @Message = ?", vl)
+                messages = [f"Khiếu nại {i} cho xe {plate}" for i in range(random.randint(0, 4))]
+                if messages:
+                    await cursor.executemany(
+                        "EXECUTE create_refutation @ViolationId = ?, @UserId = ?, @Message = ?, @Terms = ?",
+                        [(id, owners[plate], message, terms_json(message)) for message in messages],
+                    )
 
             transaction_values = [(id, owners[plate]) for id, plate in violation_ids.items() if random.random() < 0.3]
             for t in itertools.batched(transaction_values, BATCH_SIZE):
@@ -1,15 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+import math
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Dict, List
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Tuple
 
 from fastapi import FastAPI, Request
-from fastapi.responses import PlainTextResponse, RedirectResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response
 
+from .breaker import CircuitBreaker
+from .cache import TTLCache
 from .config import ROOT
-from .database import Database
+from .database import Database, DatabaseUnavailable, PoolExhausted
+from .metrics import Gauge, exposition
+from .middleware import DataLoaderMiddleware, MetricsMiddleware, ReadYourWritesMiddleware
+from .models import UnknownField
+from .partitions import PartitionExtender
+from .retention import DetectedRetention
+from .rollups import RollupCompactor
 from .routes import routers
+from .streams import DetectedHub
+from .utils import InvalidCursor, SQLBuildHelper
 
 try:
     import uvloop  # type: ignore
@@ -25,7 +36,13 @@ __all__ = ("app",)
 @asynccontextmanager
 async def __lifespan(app: FastAPI) -> AsyncGenerator[None]:
     await Database.instance.prepare()
+    PartitionExtender.instance.start()
+    RollupCompactor.instance.start()
+    DetectedRetention.instance.start()
     yield
+    await DetectedRetention.instance.stop()
+    await RollupCompactor.instance.stop()
+    await PartitionExtender.instance.stop()
     await Database.instance.close()
 
 
@@ -34,10 +51,72 @@ app = FastAPI(
     lifespan=__lifespan,
     description=ROOT.joinpath("README.md").read_text(encoding="utf-8"),
 )
+app.add_middleware(DataLoaderMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 for router in routers:
     app.include_router(router)
 
 
+def __pool_samples(key: str) -> Iterator[Tuple[Tuple[str, ...], float]]:
+    yield (), Database.instance.statistics()[key]
+
+
+def __cache_samples(key: str) -> Iterator[Tuple[Tuple[str, ...], float]]:
+    for name, c in TTLCache.instances.items():
+        yield (name,), c.statistics()[key]
+
+
+def __shape_samples() -> Iterator[Tuple[Tuple[str, ...], float]]:
+    yield (), len(SQLBuildHelper.shapes)
+
+
+def __stream_samples() -> Iterator[Tuple[Tuple[str, ...], float]]:
+    yield (), DetectedHub.instance.subscribers
+
+
+def __breaker_samples() -> Iterator[Tuple[Tuple[str, ...], float]]:
+    for name, b in CircuitBreaker.instances.items():
+        yield (name,), CircuitBreaker.STATES[b.state]
+
+
+Gauge("db_pool_size", "Number of open pooled connections", (), lambda: __pool_samples("size"))
+Gauge("db_pool_in_use", "Number of pooled connections currently acquired", (), lambda: __pool_samples("in_use"))
+Gauge("db_pool_waiters", "Number of tasks waiting for a pooled connection", (), lambda: __pool_samples("waiters"))
+Gauge("cache_size", "Number of entries in an in-process cache", ("cache",), lambda: __cache_samples("size"))
+Gauge("cache_hits_total", "Number of in-process cache hits", ("cache",), lambda: __cache_samples("hits"), type="counter")
+Gauge("cache_misses_total", "Number of in-process cache misses", ("cache",), lambda: __cache_samples("misses"), type="counter")
+Gauge("cache_coalesced_total", "Number of in-process cache misses that joined an in-flight computation", ("cache",), lambda: __cache_samples("coalesced"), type="counter")
+Gauge("db_statement_shapes", "Number of distinct statement shapes built by this process", (), __shape_samples)
+Gauge("detected_stream_subscribers", "Number of clients subscribed to the detected violations stream", (), __stream_samples)
+Gauge("circuit_breaker_state", "State of a circuit breaker (0 = closed, 1 = open, 2 = half-open)", ("breaker",), __breaker_samples)
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor(request: Request, exc: InvalidCursor) -> JSONResponse:
+    return JSONResponse({"detail": "Invalid pagination cursor"}, status_code=400)
+
+
+@app.exception_handler(UnknownField)
+async def unknown_field(request: Request, exc: UnknownField) -> JSONResponse:
+    return JSONResponse({"detail": f"Unknown field: {exc}"}, status_code=400)
+
+
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted(request: Request, exc: PoolExhausted) -> JSONResponse:
+    return JSONResponse({"detail": "The server is too busy, try again later"}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable(request: Request, exc: DatabaseUnavailable) -> JSONResponse:
+    retry_after = max(1, math.ceil(exc.retry_after))
+    return JSONResponse(
+        {"detail": "The database is unavailable, try again later"},
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 @app.get("/", include_in_schema=False)
 async def root() -> RedirectResponse:
     return RedirectResponse("/docs")
@@ -68,6 +147,24 @@ async def whatsmyip(request: Request) -> PlainTextResponse:
         return PlainTextResponse(f"{addr.host}:{addr.port}")
 
 
+@app.get("/cache", include_in_schema=False)
+async def cache() -> Dict[str, Dict[str, int]]:
+    """Report hit/miss counters of in-process caches"""
+    return {name: c.statistics() for name, c in TTLCache.instances.items()}
+
+
+@app.get("/pool", include_in_schema=False)
+async def pool() -> Dict[str, Any]:
+    """Report connection pool usage"""
+    return Database.instance.statistics()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Expose metrics in the Prometheus text format"""
+    return Response(exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get(
     "/routes",
     summary="List all API routes, including hidden ones",
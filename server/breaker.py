@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import time
+from typing import ClassVar, Dict, Literal, TYPE_CHECKING
+
+from .metrics import CIRCUIT_REJECTED, CIRCUIT_TRANSITIONS
+
+
+__all__ = ("CircuitBreaker",)
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Fail fast while a dependency is down.
+
+    After `threshold` consecutive failures, the breaker opens and rejects calls for `cooldown` seconds. Then a single
+    trial call is let through (half-open): its success closes the breaker, its failure opens it again. If the trial
+    never reports back (e.g. it was cancelled), another one is let through after `cooldown` seconds.
+
+    Every instance is registered in `CircuitBreaker.instances` under its name so that its state can be inspected at
+    runtime.
+    """
+
+    instances: ClassVar[Dict[str, CircuitBreaker]] = {}
+    STATES: ClassVar[Dict[CircuitState, int]] = {"closed": 0, "open": 1, "half_open": 2}
+    __slots__ = ("__threshold", "__cooldown", "__failures", "__changed_at", "name", "state")
+    if TYPE_CHECKING:
+        __threshold: int
+        __cooldown: float
+        __failures: int
+        __changed_at: float
+        name: str
+        state: CircuitState
+
+    def __init__(self, name: str, *, threshold: int, cooldown: float) -> None:
+        self.__threshold = threshold
+        self.__cooldown = cooldown
+        self.__failures = 0
+        self.__changed_at = time.monotonic()
+        self.name = name
+        self.state = "closed"
+        self.instances[name] = self
+
+    def __transition(self, state: CircuitState) -> None:
+        self.state = state
+        self.__changed_at = time.monotonic()
+        CIRCUIT_TRANSITIONS.inc(self.name, state)
+
+    def retry_after(self) -> float:
+        """Seconds until the next call is let through, 0 if calls are let through now."""
+        if self.state == "closed":
+            return 0.0
+
+        return max(0.0, self.__changed_at + self.__cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now. Rejected calls are counted."""
+        if self.state == "closed":
+            return True
+
+        if self.retry_after() == 0:
+            # Let a (new) trial call through
+            self.__transition("half_open")
+            return True
+
+        CIRCUIT_REJECTED.inc(self.name)
+        return False
+
+    def success(self) -> None:
+        self.__failures = 0
+        if self.state != "closed":
+            self.__transition("closed")
+
+    def failure(self) -> None:
+        self.__failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.__failures >= self.__threshold):
+            self.__transition("open")
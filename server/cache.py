@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, ClassVar, Dict, Generic, Hashable, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+
+__all__ = ("TTLCache",)
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class TTLCache(Generic[_K, _V]):
+    """A bounded in-process cache with LRU eviction and per-entry expiration.
+
+    Every instance is registered in `TTLCache.instances` under its name so that its statistics
+    can be inspected at runtime.
+    """
+
+    instances: ClassVar[Dict[str, TTLCache[Any, Any]]] = {}
+    __slots__ = (
+        "__data",
+        "__pending",
+        "__maxsize",
+        "__ttl",
+        "name",
+        "hits",
+        "misses",
+        "coalesced",
+    )
+    if TYPE_CHECKING:
+        __data: OrderedDict[_K, Tuple[float, _V]]
+        __pending: Dict[_K, asyncio.Future[_V]]
+        __maxsize: int
+        __ttl: float
+        name: str
+        hits: int
+        misses: int
+        coalesced: int
+
+    def __init__(self, name: str, *, maxsize: int, ttl: float) -> None:
+        self.__data = OrderedDict()
+        self.__pending = {}
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.instances[name] = self
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def get(self, key: _K) -> Optional[_V]:
+        """Get the value associated with `key`, or `None` if it is missing or expired."""
+        try:
+            expires_at, value = self.__data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expires_at < time.monotonic():
+            del self.__data[key]
+            self.misses += 1
+            return None
+
+        self.__data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: _K, value: _V) -> None:
+        """Associate `value` with `key`, evicting the least recently used entries if the cache is full."""
+        self.__data[key] = (time.monotonic() + self.__ttl, value)
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.__maxsize:
+            self.__data.popitem(last=False)
+
+    async def fetch(self, key: _K, factory: Callable[[], Awaitable[_V]]) -> _V:
+        """Get the value associated with `key`, computing and caching it with `factory` on a miss.
+
+        Concurrent misses for the same key share a single `factory` call. Its result is not cached if `key` is
+        invalidated (via `pop`, `discard_if` or `clear`) while the call is running.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        future = self.__pending.get(key)
+        if future is None:
+            future = self.__pending[key] = asyncio.ensure_future(factory())
+            future.add_done_callback(lambda f: self.__resolve(key, f))
+        else:
+            self.coalesced += 1
+
+        # Cancelling one waiter must not cancel the shared call
+        return await asyncio.shield(future)
+
+    def __resolve(self, key: _K, future: asyncio.Future[_V]) -> None:
+        failed = future.cancelled() or future.exception() is not None
+        if self.__pending.get(key) is future:
+            del self.__pending[key]
+            if not failed:
+                self.set(key, future.result())
+
+    def pop(self, key: _K) -> None:
+        """Remove `key` from the cache if it exists."""
+        self.__data.pop(key, None)
+        self.__pending.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[_K], bool]) -> int:
+        """Remove all entries whose key satisfies `predicate`. Return the number of removed entries."""
+        keys = [key for key in self.__data if predicate(key)]
+        for key in keys:
+            del self.__data[key]
+
+        for key in [key for key in self.__pending if predicate(key)]:
+            del self.__pending[key]
+
+        return len(keys)
+
+    def clear(self) -> None:
+        self.__data.clear()
+        self.__pending.clear()
+
+    def statistics(self) -> Dict[str, int]:
+        return {
+            "size": len(self.__data),
+            "maxsize": self.__maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
@@ -13,7 +13,77 @@ MSSQL_HOST = os.environ["MSSQL_HOST"]
 MSSQL_DATABASE = os.environ["MSSQL_DATABASE"]
 MSSQL_USER = os.environ["MSSQL_USER"]
 MSSQL_PASSWORD = os.environ["MSSQL_PASSWORD"]
+# Comma-separated hosts of read-only replicas (e.g. readable secondaries of an availability group) serving list reads
+MSSQL_REPLICA_HOSTS = tuple(host.strip() for host in os.environ.get("MSSQL_REPLICA_HOSTS", "").split(",") if host.strip())
+# Connections opened (pre-warmed) when the pool is created
+MSSQL_POOL_MIN_SIZE = int(os.environ.get("MSSQL_POOL_MIN_SIZE", "1"))
+MSSQL_POOL_MAX_SIZE = int(os.environ.get("MSSQL_POOL_MAX_SIZE", "10"))
+# Seconds to wait for a free connection before giving up
+MSSQL_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("MSSQL_POOL_ACQUIRE_TIMEOUT", "30"))
+# Seconds after which an idle connection is closed and reopened (-1 to keep connections forever)
+MSSQL_POOL_RECYCLE = int(os.environ.get("MSSQL_POOL_RECYCLE", "-1"))
+# Retries of a database operation after a connection failure, deadlock or timeout, with exponential backoff
+DB_RETRY_ATTEMPTS = int(os.environ.get("DB_RETRY_ATTEMPTS", "3"))
+# Seconds of the first backoff (doubled after each retry, up to DB_RETRY_MAX_DELAY). Actual delays are random in [0, backoff].
+DB_RETRY_BASE_DELAY = float(os.environ.get("DB_RETRY_BASE_DELAY", "0.1"))
+DB_RETRY_MAX_DELAY = float(os.environ.get("DB_RETRY_MAX_DELAY", "2"))
+# Consecutive failed operations (connection failures or timeouts) after which database calls fail fast...
+DB_BREAKER_THRESHOLD = int(os.environ.get("DB_BREAKER_THRESHOLD", "5"))
+# ...for this many seconds, before a trial operation is let through
+DB_BREAKER_COOLDOWN = float(os.environ.get("DB_BREAKER_COOLDOWN", "10"))
+# Seconds after a client's own write during which its reads go to the primary instead of a (lagging) replica
+DB_READ_YOUR_WRITES_WINDOW = int(os.environ.get("DB_READ_YOUR_WRITES_WINDOW", "5"))
+# Seconds for which a snowflake worker ID lease is trusted without being confirmed again: inserts fail with 503 only once
+# every check (one per SNOWFLAKE_LEASE_CHECK_INTERVAL, each up to this long) failed or stalled for that long. A process
+# that leases a worker ID waits this long before generating IDs with it, so that a previous holder that lost the lease
+# has stopped using it: a larger TTL tolerates slower checks under load, but delays startup and re-leasing as much.
+SNOWFLAKE_LEASE_TTL = float(os.environ.get("SNOWFLAKE_LEASE_TTL", "20"))
+SNOWFLAKE_LEASE_CHECK_INTERVAL = float(os.environ.get("SNOWFLAKE_LEASE_CHECK_INTERVAL", "2"))
+# Seconds a starting process waits for another one to finish applying migrations
+DB_MIGRATION_LOCK_TIMEOUT = float(os.environ.get("DB_MIGRATION_LOCK_TIMEOUT", "600"))
 
 EPOCH = datetime(2025, 1, 1, 0, 0, 0, 0, timezone.utc)
 DB_PAGINATION_QUERY = 50
+DB_PAGINATION_MAX = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Returned after a write and echoed back by clients: the UNIX time until which their reads go to the primary
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+DB_EXPORT_CHUNK_SIZE = 1000
+DETECTED_BATCH_MAX = 1000
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "30"))
+SECRET_KEY_CACHE_TTL = float(os.environ.get("SECRET_KEY_CACHE_TTL", "300"))
+PLATE_CACHE_SIZE = int(os.environ.get("PLATE_CACHE_SIZE", "4096"))
+PLATE_CACHE_TTL = float(os.environ.get("PLATE_CACHE_TTL", "10"))
+# PBKDF2 iterations of new password hashes. Existing hashes with a different cost are upgraded on login.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", "600000"))
+# Threads hashing passwords concurrently in each process, i.e. CPU cores that login bursts may occupy
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+# Seconds between polls for detected violations created by other processes, while clients are subscribed to the stream
+DETECTED_STREAM_POLL_INTERVAL = float(os.environ.get("DETECTED_STREAM_POLL_INTERVAL", "1"))
+# Seconds of IDs polled again, to catch detected violations committed late (e.g. by a slower process)
+DETECTED_STREAM_LOOKBACK = float(os.environ.get("DETECTED_STREAM_LOOKBACK", "5"))
+# Events buffered per stream client. Clients that fall further behind are disconnected and resume from their last event.
+DETECTED_STREAM_QUEUE_SIZE = int(os.environ.get("DETECTED_STREAM_QUEUE_SIZE", "1000"))
+DETECTED_STREAM_KEEPALIVE = float(os.environ.get("DETECTED_STREAM_KEEPALIVE", "15"))
+# Seconds after which a stream ends, so that clients reconnect (and authenticate) again
+DETECTED_STREAM_MAX_AGE = float(os.environ.get("DETECTED_STREAM_MAX_AGE", "300"))
+# Seconds between compactions of the hourly rollups behind the statistics endpoints, i.e. how stale statistics may be
+ROLLUP_COMPACT_INTERVAL = float(os.environ.get("ROLLUP_COMPACT_INTERVAL", "60"))
+# Closed hours recomputed by each compaction, to catch rows committed late
+ROLLUP_COMPACT_LOOKBACK = int(os.environ.get("ROLLUP_COMPACT_LOOKBACK", "2"))
+STATISTICS_BUCKETS_MAX = 2000
+# Seconds between two checks that the monthly partitions extend PARTITION_MONTHS_AHEAD months after the current one
+PARTITION_EXTEND_INTERVAL = float(os.environ.get("PARTITION_EXTEND_INTERVAL", "86400"))
+PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "12"))
+# Days after which detected violations that were never confirmed (i.e. are still in IT3930_Detected) are purged, 0 to
+# keep them forever
+DETECTED_RETENTION_DAYS = float(os.environ.get("DETECTED_RETENTION_DAYS", "0"))
+DETECTED_RETENTION_INTERVAL = float(os.environ.get("DETECTED_RETENTION_INTERVAL", "3600"))
+# Rows purged per transaction, well below the 5000 locks at which SQL Server escalates to a table lock
+DETECTED_RETENTION_BATCH_SIZE = int(os.environ.get("DETECTED_RETENTION_BATCH_SIZE", "1000"))
+# Seconds between two batches, leaving room for the queries of the API
+DETECTED_RETENTION_BATCH_DELAY = float(os.environ.get("DETECTED_RETENTION_BATCH_DELAY", "0.1"))
+# Where purged rows are copied first: nowhere (empty), "table" (IT3930_DetectedArchive) or a directory of gzipped NDJSON files
+DETECTED_RETENTION_ARCHIVE = os.environ.get("DETECTED_RETENTION_ARCHIVE", "")
 ROOT = Path(__file__).parent.parent.resolve()
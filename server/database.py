@@ -1,129 +1,474 @@
 from __future__ import annotations
 
 import asyncio
-import atexit
+import itertools
+import math
 import os
-import secrets
+import random
 import sys
-from pathlib import Path
-from typing import Any, Callable, ClassVar, Coroutine, Final, Optional, ParamSpec, TypeVar, TYPE_CHECKING
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, ClassVar, Coroutine, Dict, Final, Iterator, List, Literal, Optional, ParamSpec, Set, TypeVar, TYPE_CHECKING
 
 import aioodbc  # type: ignore
-from pyodbc import OperationalError, ProgrammingError  # type: ignore
+from pyodbc import Error  # type: ignore
 
+from .breaker import CircuitBreaker
 from .config import (
-    EPOCH,
+    DB_BREAKER_COOLDOWN,
+    DB_BREAKER_THRESHOLD,
+    DB_RETRY_ATTEMPTS,
+    DB_RETRY_BASE_DELAY,
+    DB_RETRY_MAX_DELAY,
     MSSQL_DATABASE,
     MSSQL_HOST,
     MSSQL_PASSWORD,
+    MSSQL_POOL_ACQUIRE_TIMEOUT,
+    MSSQL_POOL_MAX_SIZE,
+    MSSQL_POOL_MIN_SIZE,
+    MSSQL_POOL_RECYCLE,
+    MSSQL_REPLICA_HOSTS,
     MSSQL_USER,
-    ROOT,
+    SNOWFLAKE_LEASE_CHECK_INTERVAL,
+    SNOWFLAKE_LEASE_TTL,
 )
+from .metrics import DB_POOL_ACQUIRE_WAIT, DB_QUERY_DURATION, DB_QUERY_ERRORS, DB_QUERY_RETRIES, DB_QUERY_ROWS, DB_RECONNECTS
+from .migrations import migrate
+from .utils import SnowflakeGenerator
 
 
-__all__ = ("Database",)
+__all__ = ("Database", "DatabaseUnavailable", "PoolExhausted")
 _P = ParamSpec("_P")
 _T = TypeVar("_T")
 _CoroFunc = Callable[_P, Coroutine[Any, Any, _T]]
+FailureKind = Literal["connection", "deadlock", "timeout"]
+# Whether reads of the current context must see its own writes, i.e. bypass the replicas
+_READ_PRIMARY: ContextVar[bool] = ContextVar("_READ_PRIMARY", default=False)
+# SQLSTATEs of ODBC errors that are worth retrying
+_FAILURE_KINDS: Dict[str, FailureKind] = {
+    "08001": "connection",  # Client unable to establish connection
+    "08003": "connection",  # Connection not open
+    "08004": "connection",  # Server rejected the connection
+    "08007": "connection",  # Connection failure during transaction
+    "08S01": "connection",  # Communication link failure
+    "40001": "deadlock",  # Serialization failure, i.e. chosen as deadlock victim (error 1205)
+    "HYT00": "timeout",  # Query timeout expired
+    "HYT01": "timeout",  # Connection timeout expired
+}
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection becomes available within `MSSQL_POOL_ACQUIRE_TIMEOUT` seconds."""
+
+
+class DatabaseUnavailable(Exception):
+    """Raised without touching the database while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Database is unavailable, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def classify(error: BaseException) -> Optional[FailureKind]:
+    """Classify a database error as a retryable kind of failure, or return `None` if retrying would not help.
+
+    aioodbc sometimes raises a `ProgrammingError` in the context of the original `OperationalError`, so the context
+    is inspected as well.
+    """
+    for e in (error, error.__context__):
+        if isinstance(e, Error) and e.args:
+            kind = _FAILURE_KINDS.get(e.args[0])
+            if kind is not None:
+                return kind
+
+            if len(e.args) > 1 and "(1205)" in str(e.args[1]):
+                return "deadlock"
+
+    return None
 
 
 class Database:
-    """A database singleton that manages the connection pool."""
+    """A database singleton that manages the connection pools of the primary and of the read-only replicas."""
 
     instance: ClassVar[Database]
-    LOCK_FILE: ClassVar[Path] = ROOT / "database.lock"
     __slots__ = (
         "__pool",
+        "__replicas",
+        "__replica_counter",
+        "__lease",
+        "__lease_verified_at",
+        "__lease_watcher",
+        "__snowflake",
         "__prepared",
         "__preparing",
+        "__reconnecting",
+        "__broken",
+        "__retired",
+        "__generation",
         "__closing",
+        "__waiters",
+        "breaker",
     )
     if TYPE_CHECKING:
         __pool: Optional[aioodbc.Pool]
+        __replicas: List[aioodbc.Pool]
+        __replica_counter: Iterator[int]
+        __lease: Optional[aioodbc.Connection]
+        __lease_verified_at: float
+        __lease_watcher: Optional[asyncio.Task[None]]
+        __snowflake: Optional[SnowflakeGenerator]
         __prepared: Final[asyncio.Event]
-        __preparing: bool
+        __preparing: Optional[asyncio.Future[None]]
+        __reconnecting: Optional[asyncio.Future[None]]
+        __broken: Set[aioodbc.Pool]
+        __retired: Set[asyncio.Task[None]]
+        __generation: int
         __closing: bool
+        __waiters: int
+        breaker: Final[CircuitBreaker]
 
     def __init__(self) -> None:
         self.__pool = None
+        self.__replicas = []
+        self.__replica_counter = itertools.count()
+        self.__lease = None
+        self.__lease_verified_at = -math.inf
+        self.__lease_watcher = None
+        self.__snowflake = None
         self.__prepared = asyncio.Event()
-        self.__preparing = False
+        self.__preparing = None
+        self.__reconnecting = None
+        self.__broken = set()
+        self.__retired = set()
+        self.__generation = 0
         self.__closing = False
+        self.__waiters = 0
+        self.breaker = CircuitBreaker("database", threshold=DB_BREAKER_THRESHOLD, cooldown=DB_BREAKER_COOLDOWN)
+
+    @staticmethod
+    def __dsn(host: str = MSSQL_HOST, *, readonly: bool = False) -> str:
+        return (
+            "Driver={ODBC Driver 18 for SQL Server};"
+            f"Server=tcp:{host},1433;"
+            f"Database={MSSQL_DATABASE};Uid={MSSQL_USER};Pwd={MSSQL_PASSWORD};"
+            "Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=30;"
+            + ("ApplicationIntent=ReadOnly;" if readonly else "")
+        )
+
+    @staticmethod
+    @contextmanager
+    def primary() -> Iterator[None]:
+        """Send all reads within this context to the primary, e.g. to double-check a miss on a replica."""
+        token = _READ_PRIMARY.set(True)
+        try:
+            yield
+        finally:
+            _READ_PRIMARY.reset(token)
+
+    @staticmethod
+    def read_your_writes() -> None:
+        """Send the remaining reads of the current context (i.e. request) to the primary."""
+        _READ_PRIMARY.set(True)
+
+    @property
+    def replicated(self) -> bool:
+        """Whether read-only replicas are configured."""
+        return len(MSSQL_REPLICA_HOSTS) > 0
+
+    @property
+    def generation(self) -> int:
+        """The number of connection pools created so far, i.e. an identifier of the current pool."""
+        return self.__generation
 
     async def pool(self) -> aioodbc.Pool:
         await self.prepare()
-        await self.__prepared.wait()
 
         if self.__pool is None:
             raise RuntimeError("Connection pool is not initialized")
 
         return self.__pool
 
+    @asynccontextmanager
+    async def acquire(self, *, readonly: bool = False) -> AsyncIterator[aioodbc.Connection]:
+        """Acquire a connection from a pool, waiting at most `MSSQL_POOL_ACQUIRE_TIMEOUT` seconds.
+
+        Connections for `readonly` operations come from the replicas in turn, unless none is configured or the current
+        context must see its own writes (see `read_your_writes`). Other connections come from the primary.
+
+        Raises
+        -----
+        `PoolExhausted`
+            No connection became available in time.
+        """
+        pool = await self.pool()
+        if readonly and self.__replicas and not _READ_PRIMARY.get():
+            pool = self.__replicas[next(self.__replica_counter) % len(self.__replicas)]
+
+        self.__waiters += 1
+        start = time.perf_counter()
+        try:
+            connection = await asyncio.wait_for(pool.acquire(), MSSQL_POOL_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError as e:
+            raise PoolExhausted from e
+        except Exception as e:
+            self.__check_broken(pool, e)
+            raise
+        finally:
+            self.__waiters -= 1
+            DB_POOL_ACQUIRE_WAIT.observe(time.perf_counter() - start)
+
+        try:
+            yield connection
+        except Exception as e:
+            self.__check_broken(pool, e)
+            raise
+        finally:
+            await pool.release(connection)
+
+    def __check_broken(self, pool: aioodbc.Pool, error: BaseException) -> None:
+        """Remember that `pool` must be replaced by `reconnect` if `error` is a connection failure."""
+        if classify(error) == "connection":
+            self.__broken.add(pool)
+
+    @asynccontextmanager
+    async def session_lock(self, resource: str) -> AsyncIterator[bool]:
+        """Try to take an exclusive session-owned application lock on `resource`, without waiting.
+
+        The lock is held by a dedicated connection until the context exits, so that long-running jobs do not keep a
+        pooled connection (and a lock tied to its session) for their whole duration. Yield whether it was taken.
+        """
+        connection = await aioodbc.connect(dsn=self.__dsn(), autocommit=True)
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "DECLARE @Result INT\n"
+                    "EXECUTE @Result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 0\n"
+                    "SELECT @Result",
+                    resource,
+                )
+                locked = await cursor.fetchval() >= 0
+
+            yield locked
+
+        finally:
+            # Ending the session releases the lock
+            await connection.close()
+
+    def statistics(self) -> Dict[str, Any]:
+        """Report the live state of the connection pools and the distribution of acquire wait times (in seconds)."""
+        pool = self.__pool
+        size = 0 if pool is None else pool.size
+        idle = 0 if pool is None else pool.freesize
+        return {
+            "minsize": MSSQL_POOL_MIN_SIZE,
+            "maxsize": MSSQL_POOL_MAX_SIZE,
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self.__waiters,
+            "acquire_wait": DB_POOL_ACQUIRE_WAIT.labels().statistics(),
+            "replicas": [
+                {"host": host, "size": replica.size, "in_use": replica.size - replica.freesize, "idle": replica.freesize}
+                for host, replica in zip(MSSQL_REPLICA_HOSTS, self.__replicas)
+            ],
+        }
+
     async def prepare(self) -> None:
         """This function is a coroutine.
 
         Prepare the underlying connection pool. If the pool is already created, this function does nothing.
+
+        Concurrent calls share a single preparation, and all of them raise its exception if it fails.
         """
-        if self.__prepared.is_set() or self.__preparing:
+        if self.__prepared.is_set():
             return
 
-        self.__preparing = True
-        self.__pool = pool = await aioodbc.create_pool(
-            dsn=(
-                "Driver={ODBC Driver 18 for SQL Server};"
-                f"Server=tcp:{MSSQL_HOST},1433;"
-                f"Database={MSSQL_DATABASE};Uid={MSSQL_USER};Pwd={MSSQL_PASSWORD};"
-                "Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=30;"
-            ),
-            minsize=1,
-            maxsize=10,
+        if self.__preparing is None or self.__preparing.done():
+            self.__preparing = asyncio.ensure_future(self.__prepare())
+
+        await asyncio.shield(self.__preparing)
+
+    async def __create_pool(self, host: str = MSSQL_HOST, *, readonly: bool = False) -> aioodbc.Pool:
+        return await aioodbc.create_pool(
+            dsn=self.__dsn(host, readonly=readonly),
+            minsize=MSSQL_POOL_MIN_SIZE,
+            maxsize=MSSQL_POOL_MAX_SIZE,
+            pool_recycle=MSSQL_POOL_RECYCLE,
             autocommit=True,
         )
 
+    async def __prepare(self) -> None:
+        self.__pool = pool = await self.__create_pool()
+        try:
+            await self.__lease_worker_id()
+            self.__lease_watcher = asyncio.create_task(self.__watch_lease())
+            await migrate(pool)
+            for host in MSSQL_REPLICA_HOSTS:
+                self.__replicas.append(await self.__create_pool(host, readonly=True))
+
+        except BaseException:
+            await self.close()
+            raise
+
+        self.__generation += 1
         self.__prepared.set()
 
-        try:
-            fd = os.open(str(self.LOCK_FILE), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-        except FileExistsError:
-            print(f"Process {os.getpid()} will not initialize database (database.lock already exists).", file=sys.stderr)
+    async def reconnect(self, generation: int) -> None:
+        """This function is a coroutine.
+
+        Replace the connection pools that had connection failures since the pools identified by `generation` were
+        created (the primary one if none did). Callers that observed a failure on the same pools share a single rebuild,
+        and nothing happens if the pools were rebuilt since.
+
+        The worker ID lease and the migrations are left alone, and connections of the old pools that are still in use
+        (e.g. by long exports) are only closed when they are released.
+        """
+        if generation != self.__generation:
             return
 
-        else:
-            print(f"Process {os.getpid()} is initializing database...", file=sys.stderr)
-
-            async with pool.acquire() as connection:
-                async with connection.cursor() as cursor:
-                    async def execute(file: Path, *args: Any) -> None:
-                        try:
-                            with file.open("r", encoding="utf-8") as sql:
-                                await cursor.execute(sql.read(), *args)
-
-                        except Exception as e:
-                            raise RuntimeError(f"Failed to execute {file}") from e
-
-                    scripts_dir = ROOT / "scripts"
-                    await execute(
-                        scripts_dir / "schema.sql",
-                        secrets.token_hex(32),
-                        EPOCH,
+        if self.__reconnecting is None or self.__reconnecting.done():
+            self.__reconnecting = asyncio.ensure_future(self.__reconnect())
+
+        await asyncio.shield(self.__reconnecting)
+
+    async def __reconnect(self) -> None:
+        if self.__pool is None:
+            # Closed in the meantime
+            return
+
+        try:
+            for pool in list(self.__broken) or [self.__pool]:
+                if pool is self.__pool:
+                    self.__pool = await self.__create_pool()
+                    self.__retire(pool)
+                elif pool in self.__replicas:
+                    index = self.__replicas.index(pool)
+                    self.__replicas[index] = await self.__create_pool(MSSQL_REPLICA_HOSTS[index], readonly=True)
+                    self.__retire(pool)
+
+                # Otherwise, the pool was already replaced
+                self.__broken.discard(pool)
+
+        except Exception:
+            DB_RECONNECTS.inc("failure")
+            raise
+
+        self.__generation += 1
+        DB_RECONNECTS.inc("success")
+
+    def __retire(self, pool: aioodbc.Pool) -> None:
+        """Close `pool` in the background: its connections are closed as they are released."""
+        pool.close()
+        task = asyncio.create_task(pool.wait_closed())
+        self.__retired.add(task)
+        task.add_done_callback(self.__retired.discard)
+
+    @staticmethod
+    def __lease_resource(worker_id: int) -> str:
+        return f"IT3930_SnowflakeWorker_{worker_id}"
+
+    async def __lease_worker_id(self) -> None:
+        """Lease a snowflake worker ID that no other process is using.
+
+        Each worker ID is guarded by a session-owned application lock, held by a dedicated connection for as long as
+        this process runs. SQL Server releases the lock when that session ends, so IDs of crashed processes are reused.
+        The session may also end while this process is still running (network failure, `KILL`): `__watch_lease` notices
+        it within `SNOWFLAKE_LEASE_TTL` seconds, and this function waits that long before the new worker ID is used.
+        """
+        self.__lease_verified_at = -math.inf
+        connection = await aioodbc.connect(dsn=self.__dsn(), autocommit=True)
+        try:
+            async with connection.cursor() as cursor:
+                for worker_id in range(1, 1 << SnowflakeGenerator.WORKER_BITS):
+                    await cursor.execute(
+                        "DECLARE @Result INT\n"
+                        "EXECUTE @Result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 0\n"
+                        "SELECT @Result",
+                        self.__lease_resource(worker_id),
                     )
+                    if await cursor.fetchval() >= 0:
+                        break
 
-                    await execute(scripts_dir / "procedures" / "generate_id.sql")
-                    for file in scripts_dir.glob("procedures/*.sql"):
-                        if file.stem != "generate_id":
-                            await execute(file)
+                else:
+                    raise RuntimeError("All snowflake worker IDs are in use")
 
-                    await execute(scripts_dir / "views" / "view_users.sql")
-                    await execute(scripts_dir / "views" / "view_vehicles.sql")
-                    await execute(scripts_dir / "views" / "view_detected.sql")
-                    await execute(scripts_dir / "views" / "view_violations.sql")
-                    await execute(scripts_dir / "views" / "view_refutations.sql")
-                    await execute(scripts_dir / "views" / "view_transactions.sql")
+            # A previous holder whose session ended may still be generating IDs until its lease expires
+            await asyncio.sleep(SNOWFLAKE_LEASE_TTL)
 
-        finally:
-            atexit.register(self.LOCK_FILE.unlink, missing_ok=True)
-            self.__preparing = False
+        except BaseException:
+            await connection.close()
+            raise
+
+        self.__lease = connection
+        if self.__snowflake is None:
+            self.__snowflake = SnowflakeGenerator(worker_id)
+        else:
+            self.__snowflake.rebind(worker_id)
+
+        self.__lease_verified_at = time.monotonic()
+        print(f"Process {os.getpid()} leased snowflake worker ID {worker_id}", file=sys.stderr)
+
+    async def __check_lease(self) -> bool:
+        if self.__lease is None or self.__snowflake is None:
+            return False
+
+        async with self.__lease.cursor() as cursor:
+            await cursor.execute("SELECT APPLOCK_MODE('public', ?, 'Session')", self.__lease_resource(self.__snowflake.worker_id))
+            return await cursor.fetchval() == "Exclusive"
+
+    async def __watch_lease(self) -> None:
+        """Check the lease of the worker ID every `SNOWFLAKE_LEASE_CHECK_INTERVAL` seconds, and lease another one if it was lost.
+
+        A check that fails or stalls does not stop ID generation by itself: `generate_id` keeps going until the lease was
+        last confirmed `SNOWFLAKE_LEASE_TTL` seconds ago.
+        """
+        while True:
+            await asyncio.sleep(SNOWFLAKE_LEASE_CHECK_INTERVAL)
+            start = time.monotonic()
+            try:
+                held: Optional[bool] = await asyncio.wait_for(self.__check_lease(), SNOWFLAKE_LEASE_TTL)
+            except Exception:
+                # Unknown: check again until the lease expires
+                held = None if time.monotonic() - self.__lease_verified_at <= SNOWFLAKE_LEASE_TTL else False
+
+            if held:
+                self.__lease_verified_at = start
+                continue
+
+            if held is None:
+                continue
+
+            # Stop generating IDs right away, another process may lease the same worker ID
+            self.__lease_verified_at = -math.inf
+            print(f"Process {os.getpid()} lost its snowflake worker ID lease, leasing another one...", file=sys.stderr)
+            lease, self.__lease = self.__lease, None
+            if lease is not None:
+                try:
+                    await lease.close()
+                except Exception:
+                    pass
+
+            try:
+                await self.__lease_worker_id()
+            except Exception as e:
+                print(f"Failed to lease a snowflake worker ID: {e!r}", file=sys.stderr)
+
+    def generate_id(self) -> int:
+        """Generate a new snowflake ID. The connection pool must have been prepared.
+
+        Raises
+        -----
+        `DatabaseUnavailable`
+            The lease of the worker ID was not confirmed within the last `SNOWFLAKE_LEASE_TTL` seconds.
+        """
+        if self.__snowflake is None:
+            raise RuntimeError("Snowflake worker ID is not leased")
+
+        if time.monotonic() - self.__lease_verified_at > SNOWFLAKE_LEASE_TTL:
+            raise DatabaseUnavailable(SNOWFLAKE_LEASE_CHECK_INTERVAL)
+
+        return self.__snowflake.generate()
 
     async def close(self) -> None:
         if self.__closing:
@@ -132,45 +477,97 @@ class Database:
         self.__closing = True
         try:
             pool = self.__pool
+            replicas = self.__replicas
+            lease = self.__lease
+            watcher = self.__lease_watcher
             self.__prepared.clear()
             self.__pool = None
-            self.LOCK_FILE.unlink(missing_ok=True)
+            self.__replicas = []
+            self.__lease = None
+            self.__lease_watcher = None
+            self.__lease_verified_at = -math.inf
+
+            if watcher is not None:
+                watcher.cancel()
 
-            if pool is not None:
-                pool.close()
-                await pool.wait_closed()
+            if lease is not None:
+                try:
+                    await lease.close()
+                except Exception:
+                    pass  # The session (and the application lock) is gone anyway
+
+            self.__broken.clear()
+            for p in ([] if pool is None else [pool]) + replicas:
+                p.close()
+                await p.wait_closed()
+
+            await asyncio.gather(*self.__retired, return_exceptions=True)
 
         finally:
             self.__closing = False
 
     @classmethod
     def retry(cls) -> Callable[[_CoroFunc[_P, _T]], _CoroFunc[_P, _T]]:
-        def decorator(func: _CoroFunc[_P, _T]) -> _CoroFunc[_P, _T]:
+        """Retry the decorated coroutine function after connection failures, deadlocks and timeouts.
 
-            async def _impl(*args: _P.args, **kwargs: _P.kwargs) -> _T:
-                try:
-                    return await func(*args, **kwargs)
+        Retries wait for a random delay with an exponentially growing upper bound (up to `DB_RETRY_ATTEMPTS` times).
+        After a connection failure, the failed pool is replaced once for all concurrent callers. While the circuit breaker
+        is open, calls raise `DatabaseUnavailable` immediately.
 
-                except ProgrammingError as e:
-                    # Handle connection failure
+        A statement that timed out or lost its connection may still have been committed, so the decorated function is
+        replayed as is: generate the IDs of new rows (see `generate_id`) before calling it, so that a replayed insert
+        fails on the primary key instead of inserting a duplicate.
+
+        Each call is also recorded in the `db_query_*` metrics, labeled with the function's qualified name.
+        """
+        def decorator(func: _CoroFunc[_P, _T]) -> _CoroFunc[_P, _T]:
+            operation = func.__qualname__
+
+            async def _attempt(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+                for attempt in itertools.count():
+                    generation = cls.instance.generation
                     try:
-                        original = e.__context__
-                        if isinstance(original, OperationalError):
-                            error_code = original.args[0]
-                        else:
+                        return await func(*args, **kwargs)
+
+                    except Exception as e:
+                        kind = classify(e)
+                        if kind is None or attempt >= DB_RETRY_ATTEMPTS:
                             raise
 
-                    except (AttributeError, IndexError):
-                        pass
+                        DB_QUERY_RETRIES.inc(operation, kind)
+                        await asyncio.sleep(random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * 2 ** attempt)))
+                        if kind == "connection":
+                            await cls.instance.reconnect(generation)
 
-                    else:
-                        if error_code == "08S01":
-                            await cls.instance.close()
-                            await cls.instance.prepare()
+                raise AssertionError("unreachable")
 
-                            return await func(*args, **kwargs)
+            async def _impl(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+                breaker = cls.instance.breaker
+                if not breaker.allow():
+                    raise DatabaseUnavailable(breaker.retry_after())
+
+                start = time.perf_counter()
+                try:
+                    result = await _attempt(*args, **kwargs)
+                except Exception as e:
+                    DB_QUERY_ERRORS.inc(operation)
+                    if classify(e) in ("connection", "timeout"):
+                        breaker.failure()
+                    elif not isinstance(e, PoolExhausted):
+                        # The database answered, e.g. with a constraint violation
+                        breaker.success()
 
                     raise
+                finally:
+                    DB_QUERY_DURATION.observe(time.perf_counter() - start, operation)
+
+                breaker.success()
+                if isinstance(result, list):
+                    DB_QUERY_ROWS.observe(len(result), operation)
+                else:
+                    DB_QUERY_ROWS.observe(0 if result is None else 1, operation)
+
+                return result
 
             return _impl
 
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Generic, Iterator, List, Optional, TypeVar, TYPE_CHECKING
+
+
+__all__ = ("DataLoader", "loader", "loader_scope")
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+_BatchFunc = Callable[[List[_K]], Awaitable[Dict[_K, _V]]]
+# Loaders of the current request, by name
+_LOADERS: ContextVar[Optional[Dict[str, DataLoader[Any, Any]]]] = ContextVar("_LOADERS", default=None)
+
+
+class DataLoader(Generic[_K, _V]):
+    """Coalesce lookups by key into batches.
+
+    Keys requested during the same iteration of the event loop are fetched by a single call to `batch`, which maps the
+    keys it found to their values. Results, including misses and errors, are memoized for the lifetime of the loader,
+    i.e. for the current request (see `loader`).
+    """
+
+    __slots__ = ("__batch", "__futures", "__pending")
+    if TYPE_CHECKING:
+        __batch: _BatchFunc[_K, _V]
+        __futures: Dict[_K, asyncio.Future[Optional[_V]]]
+        __pending: List[_K]
+
+    def __init__(self, batch: _BatchFunc[_K, _V]) -> None:
+        self.__batch = batch
+        self.__futures = {}
+        self.__pending = []
+
+    async def load(self, key: _K) -> Optional[_V]:
+        """Load the value of `key`, or `None` if `batch` did not find it."""
+        future = self.__futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            self.__futures[key] = future = loop.create_future()
+            self.__pending.append(key)
+            if len(self.__pending) == 1:
+                loop.call_soon(lambda: asyncio.ensure_future(self.__dispatch()))
+
+        # A cancelled caller must not cancel the lookup shared with the other callers
+        return await asyncio.shield(future)
+
+    async def __dispatch(self) -> None:
+        keys, self.__pending = self.__pending, []
+        try:
+            values = await self.__batch(keys)
+        except BaseException as e:
+            for key in keys:
+                future = self.__futures[key]
+                if not future.done():
+                    future.set_exception(e)
+                    # Retrieve it, in case no caller is left to do so
+                    future.exception()
+
+            if not isinstance(e, Exception):
+                raise
+
+            return
+
+        for key in keys:
+            future = self.__futures[key]
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+@contextmanager
+def loader_scope() -> Iterator[None]:
+    """Share loaders (and their results) within this context, e.g. a request."""
+    token = _LOADERS.set({})
+    try:
+        yield
+    finally:
+        _LOADERS.reset(token)
+
+
+def loader(name: str, batch: _BatchFunc[_K, _V]) -> DataLoader[_K, _V]:
+    """Get the loader `name` of the current scope, creating it with `batch` if needed.
+
+    Outside of a `loader_scope`, a new loader is returned each time, i.e. nothing is coalesced.
+    """
+    loaders = _LOADERS.get()
+    if loaders is None:
+        return DataLoader(batch)
+
+    try:
+        return loaders[name]
+    except KeyError:
+        loaders[name] = result = DataLoader(batch)
+        return result
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import bisect
+from typing import Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Literal, Sequence, Tuple, TYPE_CHECKING
+
+
+__all__ = (
+    "Histogram",
+    "Metric",
+    "Counter",
+    "Gauge",
+    "HistogramFamily",
+    "exposition",
+    "HTTP_REQUESTS",
+    "HTTP_REQUEST_DURATION",
+    "DB_QUERY_DURATION",
+    "DB_QUERY_ROWS",
+    "DB_QUERY_RETRIES",
+    "DB_QUERY_ERRORS",
+    "DB_POOL_ACQUIRE_WAIT",
+    "DB_RECONNECTS",
+    "CIRCUIT_TRANSITIONS",
+    "CIRCUIT_REJECTED",
+)
+_Labels = Tuple[str, ...]
+
+
+class Histogram:
+    """A histogram with fixed bucket upper bounds (in the style of Prometheus)."""
+
+    DEFAULT_BUCKETS: ClassVar[Tuple[float, ...]] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    __slots__ = ("buckets", "counts", "count", "sum")
+    if TYPE_CHECKING:
+        buckets: Tuple[float, ...]
+        counts: List[int]
+        count: int
+        sum: float
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Return (upper bound, cumulative count) pairs, ending with (+Inf, total count)."""
+        result: List[Tuple[float, int]] = []
+        total = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+    def statistics(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in self.cumulative()},
+        }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    return "{" + ",".join(f"{name}=\"{_escape(value)}\"" for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of all metrics exposed by `/metrics`.
+
+    Every instance is registered in `Metric.instances` under its name, in creation order.
+    """
+
+    instances: ClassVar[Dict[str, Metric]] = {}
+    type: ClassVar[str] = "untyped"
+    __slots__ = ("name", "documentation", "labelnames")
+    if TYPE_CHECKING:
+        name: str
+        documentation: str
+        labelnames: _Labels
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        if name in self.instances:
+            raise ValueError(f"Duplicate metric {name!r}")
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.instances[name] = self
+
+    def _check_labels(self, labels: _Labels) -> None:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (sample name, formatted labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for name, labels, value in self.samples():
+            yield f"{name}{labels} {_format_value(value)}"
+
+
+class Counter(Metric):
+    """A monotonically increasing value, partitioned by label values."""
+
+    type = "counter"
+    __slots__ = ("values",)
+    if TYPE_CHECKING:
+        values: Dict[_Labels, float]
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        try:
+            self.values[labels] += amount
+        except KeyError:
+            self._check_labels(labels)
+            self.values[labels] = amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Metric):
+    """A metric whose values are read from `callback` at exposition time.
+
+    `callback` returns (label values, value) pairs. Set `type` to `"counter"` when the reported values only increase.
+    """
+
+    __slots__ = ("callback", "type")
+    if TYPE_CHECKING:
+        callback: Callable[[], Iterable[Tuple[_Labels, float]]]
+        type: str  # type: ignore[misc]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[_Labels, float]]],
+        *,
+        type: Literal["gauge", "counter"] = "gauge",
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.type = type
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in self.callback():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class HistogramFamily(Metric):
+    """A set of `Histogram`s sharing the same buckets, partitioned by label values."""
+
+    type = "histogram"
+    __slots__ = ("buckets", "children")
+    if TYPE_CHECKING:
+        buckets: Tuple[float, ...]
+        children: Dict[_Labels, Histogram]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.children = {}
+
+    def labels(self, *labels: str) -> Histogram:
+        try:
+            return self.children[labels]
+        except KeyError:
+            self._check_labels(labels)
+            child = self.children[labels] = Histogram(self.buckets)
+            return child
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, histogram in self.children.items():
+            for bound, count in histogram.cumulative():
+                yield f"{self.name}_bucket", _format_labels((*self.labelnames, "le"), (*labels, _format_value(bound))), count
+
+            formatted = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum", formatted, histogram.sum
+            yield f"{self.name}_count", formatted, histogram.count
+
+
+def exposition() -> str:
+    """Render all registered metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in Metric.instances.values():
+        lines.extend(metric.render())
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "Number of HTTP requests handled", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = HistogramFamily("http_request_duration_seconds", "Time spent handling HTTP requests", ("method", "route"))
+DB_QUERY_DURATION = HistogramFamily("db_query_duration_seconds", "Time spent in database operations, including retries", ("operation",))
+DB_QUERY_ROWS = HistogramFamily(
+    "db_query_rows",
+    "Number of rows returned by database operations",
+    ("operation",),
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000),
+)
+DB_QUERY_RETRIES = Counter(
+    "db_query_retries_total",
+    "Number of database operations retried, by the kind of the failure (connection, deadlock or timeout)",
+    ("operation", "reason"),
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Number of database operations that raised an exception", ("operation",))
+DB_POOL_ACQUIRE_WAIT = HistogramFamily("db_pool_acquire_wait_seconds", "Time spent waiting for a pooled connection")
+DB_RECONNECTS = Counter("db_reconnects_total", "Number of connection pool rebuilds after connection failures", ("outcome",))
+CIRCUIT_TRANSITIONS = Counter("circuit_breaker_transitions_total", "Number of circuit breaker state changes", ("breaker", "state"))
+CIRCUIT_REJECTED = Counter("circuit_breaker_rejected_total", "Number of calls rejected by an open circuit breaker", ("breaker",))
+DETECTED_RETENTION_ROWS = Counter(
+    "detected_retention_rows_total",
+    "Number of detected violations purged by the retention worker, by archive destination (none, table or file)",
+    ("archive",),
+)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import time
+from typing import Optional, TYPE_CHECKING
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .cache import TTLCache
+from .config import AUTH_CACHE_SIZE, DB_READ_YOUR_WRITES_WINDOW, READ_PRIMARY_HEADER
+from .database import Database
+from .loader import loader_scope
+from .metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
+
+
+__all__ = ("DataLoaderMiddleware", "MetricsMiddleware", "ReadYourWritesMiddleware")
+# Methods that do not change any state
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+# The `Authorization` headers of callers that wrote within the last `DB_READ_YOUR_WRITES_WINDOW` seconds
+RECENT_WRITERS = TTLCache[str, bool]("recent_writers", maxsize=AUTH_CACHE_SIZE, ttl=DB_READ_YOUR_WRITES_WINDOW)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency and status of HTTP requests, labeled by route template.
+
+    The latency covers the whole response, including the body of streaming responses.
+    Requests that match no route are labeled `"<unmatched>"` to keep the label cardinality bounded.
+    """
+
+    __slots__ = ("app",)
+    if TYPE_CHECKING:
+        app: ASGIApp
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware sending the reads of a caller to the primary shortly after its own writes.
+
+    Requests with an unsafe method read from the primary for their whole duration. After a successful one, the caller's
+    requests read from the primary for `DB_READ_YOUR_WRITES_WINDOW` seconds, which should exceed the replication lag.
+    The caller is recognized by its `Authorization` header within this process, and by the `READ_PRIMARY_HEADER`
+    timestamp of the response, which clients echo back, across processes. Without replicas, this middleware does nothing.
+
+    Neither is verified here: a caller can only send its own reads to the primary, for at most the window.
+    """
+
+    __slots__ = ("app",)
+    if TYPE_CHECKING:
+        app: ASGIApp
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not Database.instance.replicated:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        authorization = headers.get("authorization")
+        write = scope["method"] not in SAFE_METHODS
+        if write or self.__recent_writer(authorization, headers.get(READ_PRIMARY_HEADER)):
+            Database.read_your_writes()
+
+        async def send_wrapper(message: Message) -> None:
+            if write and message["type"] == "http.response.start" and message["status"] < 400:
+                if authorization is not None:
+                    RECENT_WRITERS.set(authorization, True)
+
+                MutableHeaders(scope=message)[READ_PRIMARY_HEADER] = f"{time.time() + DB_READ_YOUR_WRITES_WINDOW:.3f}"
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def __recent_writer(authorization: Optional[str], until: Optional[str]) -> bool:
+        if authorization is not None and RECENT_WRITERS.get(authorization):
+            return True
+
+        if until is not None:
+            try:
+                # Bounded, so that a client cannot pin its reads to the primary
+                return 0 < float(until) - time.time() <= DB_READ_YOUR_WRITES_WINDOW
+            except ValueError:
+                pass
+
+        return False
+
+
+class DataLoaderMiddleware:
+    """ASGI middleware giving each HTTP request its own data loaders (see `loader`)."""
+
+    __slots__ = ("app",)
+    if TYPE_CHECKING:
+        app: ASGIApp
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with loader_scope():
+            await self.app(scope, receive, send)
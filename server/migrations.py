@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import secrets
+import sys
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, List, NamedTuple, Tuple
+
+import aioodbc  # type: ignore
+
+from .config import DB_MIGRATION_LOCK_TIMEOUT, EPOCH, ROOT
+
+
+__all__ = ("Migration", "migrate")
+SCRIPTS_DIR = ROOT / "scripts"
+# Views must be created after the views they select from
+VIEWS = ("view_users", "view_vehicles", "view_detected", "view_violations", "view_refutations", "view_transactions")
+
+
+class Migration(NamedTuple):
+    """A SQL script under `scripts/`, identified by its path and versioned by the checksum of its content.
+
+    All scripts are idempotent (`IF NOT EXISTS` guards, `CREATE OR ALTER`), so a changed script is simply applied again.
+    """
+
+    name: str
+    sql: str
+    checksum: str
+
+    @classmethod
+    def load(cls, path: Path) -> Migration:
+        sql = path.read_text(encoding="utf-8")
+        return cls(
+            name=path.relative_to(SCRIPTS_DIR).as_posix(),
+            sql=sql,
+            checksum=sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest(),
+        )
+
+    def arguments(self) -> Tuple[Any, ...]:
+        if self.name == "schema.sql":
+            # Only used when the database is created
+            return secrets.token_hex(32), EPOCH
+
+        return ()
+
+
+def migrations() -> List[Migration]:
+    """All migrations, in the order they must be applied."""
+    procedures = sorted(SCRIPTS_DIR.glob("procedures/*.sql"), key=lambda path: (path.stem != "generate_id", path.stem))
+    return [
+        Migration.load(SCRIPTS_DIR / "schema.sql"),
+        *map(Migration.load, procedures),
+        *(Migration.load(SCRIPTS_DIR / "views" / f"{view}.sql") for view in VIEWS),
+    ]
+
+
+async def __pending(cursor: aioodbc.Cursor, scripts: List[Migration]) -> List[Migration]:
+    await cursor.execute(
+        "IF OBJECT_ID('IT3930_Migrations', 'U') IS NOT NULL\n"
+        "    SELECT name, checksum FROM IT3930_Migrations\n"
+        "ELSE\n"
+        "    SELECT CAST(NULL AS NVARCHAR(255)) AS name, CAST(NULL AS CHAR(64)) AS checksum WHERE 1 = 0",
+    )
+    applied = {row.name: row.checksum for row in await cursor.fetchall()}
+    return [migration for migration in scripts if applied.get(migration.name) != migration.checksum]
+
+
+async def migrate(pool: aioodbc.Pool) -> None:
+    """This function is a coroutine.
+
+    Apply all pending migrations. Concurrent calls from other processes are serialized by a session-owned application
+    lock, so every process returns only once the schema is up to date. If nothing is pending, the lock is not taken.
+    """
+    scripts = migrations()
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            if not await __pending(cursor, scripts):
+                print(f"Process {os.getpid()} found the database schema up to date.", file=sys.stderr)
+                return
+
+            print(f"Process {os.getpid()} is waiting for the migration lock...", file=sys.stderr)
+            await cursor.execute(
+                "DECLARE @Result INT\n"
+                "EXECUTE @Result = sp_getapplock @Resource = 'IT3930_Migrations', @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = ?\n"
+                "SELECT @Result",
+                int(1000 * DB_MIGRATION_LOCK_TIMEOUT),
+            )
+            if await cursor.fetchval() < 0:
+                raise RuntimeError(f"Could not acquire the migration lock within {DB_MIGRATION_LOCK_TIMEOUT} seconds")
+
+            try:
+                await cursor.execute(
+                    "IF OBJECT_ID('IT3930_Migrations', 'U') IS NULL\n"
+                    "    CREATE TABLE IT3930_Migrations (\n"
+                    "        name NVARCHAR(255) PRIMARY KEY,\n"
+                    "        checksum CHAR(64) NOT NULL,\n"
+                    "        applied_at DATETIME2 NOT NULL CONSTRAINT DF_Migrations_applied_at DEFAULT SYSUTCDATETIME()\n"
+                    "    )",
+                )
+
+                # Another process may have applied some of them while we were waiting for the lock
+                for migration in await __pending(cursor, scripts):
+                    print(f"Process {os.getpid()} is applying {migration.name}...", file=sys.stderr)
+                    # A script and its checksum are committed together, so that a failed script is applied again next time.
+                    # CREATE OR ALTER must start its batch, hence the separate BEGIN TRANSACTION.
+                    await cursor.execute("BEGIN TRANSACTION")
+                    try:
+                        await cursor.execute(migration.sql, *migration.arguments())
+                        # Errors of the statements after the first result set are only raised when their result is reached
+                        while await cursor.nextset():
+                            pass
+
+                        await cursor.execute(
+                            "UPDATE IT3930_Migrations SET checksum = ?, applied_at = SYSUTCDATETIME() WHERE name = ?\n"
+                            "IF @@ROWCOUNT = 0\n"
+                            "    INSERT INTO IT3930_Migrations (name, checksum) VALUES (?, ?)",
+                            migration.checksum, migration.name, migration.name, migration.checksum,
+                        )
+                        await cursor.execute("COMMIT TRANSACTION")
+
+                    except Exception as e:
+                        await cursor.execute("IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION")
+                        raise RuntimeError(f"Failed to apply {migration.name}") from e
+
+            finally:
+                await cursor.execute("EXECUTE sp_releaseapplock @Resource = 'IT3930_Migrations', @LockOwner = 'Session'")
@@ -1,6 +1,9 @@
+from .count import *
 from .detected import *
+from .projection import *
 from .refutations import *
 from .snowflake import *
+from .statistics import *
 from .transactions import *
 from .users import *
 from .vehicles import *
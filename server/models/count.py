@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Annotated, Optional
+
+import aioodbc  # type: ignore
+from pydantic import BaseModel, Field
+
+from ..utils import snowflake_range
+
+
+__all__ = ("Count",)
+
+
+class Count(BaseModel):
+    """The number of objects matching a query."""
+
+    count: Annotated[int, Field(description="The number of matching objects")]
+    approximate: Annotated[bool, Field(description="Whether `count` was estimated from table statistics")]
+
+    @classmethod
+    async def estimate(
+        cls,
+        cursor: aioodbc.Cursor,
+        table: str,
+        *,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+    ) -> Optional[Count]:
+        """Estimate the number of rows of `table` with a snowflake ID in `[min_id, max_id]` without reading them.
+
+        The row count of the table comes from its partition metadata. For an ID range, the histogram of its primary key
+        statistics is interpolated, and rows inserted since the statistics were computed (i.e. after the last histogram
+        step, as IDs increase) are spread evenly up to the current time. Return `None` if the table has no histogram yet.
+        """
+        await cursor.execute(
+            "SELECT CAST(SUM(rows) AS BIGINT) FROM sys.partitions WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)",
+            table,
+        )
+        total = await cursor.fetchval() or 0
+        if min_id is None and max_id is None:
+            return cls(count=total, approximate=True)
+
+        await cursor.execute(
+            "SELECT CAST(h.range_high_key AS BIGINT) AS high_key, h.range_rows, h.equal_rows, p.rows AS sampled_rows\n"
+            "FROM sys.indexes i\n"
+            "CROSS APPLY sys.dm_db_stats_histogram(i.object_id, i.index_id) h\n"
+            "CROSS APPLY sys.dm_db_stats_properties(i.object_id, i.index_id) p\n"
+            "WHERE i.object_id = OBJECT_ID(?) AND i.is_primary_key = 1\n"
+            "ORDER BY h.step_number",
+            table,
+        )
+        steps = await cursor.fetchall()
+        if not steps:
+            return None
+
+        low = 0 if min_id is None else min_id
+        high = (1 << 63) - 1 if max_id is None else max_id
+
+        def overlap(start: int, end: int) -> float:
+            """The fraction of the IDs in `[start, end]` that are also in `[low, high]`."""
+            if end < start:
+                return 0.0
+
+            return max(0, min(end, high) - max(start, low) + 1) / (end - start + 1)
+
+        estimate = 0.0
+        previous: Optional[int] = None
+        for step in steps:
+            # `range_rows` counts the rows strictly between the previous and the current upper bound
+            if previous is None:
+                fraction = 1.0 if low < step.high_key else 0.0
+            else:
+                fraction = overlap(previous + 1, step.high_key - 1)
+
+            estimate += step.range_rows * fraction
+            if low <= step.high_key <= high:
+                estimate += step.equal_rows
+
+            previous = step.high_key
+
+        now = snowflake_range(None, datetime.now(timezone.utc))[1]
+        inserted = max(0, total - steps[0].sampled_rows)
+        estimate += inserted * overlap(steps[-1].high_key + 1, max(now, steps[-1].high_key + 1))
+        return cls(count=round(estimate), approximate=True)
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Literal, Optional
+from typing import Annotated, Any, ClassVar, Dict, List, Literal, Optional, Sequence, Set, Tuple, Union
 
 from pydantic import Field
 from pyodbc import Row  # type: ignore
 
+from .count import Count
+from .projection import ProjectedPage, Projection, nest
 from .snowflake import Snowflake
 from .vehicles import Vehicle
 from ..config import DB_PAGINATION_QUERY
 from ..database import Database
-from ..utils import SQLBuildHelper
+from ..utils import PlateMatch, SQLBuildHelper, plate_condition
 
 
 __all__ = ("Detected",)
@@ -22,6 +24,14 @@ class Detected(Snowflake):
     video_url: Annotated[str, Field(description="The URL to the video")]
     vehicle: Annotated[Vehicle, Field(description="The vehicle associated with this detected violation")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "id": "detected_id",
+        "created_at": "detected_id",
+        "category": "detected_category",
+        "video_url": "detected_video_url",
+        **nest(Vehicle.COLUMNS, "vehicle"),
+    }
+
     @classmethod
     def from_row(cls, row: Row) -> Detected:
         return cls(
@@ -31,6 +41,51 @@ class Detected(Snowflake):
             vehicle=Vehicle.from_row(row),
         )
 
+    @staticmethod
+    def __builder(
+        pre_query: str,
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        detected_id: Optional[int] = None,
+        detected_category: Optional[Literal[0, 1, 2]] = None,
+        detected_video_url: Optional[str] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            "detected_id = ?",
+            detected_id,
+        ).add_condition(
+            "detected_category = ?",
+            detected_category,
+        ).add_condition(
+            "detected_video_url LIKE ?",
+            detected_video_url,
+            recompile=True,
+        ).add_condition(
+            *plate_condition(vehicle_plate, plate_match),
+            recompile=plate_match == "pattern",
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "detected_id < ?",
+            before_id,
+        ).add_condition(
+            "detected_id >= ?",
+            min_id,
+        ).add_condition(
+            "detected_id <= ?",
+            max_id,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
@@ -40,37 +95,27 @@ class Detected(Snowflake):
         detected_category: Optional[Literal[0, 1, 2]] = None,
         detected_video_url: Optional[str] = None,
         vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
         user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
         min_id: Optional[int] = None,
         max_id: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[Detected]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_detected",
-                    ("ORDER BY detected_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "detected_id = ?",
-                    detected_id,
-                ).add_condition(
-                    "detected_category = ?",
-                    detected_category,
-                ).add_condition(
-                    "detected_video_url LIKE ?",
-                    detected_video_url,
-                ).add_condition(
-                    "vehicle_plate LIKE ?",
-                    vehicle_plate,
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "detected_id >= ?",
-                    min_id,
-                ).add_condition(
-                    "detected_id <= ?",
-                    max_id,
+                    ("ORDER BY detected_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    detected_id=detected_id,
+                    detected_category=detected_category,
+                    detected_video_url=detected_video_url,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
                 )
 
                 await builder.execute(cursor.execute)
@@ -78,23 +123,167 @@ class Detected(Snowflake):
 
         return [cls.from_row(row) for row in rows]
 
-    @staticmethod
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        detected_id: Optional[int] = None,
+        detected_category: Optional[Literal[0, 1, 2]] = None,
+        detected_video_url: Optional[str] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the detected violations matching the same filters as `query`.
+
+        If `approximate` and the detected violations are only filtered by ID, the count is estimated from table statistics
+        (see `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        detected_id,
+                        detected_category,
+                        detected_video_url,
+                        vehicle_plate,
+                        user_id,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Detected", min_id=min_id, max_id=max_id)
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_detected",
+                    "",
+                    detected_id=detected_id,
+                    detected_category=detected_category,
+                    detected_video_url=detected_video_url,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
+    @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        detected_id: Optional[int] = None,
+        detected_category: Optional[Literal[0, 1, 2]] = None,
+        detected_video_url: Optional[str] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="detected_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_detected",
+                    ("ORDER BY detected_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    detected_id=detected_id,
+                    detected_category=detected_category,
+                    detected_video_url=detected_video_url,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @classmethod
     @Database.retry()
+    async def since(cls, after_id: int, *, limit: int = DB_PAGINATION_QUERY) -> ProjectedPage:
+        """Query the first `limit` detected violations with an ID greater than `after_id`, sorted by ID in ascending order.
+
+        Like `project` with all fields, objects are returned as dictionaries.
+        """
+        projection = Projection(cls.COLUMNS, None, key="detected_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_detected",
+                    ("ORDER BY detected_id OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    min_id=after_id + 1,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @staticmethod
     async def create(
         *,
         detected_category: Literal[0, 1, 2],
         vehicle_plate: str,
         detected_video_url: str,
     ) -> int:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        id = Database.instance.generate_id()
+        await Detected.__insert(id=id, detected_category=detected_category, vehicle_plate=vehicle_plate, detected_video_url=detected_video_url)
+        return id
+
+    @staticmethod
+    @Database.retry()
+    async def __insert(
+        *,
+        id: int,
+        detected_category: Literal[0, 1, 2],
+        vehicle_plate: str,
+        detected_video_url: str,
+    ) -> None:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    "EXECUTE create_detected @Category = ?, @Plate = ?, @VideoUrl = ?",
-                    detected_category, vehicle_plate, detected_video_url,
+                    "EXECUTE create_detected @Category = ?, @Plate = ?, @VideoUrl = ?, @Id = ?",
+                    detected_category, vehicle_plate, detected_video_url, id,
                 )
-                id = await cursor.fetchval()
-                return id
+
+    @staticmethod
+    async def create_many(items: Sequence[Tuple[Literal[0, 1, 2], str, str]]) -> List[Optional[int]]:
+        """Add multiple detected violations in a single round trip.
+
+        Each item is a tuple of (category, vehicle plate, video URL). Return the ID of each new detected violation,
+        in the same order as `items`, or `None` for items whose vehicle does not exist.
+        """
+        ids = [Database.instance.generate_id() for _ in items]
+        inserted = await Detected.__insert_many([(id, *item) for id, item in zip(ids, items)])
+        return [id if id in inserted else None for id in ids]
+
+    @staticmethod
+    @Database.retry()
+    async def __insert_many(rows: List[Tuple[int, Literal[0, 1, 2], str, str]]) -> Set[int]:
+        async with Database.instance.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("{CALL create_detected_batch (?)}", rows)
+                return {row.id for row in await cursor.fetchall()}
 
     @staticmethod
     @Database.retry()
@@ -102,8 +291,7 @@ class Detected(Snowflake):
         *,
         detected_id: int
     ) -> bool:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
                     "EXECUTE delete_detected @Id = ?",
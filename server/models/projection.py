@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
+
+from fastapi import Response
+from pyodbc import Row  # type: ignore
+
+from ..utils import json_response, snowflake_time
+
+
+__all__ = ("UnknownField", "Projection", "ProjectedPage", "nest")
+
+
+class UnknownField(ValueError):
+    """Raised when a client selects a field that does not exist."""
+
+
+def nest(columns: Mapping[str, str], field: str, prefix: Optional[str] = None) -> Dict[str, str]:
+    """Map the field paths of a nested model to the columns of the parent model's view.
+
+    If `prefix` is given, it replaces the `user_` prefix of the nested columns (e.g. `creator_` for `creator_id`).
+    """
+    return {
+        f"{field}.{path}": column if prefix is None else prefix + column.removeprefix("user_")
+        for path, column in columns.items()
+    }
+
+
+# (field name, column index, is a snowflake timestamp, nested fields) of each field of an object
+_Node = Tuple[Tuple[str, int, bool, "_Node"], ...]
+
+
+class ProjectedPage(NamedTuple):
+    """A page of partial objects returned by a `project` query."""
+
+    items: List[Dict[str, Any]]
+    # Sort key of the last row if the page is full (i.e. there may be more results)
+    last_key: Optional[Any]
+
+    def to_response(self) -> Response:
+        return json_response(self.items, next_cursor=self.last_key)
+
+
+class Projection:
+    """A sparse selection of the fields of a model, resolved to the columns of its database view.
+
+    `columns` maps every (dotted) leaf field path of the model to a column. Selecting a field selects all of its nested
+    fields, and `None` selects all fields. `created_at` fields are computed from the snowflake ID column they are mapped
+    to.
+
+    Rows are turned into plain dictionaries that serialize like the model itself, which skips model construction and
+    validation entirely: list endpoints use this with all fields selected as their serialization fast path.
+    """
+
+    __slots__ = ("__tree", "__columns", "__key_index")
+    if TYPE_CHECKING:
+        __tree: _Node
+        __columns: List[str]
+        __key_index: int
+
+    def __init__(self, columns: Mapping[str, str], fields: Optional[str], *, key: str) -> None:
+        selected: Set[str]
+        if fields is None:
+            selected = set(columns)
+
+        else:
+            requested = [field.strip() for field in fields.split(",") if field.strip()]
+            if not requested:
+                raise UnknownField(fields)
+
+            selected = set()
+            for field in requested:
+                matched = [path for path in columns if path == field or path.startswith(field + ".")]
+                if not matched:
+                    raise UnknownField(field)
+
+                selected.update(matched)
+
+        # Nested dictionaries of field path parts, with column indices as leaves
+        tree: Dict[str, Any] = {}
+        self.__columns = []
+        for path, column in columns.items():
+            if path in selected:
+                *parents, name = path.split(".")
+                node = tree
+                for part in parents:
+                    node = node.setdefault(part, {})
+
+                node[name] = self.__column_index(column)
+
+        self.__tree = self.__compile(tree)
+
+        # The sort key is always selected, for pagination
+        self.__key_index = self.__column_index(key)
+
+    def __column_index(self, column: str) -> int:
+        try:
+            return self.__columns.index(column)
+        except ValueError:
+            self.__columns.append(column)
+            return len(self.__columns) - 1
+
+    @classmethod
+    def __compile(cls, tree: Dict[str, Any]) -> _Node:
+        return tuple(
+            (name, -1, False, cls.__compile(value)) if isinstance(value, dict) else (name, value, name == "created_at", ())
+            for name, value in tree.items()
+        )
+
+    @property
+    def sql(self) -> str:
+        """The select list of the projected columns. Column names come from the model, never from the client."""
+        return ", ".join(self.__columns)
+
+    @staticmethod
+    def __build(node: _Node, row: Row) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for name, index, snowflake, children in node:
+            if children:
+                result[name] = Projection.__build(children, row)
+            elif snowflake:
+                result[name] = snowflake_time(row[index])
+            else:
+                result[name] = row[index]
+
+        return result
+
+    def build(self, row: Row) -> Dict[str, Any]:
+        return self.__build(self.__tree, row)
+
+    def page(self, rows: List[Row], limit: int) -> ProjectedPage:
+        return ProjectedPage(
+            items=[self.__build(self.__tree, row) for row in rows],
+            last_key=rows[-1][self.__key_index] if len(rows) == limit else None,
+        )
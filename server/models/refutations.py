@@ -1,19 +1,24 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Optional
+import json
+from typing import Annotated, Any, ClassVar, Dict, List, Literal, Optional, Tuple, Union
 
 from pydantic import Field
 from pyodbc import Row  # type: ignore
 
+from .count import Count
+from .projection import ProjectedPage, Projection, nest
 from .snowflake import Snowflake
 from .users import User
 from .violations import Violation
 from ..config import DB_PAGINATION_QUERY
 from ..database import Database
-from ..utils import SQLBuildHelper
+from ..search import terms, terms_json
+from ..utils import PlateMatch, SQLBuildHelper, plate_condition
 
 
 __all__ = ("Refutation",)
+SEARCH_FIELDS = {"message": 0, "response": 1}
 
 
 class Refutation(Snowflake):
@@ -24,6 +29,15 @@ class Refutation(Snowflake):
     author: Annotated[User, Field(description="The user who created the refutation")]
     violation: Annotated[Violation, Field(description="The violation associated with this refutation")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "id": "refutation_id",
+        "created_at": "refutation_id",
+        "message": "refutation_message",
+        "response": "refutation_response",
+        **nest(User.COLUMNS, "author", "author_"),
+        **nest(Violation.COLUMNS, "violation"),
+    }
+
     @classmethod
     def from_row(cls, row: Row) -> Refutation:
         return cls(
@@ -41,6 +55,66 @@ class Refutation(Snowflake):
             violation=Violation.from_row(row),
         )
 
+    @staticmethod
+    def __builder(
+        pre_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        refutation_id: Optional[int] = None,
+        refutation_message: Optional[str] = None,
+        refutation_response: Optional[str] = None,
+        author_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            "refutation_id = ?",
+            refutation_id,
+        ).add_condition(
+            "refutation_message LIKE ?",
+            refutation_message,
+            recompile=True,
+        ).add_condition(
+            "refutation_response LIKE ?",
+            refutation_response,
+            recompile=True,
+        ).add_condition(
+            "author_id = ?",
+            author_id,
+        ).add_condition(
+            "violation_id = ?",
+            violation_id,
+        ).add_condition(
+            *plate_condition(vehicle_plate, plate_match),
+            recompile=plate_match == "pattern",
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "refutation_id < ?",
+            before_id,
+        ).add_condition(
+            "refutation_id >= ?",
+            min_id,
+        ).add_condition(
+            "refutation_id <= ?",
+            max_id,
+        ).add_condition(
+            "author_id = ? OR creator_id = ? OR user_id = ?",
+            related_to,
+            related_to,
+            related_to,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
@@ -52,49 +126,31 @@ class Refutation(Snowflake):
         author_id: Optional[int] = None,
         violation_id: Optional[int] = None,
         vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
         user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
         min_id: Optional[int] = None,
         max_id: Optional[int] = None,
         related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[Refutation]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_refutations",
-                    ("ORDER BY refutation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "refutation_id = ?",
-                    refutation_id,
-                ).add_condition(
-                    "refutation_message LIKE ?",
-                    refutation_message,
-                ).add_condition(
-                    "refutation_response LIKE ?",
-                    refutation_response,
-                ).add_condition(
-                    "author_id = ?",
-                    author_id,
-                ).add_condition(
-                    "violation_id = ?",
-                    violation_id,
-                ).add_condition(
-                    "vehicle_plate LIKE ?",
-                    vehicle_plate,
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "refutation_id >= ?",
-                    min_id,
-                ).add_condition(
-                    "refutation_id <= ?",
-                    max_id,
-                ).add_condition(
-                    "author_id = ? OR creator_id = ? OR user_id = ?",
-                    related_to,
-                    related_to,
-                    related_to,
+                    ("ORDER BY refutation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    refutation_id=refutation_id,
+                    refutation_message=refutation_message,
+                    refutation_response=refutation_response,
+                    author_id=author_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
                 )
 
                 await builder.execute(cursor.execute)
@@ -102,23 +158,218 @@ class Refutation(Snowflake):
 
         return [cls.from_row(row) for row in rows]
 
-    @staticmethod
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        refutation_id: Optional[int] = None,
+        refutation_message: Optional[str] = None,
+        refutation_response: Optional[str] = None,
+        author_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the refutations matching the same filters as `query`.
+
+        If `approximate` and the refutations are only filtered by ID, the count is estimated from table statistics
+        (see `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        refutation_id,
+                        refutation_message,
+                        refutation_response,
+                        author_id,
+                        violation_id,
+                        vehicle_plate,
+                        user_id,
+                        related_to,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Refutations", min_id=min_id, max_id=max_id)
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_refutations",
+                    "",
+                    refutation_id=refutation_id,
+                    refutation_message=refutation_message,
+                    refutation_response=refutation_response,
+                    author_id=author_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
     @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        refutation_id: Optional[int] = None,
+        refutation_message: Optional[str] = None,
+        refutation_response: Optional[str] = None,
+        author_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="refutation_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_refutations",
+                    ("ORDER BY refutation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    refutation_id=refutation_id,
+                    refutation_message=refutation_message,
+                    refutation_response=refutation_response,
+                    author_id=author_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @classmethod
+    @Database.retry()
+    async def search(
+        cls,
+        text: str,
+        fields: Optional[str],
+        *,
+        field: Optional[Literal["message", "response"]] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> List[Dict[str, Any]]:
+        """Search refutation messages and/or responses for the terms of `text`, ignoring case and diacritics.
+
+        Results are ranked by the number of matched terms, then by the sum of their TF-IDF scores. Like `project`, only
+        the columns of `fields` are selected and the objects are returned as dictionaries.
+        """
+        query_terms = list(terms(text))
+        if not query_terms:
+            return []
+
+        projection = Projection(cls.COLUMNS, fields, key="refutation_id")
+        field_condition = "" if field is None else f"WHERE t.field = {SEARCH_FIELDS[field]}"
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    (
+                        f"""
+                        WITH query_terms AS (
+                            SELECT DISTINCT term FROM OPENJSON(?) WITH (term NVARCHAR(64) '$')
+                        ),
+                        postings AS (
+                            SELECT
+                                t.refutation_id,
+                                SUM(t.weight) AS weight,
+                                COUNT(*) OVER (PARTITION BY t.term) AS documents
+                            FROM IT3930_RefutationTerms t
+                            INNER JOIN query_terms q ON q.term = t.term
+                            {field_condition}
+                            GROUP BY t.term, t.refutation_id
+                        ),
+                        scores AS (
+                            SELECT
+                                p.refutation_id AS search_id,
+                                COUNT(*) AS search_matched,
+                                SUM((1 + LOG(p.weight)) * LOG(1 + c.total / p.documents)) AS search_score
+                            FROM postings p
+                            CROSS JOIN (
+                                SELECT CAST(SUM(rows) AS FLOAT) AS total
+                                FROM sys.partitions
+                                WHERE object_id = OBJECT_ID('IT3930_Refutations') AND index_id IN (0, 1)
+                            ) c
+                            GROUP BY p.refutation_id
+                        )
+                        SELECT {projection.sql}
+                        FROM scores s
+                        INNER JOIN view_refutations v ON v.refutation_id = s.search_id
+                        """,
+                        (json.dumps(query_terms, ensure_ascii=False),),
+                    ),
+                    (
+                        "ORDER BY search_matched DESC, search_score DESC, refutation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY",
+                        (limit,),
+                    ),
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return [projection.build(row) for row in rows]
+
+    @staticmethod
     async def create(
         *,
         violation_id: int,
         user_id: int,
         message: str,
     ) -> int:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        id = Database.instance.generate_id()
+        plate = await Refutation.__insert(id=id, violation_id=violation_id, user_id=user_id, message=message)
+
+        Violation.invalidate(plate)
+        return id
+
+    @staticmethod
+    @Database.retry()
+    async def __insert(
+        *,
+        id: int,
+        violation_id: int,
+        user_id: int,
+        message: str,
+    ) -> str:
+        """Insert a refutation and return the plate of its violation."""
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    "EXECUTE create_refutation @ViolationId = ?, @UserId = ?, @Message = ?",
-                    violation_id, user_id, message,
+                    "EXECUTE create_refutation @ViolationId = ?, @UserId = ?, @Message = ?, @Id = ?, @Terms = ?",
+                    violation_id, user_id, message, id, terms_json(message),
                 )
-                id = await cursor.fetchval()
-                return id
+                row = await cursor.fetchone()
+                return row.plate
 
     @staticmethod
     @Database.retry()
@@ -127,12 +378,11 @@ class Refutation(Snowflake):
         refutation_id: int,
         response: str,
     ) -> Optional[int]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    "EXECUTE respond_refutation @Id = ?, @Response = ?",
-                    refutation_id, response,
+                    "EXECUTE respond_refutation @Id = ?, @Response = ?, @Terms = ?",
+                    refutation_id, response, terms_json(response),
                 )
 
                 id = await cursor.fetchval()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Annotated, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from ..database import Database
+from ..utils import SQLBuildHelper, StatisticsBucket, bucket_start
+
+
+__all__ = ("DetectedStatistics", "TransactionStatistics", "ViolationStatistics")
+# Hours of the hourly rollups aggregated into each bucket. Days start at midnight UTC, like the epoch.
+BUCKET_HOURS: Dict[StatisticsBucket, int] = {
+    "hour": 1,
+    "day": 24,
+}
+
+
+class ViolationStatistics(BaseModel):
+    """Violations created during a time bucket, by category."""
+
+    time: Annotated[datetime, Field(description="The start of the time bucket")]
+    category: Annotated[Literal[0, 1, 2], Field(description="The violation category")]
+    violations_count: Annotated[int, Field(description="The number of violations")]
+    fines_vnd: Annotated[int, Field(description="The total fine amount of the violations in VND")]
+
+    @classmethod
+    @Database.retry()
+    async def query(
+        cls,
+        *,
+        bucket: StatisticsBucket,
+        min_hour: int,
+        max_hour: int,
+        category: Optional[int] = None,
+    ) -> List[ViolationStatistics]:
+        width = BUCKET_HOURS[bucket]
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = SQLBuildHelper(
+                    f"SELECT hour / {width} AS bucket, category, SUM(violations_count) AS violations_count, SUM(fines_vnd) AS fines_vnd\n"
+                    "FROM IT3930_ViolationsHourly",
+                    f"GROUP BY hour / {width}, category ORDER BY bucket, category",
+                ).add_condition(
+                    "hour >= ?",
+                    min_hour,
+                ).add_condition(
+                    "hour <= ?",
+                    max_hour,
+                ).add_condition(
+                    "category = ?",
+                    category,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return [
+            cls(
+                time=bucket_start(row.bucket, width),
+                category=row.category,
+                violations_count=row.violations_count,
+                fines_vnd=row.fines_vnd,
+            )
+            for row in rows
+        ]
+
+
+class DetectedStatistics(BaseModel):
+    """Detected violations created during a time bucket, by category."""
+
+    time: Annotated[datetime, Field(description="The start of the time bucket")]
+    category: Annotated[Literal[0, 1, 2], Field(description="The detected violation category")]
+    detected_count: Annotated[int, Field(description="The number of detected violations")]
+
+    @classmethod
+    @Database.retry()
+    async def query(
+        cls,
+        *,
+        bucket: StatisticsBucket,
+        min_hour: int,
+        max_hour: int,
+        category: Optional[int] = None,
+    ) -> List[DetectedStatistics]:
+        width = BUCKET_HOURS[bucket]
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = SQLBuildHelper(
+                    f"SELECT hour / {width} AS bucket, category, SUM(detected_count) AS detected_count\n"
+                    "FROM IT3930_DetectedHourly",
+                    f"GROUP BY hour / {width}, category ORDER BY bucket, category",
+                ).add_condition(
+                    "hour >= ?",
+                    min_hour,
+                ).add_condition(
+                    "hour <= ?",
+                    max_hour,
+                ).add_condition(
+                    "category = ?",
+                    category,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return [
+            cls(
+                time=bucket_start(row.bucket, width),
+                category=row.category,
+                detected_count=row.detected_count,
+            )
+            for row in rows
+        ]
+
+
+class TransactionStatistics(BaseModel):
+    """Transactions (fine payments) made during a time bucket."""
+
+    time: Annotated[datetime, Field(description="The start of the time bucket")]
+    transactions_count: Annotated[int, Field(description="The number of transactions")]
+    paid_vnd: Annotated[int, Field(description="The total fine amount paid in VND")]
+
+    @classmethod
+    @Database.retry()
+    async def query(
+        cls,
+        *,
+        bucket: StatisticsBucket,
+        min_hour: int,
+        max_hour: int,
+    ) -> List[TransactionStatistics]:
+        width = BUCKET_HOURS[bucket]
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = SQLBuildHelper(
+                    f"SELECT hour / {width} AS bucket, SUM(transactions_count) AS transactions_count, SUM(paid_vnd) AS paid_vnd\n"
+                    "FROM IT3930_TransactionsHourly",
+                    f"GROUP BY hour / {width} ORDER BY bucket",
+                ).add_condition(
+                    "hour >= ?",
+                    min_hour,
+                ).add_condition(
+                    "hour <= ?",
+                    max_hour,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return [
+            cls(
+                time=bucket_start(row.bucket, width),
+                transactions_count=row.transactions_count,
+                paid_vnd=row.paid_vnd,
+            )
+            for row in rows
+        ]
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, AsyncIterator, ClassVar, Dict, List, Optional, Tuple, Union
 
 from pydantic import Field
 from pyodbc import Row  # type: ignore
 
+from .count import Count
+from .projection import ProjectedPage, Projection, nest
 from .snowflake import Snowflake
 from .users import User
 from .violations import Violation
-from ..config import DB_PAGINATION_QUERY
+from ..config import DB_EXPORT_CHUNK_SIZE, DB_PAGINATION_QUERY
 from ..database import Database
-from ..utils import SQLBuildHelper
+from ..utils import PlateMatch, SQLBuildHelper, plate_condition
 
 
 __all__ = ("Transaction",)
@@ -22,6 +24,13 @@ class Transaction(Snowflake):
     violation: Annotated[Violation, Field(description="The violation associated with this transaction")]
     payer: Annotated[User, Field(description="The user who paid this transaction")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "id": "transaction_id",
+        "created_at": "transaction_id",
+        **nest(Violation.COLUMNS, "violation"),
+        **nest(User.COLUMNS, "payer", "payer_"),
+    }
+
     @classmethod
     def from_row(cls, row: Row) -> Transaction:
         return cls(
@@ -37,6 +46,56 @@ class Transaction(Snowflake):
             ),
         )
 
+    @staticmethod
+    def __builder(
+        pre_query: str,
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        transaction_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        payer_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            "transaction_id = ?",
+            transaction_id,
+        ).add_condition(
+            "violation_id = ?",
+            violation_id,
+        ).add_condition(
+            *plate_condition(vehicle_plate, plate_match),
+            recompile=plate_match == "pattern",
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "payer_id = ?",
+            payer_id,
+        ).add_condition(
+            "transaction_id < ?",
+            before_id,
+        ).add_condition(
+            "transaction_id > ?",
+            min_id,
+        ).add_condition(
+            "transaction_id < ?",
+            max_id,
+        ).add_condition(
+            "creator_id = ? OR user_id = ? OR payer_id = ?",
+            related_to,
+            related_to,
+            related_to,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
@@ -45,47 +104,172 @@ class Transaction(Snowflake):
         transaction_id: Optional[int] = None,
         violation_id: Optional[int] = None,
         vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
         user_id: Optional[int] = None,
         payer_id: Optional[int] = None,
+        before_id: Optional[int] = None,
         min_id: Optional[int] = None,
         max_id: Optional[int] = None,
         related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[Transaction]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_transactions",
-                    ("ORDER BY transaction_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "transaction_id = ?",
-                    transaction_id,
-                ).add_condition(
-                    "violation_id = ?",
-                    violation_id,
-                ).add_condition(
-                    "vehicle_plate LIKE ?",
-                    vehicle_plate,
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "payer_id = ?",
-                    payer_id,
-                ).add_condition(
-                    "transaction_id > ?",
-                    min_id,
-                ).add_condition(
-                    "transaction_id < ?",
-                    max_id,
-                ).add_condition(
-                    "creator_id = ? OR user_id = ? OR payer_id = ?",
-                    related_to,
-                    related_to,
-                    related_to,
+                    ("ORDER BY transaction_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    transaction_id=transaction_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    payer_id=payer_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
                 )
 
                 await builder.execute(cursor.execute)
                 rows = await cursor.fetchall()
 
         return [cls.from_row(row) for row in rows]
+
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        transaction_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        payer_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the transactions matching the same filters as `query`.
+
+        If `approximate` and the transactions are only filtered by ID, the count is estimated from table statistics
+        (see `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        transaction_id,
+                        violation_id,
+                        vehicle_plate,
+                        user_id,
+                        payer_id,
+                        related_to,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Transactions", min_id=min_id, max_id=max_id)
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_transactions",
+                    "",
+                    transaction_id=transaction_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    payer_id=payer_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
+    @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        transaction_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        payer_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="transaction_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_transactions",
+                    ("ORDER BY transaction_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    transaction_id=transaction_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    payer_id=payer_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @classmethod
+    async def export(
+        cls,
+        *,
+        transaction_id: Optional[int] = None,
+        violation_id: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        payer_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        chunk_size: int = DB_EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[List[Row]]:
+        """Iterate over all matching rows of `view_transactions` in chunks of at most `chunk_size` rows.
+
+        The result is sorted by transaction ID in descending order. The connection is held until the iterator is exhausted or closed.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    "SELECT * FROM view_transactions",
+                    "ORDER BY transaction_id DESC",
+                    transaction_id=transaction_id,
+                    violation_id=violation_id,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    payer_id=payer_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                while rows := await cursor.fetchmany(chunk_size):
+                    yield rows
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import cached_property
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, ClassVar, Dict, List, Optional, Sequence, Tuple, Union
 
 import jwt
 from fastapi import Depends, HTTPException
@@ -10,16 +10,24 @@ from pyodbc import Row  # type: ignore
 from fastapi.security import OAuth2PasswordBearer
 
 from .permissions import Permission
+from .count import Count
+from .projection import ProjectedPage, Projection
 from .snowflake import Snowflake
-from ..config import DB_PAGINATION_QUERY
+from ..cache import TTLCache
+from ..config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, DB_PAGINATION_QUERY, SECRET_KEY_CACHE_TTL
 from ..database import Database
-from ..utils import SQLBuildHelper, check_password, hash_password
+from ..loader import loader
+from ..utils import SQLBuildHelper, check_password, dummy_hashed_password, json_array, hash_password, password_needs_rehash, run_password_hasher
 
 
 __all__ = ("User",)
 
 
 OAUTH2_SCHEME = OAuth2PasswordBearer("/users/login")
+SECRET_KEY_CACHE = TTLCache[str, str]("secret_key", maxsize=1, ttl=SECRET_KEY_CACHE_TTL)
+# Keyed by (user ID, token). Entries are dropped by `User.invalidate` and otherwise expire after `AUTH_CACHE_TTL`
+# seconds, which also bounds how long other worker processes may serve a stale user.
+PRINCIPAL_CACHE = TTLCache[Tuple[int, str], "User"]("principals", maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
 
 
 class User(Snowflake):
@@ -31,6 +39,16 @@ class User(Snowflake):
     vehicles_count: Annotated[int, Field(description="The number of vehicles the user has")]
     violations_count: Annotated[int, Field(description="The number of violations the user has")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "id": "user_id",
+        "created_at": "user_id",
+        "fullname": "user_fullname",
+        "phone": "user_phone",
+        "permissions": "user_permissions",
+        "vehicles_count": "user_vehicles_count",
+        "violations_count": "user_violations_count",
+    }
+
     @cached_property
     def permission_obj(self) -> Permission:
         return Permission(self.permissions)
@@ -63,49 +81,113 @@ class User(Snowflake):
         except KeyError:
             raise error
 
-        users = await cls.query(user_id=user_id)
-        assert len(users) < 2
-        try:
-            return users[0]
-        except IndexError:
+        user = PRINCIPAL_CACHE.get((user_id, token))
+        if user is not None:
+            return user
+
+        user = await cls.load(user_id)
+        if user is None and Database.instance.replicated:
+            # The user may have just been created and not replicated yet
+            with Database.primary():
+                users = await cls.query(user_id=user_id)
+
+            user = users[0] if users else None
+
+        if user is None:
             raise error
 
+        PRINCIPAL_CACHE.set((user_id, token), user)
+        return user
+
+    @classmethod
+    async def load(cls, user_id: int) -> Optional[User]:
+        """Get a user by ID, or `None` if it does not exist.
+
+        Concurrent loads within a request are coalesced into a single query, and each user is queried once per request.
+        """
+        return await loader("users", cls.__load_many).load(user_id)
+
+    @classmethod
+    async def __load_many(cls, user_ids: List[int]) -> Dict[int, User]:
+        return {user.id: user for user in await cls.query(user_ids=user_ids, limit=len(user_ids))}
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        """Drop all cached authenticated sessions of a user, e.g. after their permissions changed."""
+        PRINCIPAL_CACHE.discard_if(lambda key: key[0] == user_id)
+
+    @staticmethod
+    def __builder(
+        pre_query: str,
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        user_id: Optional[int] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        user_fullname: Optional[str] = None,
+        user_phone: Optional[str] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "user_id IN (SELECT value FROM OPENJSON(?) WITH (value BIGINT '$'))",
+            json_array(user_ids),
+        ).add_condition(
+            "user_fullname LIKE ?",
+            user_fullname,
+            recompile=True,
+        ).add_condition(
+            "user_phone = CAST(? AS VARCHAR(8000))",
+            user_phone,
+        ).add_condition(
+            "user_id < ?",
+            before_id,
+        ).add_condition(
+            "user_id >= ?",
+            min_id,
+        ).add_condition(
+            "user_id <= ?",
+            max_id,
+        ).add_condition(
+            "user_id = ?",
+            related_to,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
         cls,
         *,
         user_id: Optional[int] = None,
+        user_ids: Optional[Sequence[int]] = None,
         user_fullname: Optional[str] = None,
         user_phone: Optional[str] = None,
+        before_id: Optional[int] = None,
         min_id: Optional[int] = None,
         max_id: Optional[int] = None,
         related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[User]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_users",
-                    ("ORDER BY user_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "user_fullname LIKE ?",
-                    user_fullname,
-                ).add_condition(
-                    "user_phone = ?",
-                    user_phone,
-                ).add_condition(
-                    "user_id >= ?",
-                    min_id,
-                ).add_condition(
-                    "user_id <= ?",
-                    max_id,
-                ).add_condition(
-                    "user_id = ?",
-                    related_to,
+                    ("ORDER BY user_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    user_id=user_id,
+                    user_ids=user_ids,
+                    user_fullname=user_fullname,
+                    user_phone=user_phone,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
                 )
 
                 await builder.execute(cursor.execute)
@@ -113,40 +195,162 @@ class User(Snowflake):
 
         return [cls.from_row(row) for row in rows]
 
-    @staticmethod
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        user_id: Optional[int] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        user_fullname: Optional[str] = None,
+        user_phone: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the users matching the same filters as `query`.
+
+        If `approximate` and the users are only filtered by ID, the count is estimated from table statistics
+        (see `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        user_id,
+                        user_ids,
+                        user_fullname,
+                        user_phone,
+                        related_to,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Users", min_id=min_id, max_id=max_id)
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_users",
+                    "",
+                    user_id=user_id,
+                    user_ids=user_ids,
+                    user_fullname=user_fullname,
+                    user_phone=user_phone,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
     @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        user_id: Optional[int] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        user_fullname: Optional[str] = None,
+        user_phone: Optional[str] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="user_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_users",
+                    ("ORDER BY user_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    user_id=user_id,
+                    user_ids=user_ids,
+                    user_fullname=user_fullname,
+                    user_phone=user_phone,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @staticmethod
     async def create(*, fullname: str, phone: str, password: str) -> int:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        hashed_password = await run_password_hasher(hash_password, password)
+        id = Database.instance.generate_id()
+        await User.__insert(id=id, fullname=fullname, phone=phone, hashed_password=hashed_password)
+        return id
+
+    @staticmethod
+    @Database.retry()
+    async def __insert(*, id: int, fullname: str, phone: str, hashed_password: str) -> None:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    "EXECUTE create_user @Fullname = ?, @Phone = ?, @HashedPassword = ?",
-                    fullname, phone, hash_password(password),
+                    "EXECUTE create_user @Fullname = ?, @Phone = ?, @HashedPassword = ?, @Id = ?",
+                    fullname, phone, hashed_password, id,
                 )
-                id = await cursor.fetchval()
-                return id
 
     @staticmethod
     @Database.retry()
     async def login(*, phone: str, password: str) -> Optional[int]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        """Check the credentials of a user and return their ID, or `None` if they are invalid.
+
+        Passwords are checked without holding a connection, and unknown phone numbers are checked against a dummy hash
+        so that they take as long to reject as wrong passwords. A hash in the legacy format (or with an outdated cost) is
+        replaced by a new one after a successful login.
+        """
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
-                await cursor.execute("SELECT id, hashed_password FROM IT3930_Users WHERE phone = ?", phone)
+                await cursor.execute("SELECT id, hashed_password FROM IT3930_Users WHERE phone = CAST(? AS VARCHAR(8000))", phone)
                 row = await cursor.fetchone()
-                if row is None:
-                    return None
 
-                if check_password(password, hashed=row.hashed_password):
-                    return row.id
+        if row is None:
+            # Take as long as a wrong password, so that unknown phone numbers cannot be told apart. The dummy hash is
+            # computed by the first call, which must not block the event loop either.
+            await run_password_hasher(lambda: check_password(password, hashed=dummy_hashed_password()))
+            return None
+
+        if not await run_password_hasher(check_password, password, hashed=row.hashed_password):
+            return None
+
+        if password_needs_rehash(row.hashed_password):
+            hashed_password = await run_password_hasher(hash_password, password)
+            async with Database.instance.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    # Unless the password was changed in the meantime
+                    await cursor.execute(
+                        "UPDATE IT3930_Users SET hashed_password = ? WHERE id = ? AND hashed_password = ?",
+                        hashed_password, row.id, row.hashed_password,
+                    )
+
+        return row.id
+
+    @classmethod
+    async def secret_key(cls) -> str:
+        key = SECRET_KEY_CACHE.get("session_secret_key")
+        if key is None:
+            key = await cls.__fetch_secret_key()
+            SECRET_KEY_CACHE.set("session_secret_key", key)
 
-        return None
+        return key
 
     @staticmethod
     @Database.retry()
-    async def secret_key() -> str:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+    async def __fetch_secret_key() -> str:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute("SELECT value FROM IT3930_Config WHERE name = ?", "session_secret_key")
                 return await cursor.fetchval()
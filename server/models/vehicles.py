@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, ClassVar, Dict, List, Optional, Sequence, Tuple, Union
 
 from pydantic import BaseModel, Field
 from pyodbc import Row  # type: ignore
 
+from .count import Count
+from .projection import ProjectedPage, Projection, nest
 from .users import User
 from ..config import DB_PAGINATION_QUERY
 from ..database import Database
-from ..utils import SQLBuildHelper
+from ..utils import PlateMatch, SQLBuildHelper, json_array, normalize_plate, plate_condition
 
 
 __all__ = ("Vehicle",)
@@ -21,6 +23,12 @@ class Vehicle(BaseModel):
     violations_count: Annotated[int, Field(description="The number of violations this vehicle has")]
     user: Annotated[User, Field(description="The user who owns this vehicle")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "plate": "vehicle_plate",
+        "violations_count": "vehicle_violations_count",
+        **nest(User.COLUMNS, "user"),
+    }
+
     @classmethod
     def from_row(cls, row: Row) -> Vehicle:
         return cls(
@@ -29,42 +37,80 @@ class Vehicle(BaseModel):
             user=User.from_row(row),
         )
 
+    @staticmethod
+    def __builder(
+        pre_query: str,
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        vehicle_plate: Optional[str] = None,
+        vehicle_plates: Optional[Sequence[str]] = None,
+        plate_match: PlateMatch = "exact",
+        vehicle_violations_count: Optional[int] = None,
+        user_id: Optional[int] = None,
+        after_plate: Optional[str] = None,
+        min_plate: Optional[str] = None,
+        max_plate: Optional[str] = None,
+        related_to: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            *plate_condition(vehicle_plate, plate_match),
+            recompile=plate_match == "pattern",
+        ).add_condition(
+            "vehicle_plate_key IN (SELECT value FROM OPENJSON(?) WITH (value VARCHAR(64) '$'))",
+            json_array(None if vehicle_plates is None else map(normalize_plate, vehicle_plates)),
+        ).add_condition(
+            "vehicle_violations_count = ?",
+            vehicle_violations_count,
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "vehicle_plate > CAST(? AS VARCHAR(8000))",
+            after_plate,
+        ).add_condition(
+            "vehicle_plate >= CAST(? AS VARCHAR(8000))",
+            min_plate,
+        ).add_condition(
+            "vehicle_plate <= CAST(? AS VARCHAR(8000))",
+            max_plate,
+        ).add_condition(
+            "user_id = ?",
+            related_to,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
         cls,
         *,
         vehicle_plate: Optional[str] = None,
+        vehicle_plates: Optional[Sequence[str]] = None,
+        plate_match: PlateMatch = "exact",
         vehicle_violations_count: Optional[int] = None,
         user_id: Optional[int] = None,
+        after_plate: Optional[str] = None,
         min_plate: Optional[str] = None,
         max_plate: Optional[str] = None,
         related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[Vehicle]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_vehicles",
-                    ("ORDER BY vehicle_plate OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "vehicle_plate LIKE ?",
-                    vehicle_plate,
-                ).add_condition(
-                    "vehicle_violations_count = ?",
-                    vehicle_violations_count,
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "vehicle_plate >= ?",
-                    min_plate,
-                ).add_condition(
-                    "vehicle_plate <= ?",
-                    max_plate,
-                ).add_condition(
-                    "user_id = ?",
-                    related_to,
+                    ("ORDER BY vehicle_plate OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    vehicle_plate=vehicle_plate,
+                    vehicle_plates=vehicle_plates,
+                    plate_match=plate_match,
+                    vehicle_violations_count=vehicle_violations_count,
+                    user_id=user_id,
+                    after_plate=after_plate,
+                    min_plate=min_plate,
+                    max_plate=max_plate,
+                    related_to=related_to,
                 )
 
                 await builder.execute(cursor.execute)
@@ -72,11 +118,107 @@ class Vehicle(BaseModel):
 
         return [cls.from_row(row) for row in rows]
 
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        vehicle_plate: Optional[str] = None,
+        vehicle_plates: Optional[Sequence[str]] = None,
+        plate_match: PlateMatch = "exact",
+        vehicle_violations_count: Optional[int] = None,
+        user_id: Optional[int] = None,
+        min_plate: Optional[str] = None,
+        max_plate: Optional[str] = None,
+        related_to: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the vehicles matching the same filters as `query`.
+
+        If `approximate` and the vehicles are not filtered, the count is estimated from table statistics (see
+        `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        vehicle_plate,
+                        vehicle_plates,
+                        vehicle_violations_count,
+                        user_id,
+                        min_plate,
+                        max_plate,
+                        related_to,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Vehicles")
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_vehicles",
+                    "",
+                    vehicle_plate=vehicle_plate,
+                    vehicle_plates=vehicle_plates,
+                    plate_match=plate_match,
+                    vehicle_violations_count=vehicle_violations_count,
+                    user_id=user_id,
+                    min_plate=min_plate,
+                    max_plate=max_plate,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
+    @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        vehicle_plate: Optional[str] = None,
+        vehicle_plates: Optional[Sequence[str]] = None,
+        plate_match: PlateMatch = "exact",
+        vehicle_violations_count: Optional[int] = None,
+        user_id: Optional[int] = None,
+        after_plate: Optional[str] = None,
+        min_plate: Optional[str] = None,
+        max_plate: Optional[str] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="vehicle_plate")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_vehicles",
+                    ("ORDER BY vehicle_plate OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    vehicle_plate=vehicle_plate,
+                    vehicle_plates=vehicle_plates,
+                    plate_match=plate_match,
+                    vehicle_violations_count=vehicle_violations_count,
+                    user_id=user_id,
+                    after_plate=after_plate,
+                    min_plate=min_plate,
+                    max_plate=max_plate,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
     @staticmethod
     @Database.retry()
     async def create(*, vehicle_plate: str, user_id: int) -> None:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
                     "EXECUTE create_vehicle @Plate = ?, @UserId = ?",
@@ -1,21 +1,41 @@
 from __future__ import annotations
 
-from typing import Annotated, List, Literal, Optional
+from hashlib import blake2b
+from typing import Annotated, Any, AsyncIterator, ClassVar, Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple, Union
 
 from pydantic import Field
+from pydantic_core import to_json
 from pyodbc import Row  # type: ignore
 
+from .count import Count
+from .projection import ProjectedPage, Projection, nest
 from .snowflake import Snowflake
 from .users import User
 from .vehicles import Vehicle
-from ..config import DB_PAGINATION_QUERY
+from ..cache import TTLCache
+from ..config import DB_EXPORT_CHUNK_SIZE, DB_PAGINATION_QUERY, PLATE_CACHE_SIZE, PLATE_CACHE_TTL
 from ..database import Database
-from ..utils import SQLBuildHelper
+from ..loader import loader
+from ..utils import PlateMatch, SQLBuildHelper, json_array, normalize_plate, plate_condition
 
 
 __all__ = ("Violation",)
 
 
+class ViolationPage(NamedTuple):
+    """A page of violations, serialized to JSON."""
+
+    body: bytes
+    etag: str
+    # ID of the last violation if the page is full (i.e. there may be more results)
+    last_id: Optional[int]
+
+
+# Keyed by (normalized plate, before_id, limit). Entries are dropped by `Violation.invalidate` and otherwise expire
+# after `PLATE_CACHE_TTL` seconds, which also bounds how long other worker processes may serve a stale page.
+PLATE_CACHE = TTLCache[Tuple[str, Optional[int], int], ViolationPage]("plates", maxsize=PLATE_CACHE_SIZE, ttl=PLATE_CACHE_TTL)
+
+
 class Violation(Snowflake):
     """Represents a violation."""
 
@@ -26,6 +46,17 @@ class Violation(Snowflake):
     refutations_count: Annotated[int, Field(description="The number of refutations of this violation")]
     vehicle: Annotated[Vehicle, Field(description="The vehicle associated with this violation")]
 
+    COLUMNS: ClassVar[Dict[str, str]] = {
+        "id": "violation_id",
+        "created_at": "violation_id",
+        **nest(User.COLUMNS, "creator", "creator_"),
+        "category": "violation_category",
+        "fine_vnd": "violation_fine_vnd",
+        "video_url": "violation_video_url",
+        "refutations_count": "violation_refutations_count",
+        **nest(Vehicle.COLUMNS, "vehicle"),
+    }
+
     @classmethod
     def from_row(cls, row: Row) -> Violation:
         return cls(
@@ -45,63 +76,112 @@ class Violation(Snowflake):
             vehicle=Vehicle.from_row(row),
         )
 
+    @staticmethod
+    def __builder(
+        pre_query: str,
+        post_query: Union[str, Tuple[str, Tuple[Any, ...]]],
+        *,
+        violation_id: Optional[int] = None,
+        violation_ids: Optional[Sequence[int]] = None,
+        creator_id: Optional[int] = None,
+        violation_category: Optional[Literal[0, 1, 2]] = None,
+        violation_fine_vnd: Optional[int] = None,
+        violation_video_url: Optional[str] = None,
+        violation_refutations_count: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+    ) -> SQLBuildHelper:
+        return SQLBuildHelper(
+            pre_query,
+            post_query,
+        ).add_condition(
+            "violation_id = ?",
+            violation_id,
+        ).add_condition(
+            "violation_id IN (SELECT value FROM OPENJSON(?) WITH (value BIGINT '$'))",
+            json_array(violation_ids),
+        ).add_condition(
+            "creator_id = ?",
+            creator_id,
+        ).add_condition(
+            "violation_category = ?",
+            violation_category,
+        ).add_condition(
+            "violation_fine_vnd = ?",
+            violation_fine_vnd,
+        ).add_condition(
+            "violation_video_url LIKE ?",
+            violation_video_url,
+            recompile=True,
+        ).add_condition(
+            "violation_refutations_count = ?",
+            violation_refutations_count,
+        ).add_condition(
+            *plate_condition(vehicle_plate, plate_match),
+            recompile=plate_match == "pattern",
+        ).add_condition(
+            "user_id = ?",
+            user_id,
+        ).add_condition(
+            "violation_id < ?",
+            before_id,
+        ).add_condition(
+            "violation_id >= ?",
+            min_id,
+        ).add_condition(
+            "violation_id <= ?",
+            max_id,
+        ).add_condition(
+            "creator_id = ? OR user_id = ?",
+            related_to,
+            related_to,
+        )
+
     @classmethod
     @Database.retry()
     async def query(
         cls,
         *,
         violation_id: Optional[int] = None,
+        violation_ids: Optional[Sequence[int]] = None,
         creator_id: Optional[int] = None,
         violation_category: Optional[Literal[0, 1, 2]] = None,
         violation_fine_vnd: Optional[int] = None,
         violation_video_url: Optional[str] = None,
         violation_refutations_count: Optional[int] = None,
         vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
         user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
         min_id: Optional[int] = None,
         max_id: Optional[int] = None,
         related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
     ) -> List[Violation]:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        async with Database.instance.acquire(readonly=True) as connection:
             async with connection.cursor() as cursor:
-                builder = SQLBuildHelper(
+                builder = cls.__builder(
                     "SELECT * FROM view_violations",
-                    ("ORDER BY violation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (DB_PAGINATION_QUERY,)),
-                ).add_condition(
-                    "violation_id = ?",
-                    violation_id,
-                ).add_condition(
-                    "creator_id = ?",
-                    creator_id,
-                ).add_condition(
-                    "violation_category = ?",
-                    violation_category,
-                ).add_condition(
-                    "violation_fine_vnd = ?",
-                    violation_fine_vnd,
-                ).add_condition(
-                    "violation_video_url LIKE ?",
-                    violation_video_url,
-                ).add_condition(
-                    "violation_refutations_count = ?",
-                    violation_refutations_count,
-                ).add_condition(
-                    "vehicle_plate LIKE ?",
-                    vehicle_plate,
-                ).add_condition(
-                    "user_id = ?",
-                    user_id,
-                ).add_condition(
-                    "violation_id >= ?",
-                    min_id,
-                ).add_condition(
-                    "violation_id <= ?",
-                    max_id,
-                ).add_condition(
-                    "creator_id = ? OR user_id = ?",
-                    related_to,
-                    related_to,
+                    ("ORDER BY violation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    violation_id=violation_id,
+                    violation_ids=violation_ids,
+                    creator_id=creator_id,
+                    violation_category=violation_category,
+                    violation_fine_vnd=violation_fine_vnd,
+                    violation_video_url=violation_video_url,
+                    violation_refutations_count=violation_refutations_count,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
                 )
 
                 await builder.execute(cursor.execute)
@@ -109,8 +189,216 @@ class Violation(Snowflake):
 
         return [cls.from_row(row) for row in rows]
 
-    @staticmethod
+    @classmethod
+    @Database.retry()
+    async def count(
+        cls,
+        *,
+        violation_id: Optional[int] = None,
+        violation_ids: Optional[Sequence[int]] = None,
+        creator_id: Optional[int] = None,
+        violation_category: Optional[Literal[0, 1, 2]] = None,
+        violation_fine_vnd: Optional[int] = None,
+        violation_video_url: Optional[str] = None,
+        violation_refutations_count: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        approximate: bool = False,
+    ) -> Count:
+        """Count the violations matching the same filters as `query`.
+
+        If `approximate` and the violations are only filtered by ID, the count is estimated from table statistics
+        (see `Count.estimate`) instead of counting rows.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                filtered = any(
+                    value is not None
+                    for value in (
+                        violation_id,
+                        violation_ids,
+                        creator_id,
+                        violation_category,
+                        violation_fine_vnd,
+                        violation_video_url,
+                        violation_refutations_count,
+                        vehicle_plate,
+                        user_id,
+                        related_to,
+                    )
+                )
+                if approximate and not filtered:
+                    count = await Count.estimate(cursor, "IT3930_Violations", min_id=min_id, max_id=max_id)
+                    if count is not None:
+                        return count
+
+                builder = cls.__builder(
+                    "SELECT COUNT_BIG(*) FROM view_violations",
+                    "",
+                    violation_id=violation_id,
+                    violation_ids=violation_ids,
+                    creator_id=creator_id,
+                    violation_category=violation_category,
+                    violation_fine_vnd=violation_fine_vnd,
+                    violation_video_url=violation_video_url,
+                    violation_refutations_count=violation_refutations_count,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                return Count(count=await cursor.fetchval(), approximate=False)
+
+    @classmethod
     @Database.retry()
+    async def project(
+        cls,
+        fields: Optional[str],
+        *,
+        violation_id: Optional[int] = None,
+        violation_ids: Optional[Sequence[int]] = None,
+        creator_id: Optional[int] = None,
+        violation_category: Optional[Literal[0, 1, 2]] = None,
+        violation_fine_vnd: Optional[int] = None,
+        violation_video_url: Optional[str] = None,
+        violation_refutations_count: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        limit: int = DB_PAGINATION_QUERY,
+    ) -> ProjectedPage:
+        """Same as `query`, but only select the columns of the comma-separated `fields` (all of them if `None`) and return
+        the objects as dictionaries, without building models.
+        """
+        projection = Projection(cls.COLUMNS, fields, key="violation_id")
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    f"SELECT {projection.sql} FROM view_violations",
+                    ("ORDER BY violation_id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY", (limit,)),
+                    violation_id=violation_id,
+                    violation_ids=violation_ids,
+                    creator_id=creator_id,
+                    violation_category=violation_category,
+                    violation_fine_vnd=violation_fine_vnd,
+                    violation_video_url=violation_video_url,
+                    violation_refutations_count=violation_refutations_count,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    before_id=before_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                rows = await cursor.fetchall()
+
+        return projection.page(rows, limit)
+
+    @classmethod
+    async def export(
+        cls,
+        *,
+        violation_id: Optional[int] = None,
+        violation_ids: Optional[Sequence[int]] = None,
+        creator_id: Optional[int] = None,
+        violation_category: Optional[Literal[0, 1, 2]] = None,
+        violation_fine_vnd: Optional[int] = None,
+        violation_video_url: Optional[str] = None,
+        violation_refutations_count: Optional[int] = None,
+        vehicle_plate: Optional[str] = None,
+        plate_match: PlateMatch = "exact",
+        user_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        related_to: Optional[int] = None,
+        chunk_size: int = DB_EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[List[Row]]:
+        """Iterate over all matching rows of `view_violations` in chunks of at most `chunk_size` rows.
+
+        The result is sorted by violation ID in descending order. The connection is held until the iterator is exhausted or closed.
+        """
+        async with Database.instance.acquire(readonly=True) as connection:
+            async with connection.cursor() as cursor:
+                builder = cls.__builder(
+                    "SELECT * FROM view_violations",
+                    "ORDER BY violation_id DESC",
+                    violation_id=violation_id,
+                    violation_ids=violation_ids,
+                    creator_id=creator_id,
+                    violation_category=violation_category,
+                    violation_fine_vnd=violation_fine_vnd,
+                    violation_video_url=violation_video_url,
+                    violation_refutations_count=violation_refutations_count,
+                    vehicle_plate=vehicle_plate,
+                    plate_match=plate_match,
+                    user_id=user_id,
+                    min_id=min_id,
+                    max_id=max_id,
+                    related_to=related_to,
+                )
+
+                await builder.execute(cursor.execute)
+                while rows := await cursor.fetchmany(chunk_size):
+                    yield rows
+
+    @classmethod
+    async def load(cls, violation_id: int) -> Optional[Violation]:
+        """Get a violation by ID, or `None` if it does not exist.
+
+        Concurrent loads within a request are coalesced into a single query, and each violation is queried once per
+        request.
+        """
+        return await loader("violations", cls.__load_many).load(violation_id)
+
+    @classmethod
+    async def __load_many(cls, violation_ids: List[int]) -> Dict[int, Violation]:
+        return {violation.id: violation for violation in await cls.query(violation_ids=violation_ids, limit=len(violation_ids))}
+
+    @classmethod
+    async def query_plate(cls, plate: str, *, before_id: Optional[int] = None, limit: int = DB_PAGINATION_QUERY) -> ViolationPage:
+        """Query a page of violations of a vehicle, sorted by violation ID in descending order.
+
+        Plates are matched exactly after normalization (see `normalize_plate`). Pages are cached by normalized plate, and
+        concurrent lookups of the same page share a single query.
+        """
+        plate = normalize_plate(plate)
+
+        async def fetch() -> ViolationPage:
+            # A page read from a lagging replica right after `invalidate` would be cached for the whole TTL
+            with Database.primary():
+                page = await cls.project(None, vehicle_plate=plate, before_id=before_id, limit=limit)
+
+            body = to_json(page.items)
+            return ViolationPage(
+                body=body,
+                etag=f"\"{blake2b(body, digest_size=16).hexdigest()}\"",
+                last_id=page.last_key,
+            )
+
+        return await PLATE_CACHE.fetch((plate, before_id, limit), fetch)
+
+    @staticmethod
+    def invalidate(plate: str) -> None:
+        """Drop all cached pages of a vehicle, e.g. after one of its violations changed."""
+        plate = normalize_plate(plate)
+        PLATE_CACHE.discard_if(lambda key: key[0] == plate)
+
+    @staticmethod
     async def create(
         *,
         creator_id: int,
@@ -119,12 +407,33 @@ class Violation(Snowflake):
         violation_fine_vnd: int,
         violation_video_url: str,
     ) -> int:
-        pool = await Database.instance.pool()
-        async with pool.acquire() as connection:
+        id = Database.instance.generate_id()
+        await Violation.__insert(
+            id=id,
+            creator_id=creator_id,
+            violation_category=violation_category,
+            vehicle_plate=vehicle_plate,
+            violation_fine_vnd=violation_fine_vnd,
+            violation_video_url=violation_video_url,
+        )
+
+        Violation.invalidate(vehicle_plate)
+        return id
+
+    @staticmethod
+    @Database.retry()
+    async def __insert(
+        *,
+        id: int,
+        creator_id: int,
+        violation_category: Literal[0, 1, 2],
+        vehicle_plate: str,
+        violation_fine_vnd: int,
+        violation_video_url: str,
+    ) -> None:
+        async with Database.instance.acquire() as connection:
             async with connection.cursor() as cursor:
                 await cursor.execute(
-                    "EXECUTE create_violation @CreatorId = ?, @Category = ?, @Plate = ?, @FineVND = ?, @VideoUrl = ?",
-                    creator_id, violation_category, vehicle_plate, violation_fine_vnd, violation_video_url,
+                    "EXECUTE create_violation @CreatorId = ?, @Category = ?, @Plate = ?, @FineVND = ?, @VideoUrl = ?, @Id = ?",
+                    creator_id, violation_category, vehicle_plate, violation_fine_vnd, violation_video_url, id,
                 )
-                id = await cursor.fetchval()
-                return id
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import ClassVar, List, Optional, TYPE_CHECKING
+
+from .config import PARTITION_EXTEND_INTERVAL, PARTITION_MONTHS_AHEAD
+from .database import Database
+from .utils import snowflake_time
+
+
+__all__ = ("PartitionExtender",)
+
+
+class PartitionExtender:
+    """Keep empty monthly partitions ahead of the current month.
+
+    Every `PARTITION_EXTEND_INTERVAL` seconds, the `extend_partitions` procedure creates the partitions up to
+    `PARTITION_MONTHS_AHEAD` months ahead, so that new rows never land in the last, unbounded partition (whose split would
+    move them). Every process runs this loop, but an application lock lets a single one split partitions at a time.
+    """
+
+    instance: ClassVar[PartitionExtender]
+    __slots__ = ("__task",)
+    if TYPE_CHECKING:
+        __task: Optional[asyncio.Task[None]]
+
+    def __init__(self) -> None:
+        self.__task = None
+
+    def start(self) -> None:
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    @staticmethod
+    @Database.retry()
+    async def extend(months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[int]:
+        """Create the missing partitions up to `months_ahead` months ahead now. Return the boundaries of new ones."""
+        async with Database.instance.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("EXECUTE extend_partitions @MonthsAhead = ?", months_ahead)
+                return [row.boundary for row in await cursor.fetchall()]
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                for boundary in await self.extend():
+                    print(f"Created partition from {snowflake_time(boundary).isoformat()}", file=sys.stderr)
+            except Exception as e:
+                print(f"Failed to extend partitions: {e!r}", file=sys.stderr)
+
+            await asyncio.sleep(PARTITION_EXTEND_INTERVAL)
+
+
+PartitionExtender.instance = PartitionExtender()
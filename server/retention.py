@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, ClassVar, List, Literal, Optional, TYPE_CHECKING
+
+from .config import (
+    DETECTED_RETENTION_ARCHIVE,
+    DETECTED_RETENTION_BATCH_DELAY,
+    DETECTED_RETENTION_BATCH_SIZE,
+    DETECTED_RETENTION_DAYS,
+    DETECTED_RETENTION_INTERVAL,
+)
+from .database import Database
+from .metrics import DETECTED_RETENTION_ROWS
+from .utils import snowflake_range, snowflake_time
+
+
+__all__ = ("DetectedRetention",)
+ArchiveMode = Literal["none", "table", "file"]
+# Seconds between two progress reports of a running purge
+PROGRESS_INTERVAL = 10
+
+
+class DetectedRetention:
+    """Purge the detected violations created more than `DETECTED_RETENTION_DAYS` days ago.
+
+    Every `DETECTED_RETENTION_INTERVAL` seconds, expired rows are purged in ID order, `DETECTED_RETENTION_BATCH_SIZE` per
+    transaction so that their locks are never escalated to the whole table, after copying them to
+    `DETECTED_RETENTION_ARCHIVE` if set. Archiving to a table switches out whole expired months instead (see
+    `archive_detected`), so rows are only purged there once their whole month has expired. A session-owned application lock, held on a dedicated connection, lets a single process purge at a
+    time. Each statement borrows a pooled connection only for its own duration.
+    """
+
+    instance: ClassVar[DetectedRetention]
+    __slots__ = ("__task",)
+    if TYPE_CHECKING:
+        __task: Optional[asyncio.Task[None]]
+
+    def __init__(self) -> None:
+        self.__task = None
+
+    @property
+    def archive(self) -> ArchiveMode:
+        if not DETECTED_RETENTION_ARCHIVE:
+            return "none"
+
+        return "table" if DETECTED_RETENTION_ARCHIVE == "table" else "file"
+
+    def start(self) -> None:
+        """Start purging periodically, unless `DETECTED_RETENTION_DAYS` is 0."""
+        if DETECTED_RETENTION_DAYS > 0 and (self.__task is None or self.__task.done()):
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    async def purge(self) -> Optional[int]:
+        """Purge the expired detected violations now.
+
+        Return the number of purged rows, or `None` if another process was already purging them.
+        """
+        archive = self.archive
+        cutoff = datetime.now(timezone.utc) - timedelta(days=DETECTED_RETENTION_DAYS)
+        if archive == "table":
+            # Whole months only: a partially expired month waits until it can be switched out at once, since rows moved
+            # into its archive partition one by one would keep the partition from ever being switched into again
+            cutoff = cutoff.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        before_id = snowflake_range(cutoff, None)[0]
+        purged = 0
+        start = reported = time.perf_counter()
+        async with Database.instance.session_lock("IT3930_DetectedRetention") as locked:
+            if not locked:
+                return None
+
+            archive_file: Optional[gzip.GzipFile] = None
+            try:
+                if archive == "table":
+                    purged += sum(row.rows for row in await self.__execute("EXECUTE archive_detected @BeforeId = ?", before_id))
+                    DETECTED_RETENTION_ROWS.inc(archive, amount=purged)
+
+                while True:
+                    batch_before_id, batch_size = before_id, DETECTED_RETENTION_BATCH_SIZE
+                    if archive == "file":
+                        # Copied before they are deleted: a failure in between only duplicates rows in the archive
+                        rows = await self.__execute(
+                            "SELECT TOP (?) id, category, plate, video_url FROM IT3930_Detected WHERE id < ? ORDER BY id",
+                            batch_size, before_id,
+                        )
+                        if not rows:
+                            break
+
+                        if archive_file is None:
+                            archive_file = await asyncio.to_thread(self.__open_archive)
+
+                        await asyncio.to_thread(self.__write_archive, archive_file, rows)
+                        batch_before_id, batch_size = rows[-1].id + 1, len(rows)
+
+                    result = await self.__execute(
+                        "EXECUTE purge_detected @BeforeId = ?, @BatchSize = ?, @Archive = ?",
+                        batch_before_id, batch_size, archive == "table",
+                    )
+                    count = result[0].purged
+                    if count == 0:
+                        break
+
+                    purged += count
+                    DETECTED_RETENTION_ROWS.inc(archive, amount=count)
+                    if time.perf_counter() - reported >= PROGRESS_INTERVAL:
+                        reported = time.perf_counter()
+                        print(
+                            f"Purged {purged} detected violation(s) so far ({purged / (reported - start):.0f} rows/s)...",
+                            file=sys.stderr,
+                        )
+
+                    await asyncio.sleep(DETECTED_RETENTION_BATCH_DELAY)
+
+            finally:
+                if archive_file is not None:
+                    await asyncio.to_thread(archive_file.close)
+
+        if purged:
+            elapsed = time.perf_counter() - start
+            print(
+                f"Purged {purged} detected violation(s) created before {snowflake_time(before_id).isoformat()} "
+                f"in {elapsed:.1f}s ({purged / elapsed:.0f} rows/s, archive: {archive})",
+                file=sys.stderr,
+            )
+
+        return purged
+
+    @staticmethod
+    async def __execute(sql: str, *params: Any) -> List[Any]:
+        # A pooled connection per statement, returned to the pool between batches
+        async with Database.instance.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(sql, *params)
+                return await cursor.fetchall()
+
+    @staticmethod
+    def __open_archive() -> gzip.GzipFile:
+        directory = Path(DETECTED_RETENTION_ARCHIVE)
+        directory.mkdir(parents=True, exist_ok=True)
+        return gzip.GzipFile(directory / f"detected-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.ndjson.gz", "xb")
+
+    @staticmethod
+    def __write_archive(file: gzip.GzipFile, rows: List[Any]) -> None:
+        lines = "".join(
+            json.dumps(
+                {
+                    "id": row.id,
+                    "created_at": snowflake_time(row.id).isoformat(),
+                    "category": row.category,
+                    "plate": row.plate,
+                    "video_url": row.video_url,
+                },
+                ensure_ascii=False,
+            ) + "\n"
+            for row in rows
+        )
+        file.write(lines.encode("utf-8"))
+        # Make the batch durable (and the file readable up to it) before the rows are deleted
+        file.flush()
+        os.fsync(file.fileno())
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                await self.purge()
+            except Exception as e:
+                print(f"Failed to purge detected violations: {e!r}", file=sys.stderr)
+
+            await asyncio.sleep(DETECTED_RETENTION_INTERVAL)
+
+
+DetectedRetention.instance = DetectedRetention()
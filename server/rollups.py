@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import ClassVar, Optional, TYPE_CHECKING
+
+from .config import ROLLUP_COMPACT_INTERVAL, ROLLUP_COMPACT_LOOKBACK
+from .database import Database
+
+
+__all__ = ("RollupCompactor",)
+
+
+class RollupCompactor:
+    """Keep the hourly rollups behind the statistics endpoints up to date.
+
+    Every `ROLLUP_COMPACT_INTERVAL` seconds, the `compact_rollups` procedure recomputes the current hour, the previous
+    `ROLLUP_COMPACT_LOOKBACK` hours and the hours of deleted rows from the base tables. Every process runs this loop, but
+    an application lock lets a single one compact at a time: the others skip their turn instead of repeating the work.
+    """
+
+    instance: ClassVar[RollupCompactor]
+    __slots__ = ("__task",)
+    if TYPE_CHECKING:
+        __task: Optional[asyncio.Task[None]]
+
+    def __init__(self) -> None:
+        self.__task = None
+
+    def start(self) -> None:
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    @staticmethod
+    @Database.retry()
+    async def compact() -> bool:
+        """Compact the rollups now. Return `False` if another process was already compacting them."""
+        async with Database.instance.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("EXECUTE compact_rollups @Lookback = ?", ROLLUP_COMPACT_LOOKBACK)
+                row = await cursor.fetchone()
+
+        return bool(row.compacted)
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Failed to compact rollups: {e!r}", file=sys.stderr)
+
+            await asyncio.sleep(ROLLUP_COMPACT_INTERVAL)
+
+
+RollupCompactor.instance = RollupCompactor()
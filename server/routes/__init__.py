@@ -1,5 +1,6 @@
 from .detected import router as detected_router
 from .refutations import router as refutations_router
+from .statistics import router as statistics_router
 from .transactions import router as transactions_router
 from .users import router as users_router
 from .vehicles import router as vehicles_router
@@ -10,6 +11,7 @@ __all__ = ("routers",)
 routers = (
     detected_router,
     refutations_router,
+    statistics_router,
     transactions_router,
     users_router,
     vehicles_router,
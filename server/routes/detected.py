@@ -1,15 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from datetime import datetime
-from typing import Annotated, List, Literal, Optional
+from typing import Annotated, Any, AsyncIterator, Dict, List, Literal, Optional, Set
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
-from pydantic import BeforeValidator
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, BeforeValidator, Field
+from pydantic_core import to_json
 from pyodbc import IntegrityError  # type: ignore
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import Detected, User
-from ..utils import snowflake_range
+from ..config import (
+    DB_PAGINATION_MAX,
+    DB_PAGINATION_QUERY,
+    DETECTED_BATCH_MAX,
+    DETECTED_STREAM_KEEPALIVE,
+    DETECTED_STREAM_MAX_AGE,
+    DETECTED_STREAM_POLL_INTERVAL,
+    NEXT_CURSOR_HEADER,
+)
+from ..database import Database
+from ..models import Count, Detected, User
+from ..streams import DetectedHub
+from ..utils import decode_cursor, snowflake_range
+from .filters import PlateMatchFilter
 
 
 __all__ = ()
@@ -18,8 +33,12 @@ router = APIRouter(prefix="/detected", tags=["detected"])
 
 @router.get(
     "/",
+    response_model=List[Detected],
     summary="Query detected violations by cameras",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} detected violations from the database. The result is sorted by detected violation ID in descending order.",
+    description=(
+        "Query up to `limit` detected violations from the database. The result is sorted by detected violation ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
     responses={
         403: {
             "description": "Missing `MANAGE_DETECTED` permission",
@@ -28,6 +47,7 @@ router = APIRouter(prefix="/detected", tags=["detected"])
 )
 async def get_detected(
     user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
     detected_id: Annotated[Optional[int], Query(description="Filter by detected violation ID")] = None,
     # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
     detected_category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by detected violation category"), BeforeValidator(int)] = None,
@@ -38,37 +58,179 @@ async def get_detected(
             "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
         ),
     ] = None,
-    vehicle_plate: Annotated[
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for detected violation ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for detected violation ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    fields: Annotated[
         Optional[str],
         Query(
-            description="Filter by vehicle plate [pattern]"
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of detected violations to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.manage_detected:
+        _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+        min_id = max(min_id or _min_id, _min_id)
+        max_id = min(max_id or _max_id, _max_id)
+
+        page = await Detected.project(
+            fields,
+            detected_id=detected_id,
+            detected_category=detected_category,
+            detected_video_url=detected_video_url,
+            vehicle_plate=vehicle_plate,
+            plate_match=plate_match,
+            user_id=user_id,
+            min_id=min_id,
+            max_id=max_id,
+            before_id=decode_cursor(cursor, int),
+            limit=limit,
+        )
+        return page.to_response()
+
+    raise HTTPException(403, detail="Missing `MANAGE_DETECTED` permission")
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count detected violations",
+    description=(
+        "Count the detected violations matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, a count restricted only by ID or creation time bounds (e.g. \"this month\" for an "
+        "administrator) is estimated from table statistics in constant time. Other counts are always exact, as "
+        "reported by `approximate` in the response."
+    ),
+    responses={
+        403: {
+            "description": "Missing `MANAGE_DETECTED` permission",
+        },
+    },
+)
+async def count_detected(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    detected_id: Annotated[Optional[int], Query(description="Filter by detected violation ID")] = None,
+    # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
+    detected_category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by detected violation category"), BeforeValidator(int)] = None,
+    detected_video_url: Annotated[
+        Optional[str],
+        Query(
+            description="Filter by video URL [pattern]"
             "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
         ),
     ] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
     user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
     min_id: Annotated[Optional[int], Query(description="Minimum value for detected violation ID in the result set.")] = None,
     max_id: Annotated[Optional[int], Query(description="Maximum value for detected violation ID in the result set.")] = None,
     min_created_at: Optional[datetime] = None,
     max_created_at: Optional[datetime] = None,
-) -> List[Detected]:
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
     if user.permission_obj.administrator or user.permission_obj.manage_detected:
         _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
         min_id = max(min_id or _min_id, _min_id)
         max_id = min(max_id or _max_id, _max_id)
 
-        return await Detected.query(
+        return await Detected.count(
             detected_id=detected_id,
             detected_category=detected_category,
             detected_video_url=detected_video_url,
             vehicle_plate=vehicle_plate,
+            plate_match=plate_match,
             user_id=user_id,
             min_id=min_id,
             max_id=max_id,
+            approximate=approximate,
         )
 
     raise HTTPException(403, detail="Missing `MANAGE_DETECTED` permission")
 
 
+@router.get(
+    "/stream",
+    summary="Stream new detected violations",
+    description=(
+        "Push detected violations as [server-sent events](https://html.spec.whatwg.org/multipage/server-sent-events.html) "
+        "as soon as they are added, instead of polling `GET /detected/`. Each `detected` event has the detected violation "
+        "ID as its `id` and the detected violation as JSON `data`.\n\n"
+        "To resume after a disconnection, send the ID of the last received event in the `Last-Event-ID` header (or the "
+        f"`after` parameter): up to {DB_PAGINATION_MAX} missed detected violations are sent first. If more were missed, "
+        "a `reset` event is sent instead, and the client should reload them with `GET /detected/`.\n\n"
+        f"Streams end after {DETECTED_STREAM_MAX_AGE:g} seconds, or when the client falls too far behind. Clients "
+        "then reconnect with the ID of their last event."
+    ),
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"text/event-stream": {}},
+        },
+        403: {
+            "description": "Missing `MANAGE_DETECTED` permission",
+        },
+    },
+)
+async def stream_detected(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    last_event_id: Annotated[Optional[int], Header(description="The ID of the last event received before reconnecting")] = None,
+    after: Annotated[Optional[int], Query(description="Same as `Last-Event-ID`, for clients that cannot set headers")] = None,
+) -> StreamingResponse:
+    if not user.permission_obj.administrator and not user.permission_obj.manage_detected:
+        raise HTTPException(403, detail="Missing `MANAGE_DETECTED` permission")
+
+    return StreamingResponse(
+        __events(last_event_id if last_event_id is not None else after),
+        media_type="text/event-stream",
+        # Disable buffering in reverse proxies such as nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def __event(item: Dict[str, Any]) -> str:
+    return f"id: {item['id']}\nevent: detected\ndata: {to_json(item).decode('utf-8')}\n\n"
+
+
+async def __events(after: Optional[int]) -> AsyncIterator[str]:
+    deadline = time.monotonic() + DETECTED_STREAM_MAX_AGE
+    # Subscribe before replaying, so that nothing is missed in between
+    with DetectedHub.instance.subscribe() as queue:
+        yield f"retry: {int(1000 * DETECTED_STREAM_POLL_INTERVAL)}\n\n"
+
+        replayed: Set[int] = set()
+        if after is not None:
+            # Rows missing from a lagging replica would never be sent, the hub only broadcasts newer ones
+            with Database.primary():
+                page = await Detected.since(after, limit=DB_PAGINATION_MAX)
+
+            if page.last_key is None:
+                for item in page.items:
+                    replayed.add(item["id"])
+                    yield __event(item)
+
+            else:
+                yield "event: reset\ndata: {}\n\n"
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(DETECTED_STREAM_KEEPALIVE, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is None:
+                return
+
+            if event["id"] not in replayed:
+                yield __event(event)
+
+
 @router.post(
     "/",
     summary="Add a new detected violation",
@@ -85,7 +247,7 @@ async def add_detected(
     detected_video_url: Annotated[str, Query(description="The URL to the video", max_length=2048)],
 ) -> int:
     try:
-        return await Detected.create(
+        id = await Detected.create(
             detected_category=detected_category,
             vehicle_plate=vehicle_plate,
             detected_video_url=detected_video_url,
@@ -93,6 +255,46 @@ async def add_detected(
     except IntegrityError:
         raise HTTPException(status_code=409, detail="Vehicle with this plate does not exist.")
 
+    DetectedHub.instance.notify()
+    return id
+
+
+class __DetectedCreationPayload(BaseModel):
+    """Payload for adding a detected violation."""
+
+    detected_category: Annotated[Literal[0, 1, 2], Field(description="The detected violation category")]
+    vehicle_plate: Annotated[str, Field(description="The vehicle plate", max_length=12)]
+    detected_video_url: Annotated[str, Field(description="The URL to the video", max_length=2048)]
+
+
+class __DetectedCreationResult(BaseModel):
+    """Result of adding a single detected violation in a batch."""
+
+    id: Annotated[Optional[int], Field(description="The ID of the new detected violation, if it was added")] = None
+    error: Annotated[Optional[str], Field(description="The reason why the detected violation was not added")] = None
+
+
+@router.post(
+    "/batch",
+    summary="Add multiple detected violations",
+    description=(
+        f"Add up to {DETECTED_BATCH_MAX} detected violations to the database in a single request. "
+        "Return one result per item, in the same order as the request body. "
+        "Items whose vehicle does not exist are skipped and reported with an error instead of failing the whole batch."
+    ),
+)
+async def add_detected_batch(
+    payload: Annotated[List[__DetectedCreationPayload], Body(min_length=1, max_length=DETECTED_BATCH_MAX)],
+) -> List[__DetectedCreationResult]:
+    ids = await Detected.create_many(
+        [(item.detected_category, item.vehicle_plate, item.detected_video_url) for item in payload],
+    )
+    DetectedHub.instance.notify()
+    return [
+        __DetectedCreationResult(id=id) if id is not None else __DetectedCreationResult(error="Vehicle with this plate does not exist.")
+        for id in ids
+    ]
+
 
 @router.delete(
     "/{detected_id}",
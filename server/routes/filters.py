@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Query
+
+from ..models import User
+from ..utils import PlateMatch
+
+
+__all__ = ("PlateMatchFilter",)
+
+
+async def plate_match_filter(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: Annotated[
+        PlateMatch,
+        Query(
+            description="How `vehicle_plate` is matched. `exact` and `prefix` ignore case and separators (`29t1-000.01` "
+            "matches `29T100001`). `pattern` matches a LIKE [pattern]"
+            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern) "
+            "and requires the `ADMINISTRATOR` permission.",
+        ),
+    ] = "exact",
+) -> PlateMatch:
+    """The `plate_match` query parameter. LIKE patterns may scan whole tables, so only administrators can use them."""
+    if plate_match == "pattern" and not user.permission_obj.administrator:
+        raise HTTPException(403, detail="Missing `ADMINISTRATOR` permission for plate patterns")
+
+    return plate_match
+
+
+# Declare the plate filter of every route with this type, right after the authenticated user
+PlateMatchFilter = Annotated[PlateMatch, Depends(plate_match_filter)]
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 from pyodbc import IntegrityError  # type: ignore
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import Refutation, User, Violation
-from ..utils import snowflake_range
+from ..config import DB_PAGINATION_MAX, DB_PAGINATION_QUERY, NEXT_CURSOR_HEADER
+from ..models import Count, Refutation, User, Violation
+from ..utils import decode_cursor, json_response, snowflake_range
+from .filters import PlateMatchFilter
 
 
 __all__ = ()
@@ -18,11 +19,16 @@ router = APIRouter(prefix="/refutations", tags=["refutations"])
 
 @router.get(
     "/",
+    response_model=List[Refutation],
     summary="Query refutations",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} refutations from the database. The result is sorted by refutation ID in descending order.",
+    description=(
+        "Query up to `limit` refutations from the database. The result is sorted by refutation ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
 )
 async def get_refutations(
     user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
     refutation_id: Annotated[Optional[int], Query(description="Filter by refutation ID")] = None,
     refutation_message: Annotated[
         Optional[str],
@@ -40,19 +46,89 @@ async def get_refutations(
     ] = None,
     author_id: Annotated[Optional[int], Query(description="Filter by author ID")] = None,
     violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
-    vehicle_plate: Annotated[
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for refutation ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for refutation ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    fields: Annotated[
         Optional[str],
         Query(
-            description="Filter by vehicle plate [pattern]"
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of refutations to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    page = await Refutation.project(
+        fields,
+        refutation_id=refutation_id,
+        refutation_message=refutation_message,
+        refutation_response=refutation_response,
+        author_id=author_id,
+        violation_id=violation_id,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        user_id=user_id,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+        before_id=decode_cursor(cursor, int),
+        limit=limit,
+    )
+    return page.to_response()
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count refutations",
+    description=(
+        "Count the refutations matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, a count restricted only by ID or creation time bounds (e.g. \"this month\" for an "
+        "administrator) is estimated from table statistics in constant time. Other counts are always exact, as "
+        "reported by `approximate` in the response."
+    ),
+)
+async def count_refutations(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    refutation_id: Annotated[Optional[int], Query(description="Filter by refutation ID")] = None,
+    refutation_message: Annotated[
+        Optional[str],
+        Query(
+            description="Filter by refutation message [pattern]"
             "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
         ),
     ] = None,
+    refutation_response: Annotated[
+        Optional[str],
+        Query(
+            description="Filter by refutation response [pattern]"
+            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
+        ),
+    ] = None,
+    author_id: Annotated[Optional[int], Query(description="Filter by author ID")] = None,
+    violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
     user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
     min_id: Annotated[Optional[int], Query(description="Minimum value for refutation ID in the result set.")] = None,
     max_id: Annotated[Optional[int], Query(description="Maximum value for refutation ID in the result set.")] = None,
     min_created_at: Optional[datetime] = None,
     max_created_at: Optional[datetime] = None,
-) -> List[Refutation]:
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
     if user.permission_obj.administrator or user.permission_obj.view_users:
         related_to = None
     else:
@@ -62,20 +138,56 @@ async def get_refutations(
     min_id = max(min_id or _min_id, _min_id)
     max_id = min(max_id or _max_id, _max_id)
 
-    return await Refutation.query(
+    return await Refutation.count(
         refutation_id=refutation_id,
         refutation_message=refutation_message,
         refutation_response=refutation_response,
         author_id=author_id,
         violation_id=violation_id,
         vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
         user_id=user_id,
         min_id=min_id,
         max_id=max_id,
         related_to=related_to,
+        approximate=approximate,
     )
 
 
+@router.get(
+    "/search",
+    response_model=List[Refutation],
+    summary="Search refutations",
+    description=(
+        "Search refutation messages and responses for keywords, ignoring case and diacritics (`khieu nai` matches "
+        "`Khiếu nại`). Return up to `limit` refutations, ranked by the number of matched keywords, then by relevance."
+    ),
+)
+async def search_refutations(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    q: Annotated[str, Query(description="The keywords to search for", min_length=1, max_length=256)],
+    field: Annotated[
+        Optional[Literal["message", "response"]],
+        Query(description="Only search refutation messages or responses. By default, both are searched."),
+    ] = None,
+    fields: Annotated[
+        Optional[str],
+        Query(
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+    limit: Annotated[int, Query(description="The maximum number of refutations to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    result = await Refutation.search(q, fields, field=field, related_to=related_to, limit=limit)
+    return json_response(result)
+
+
 class __RefutationCreationPayload(BaseModel):
     """Payload for creating a new refutation."""
 
@@ -108,11 +220,10 @@ async def create_refutation(
     conflict = HTTPException(status_code=409, detail="The provided violation ID does not exist.")
     if not user.permission_obj.administrator and not user.permission_obj.create_refutation:
         # Check that `user` is the same as `violation.vehicle.user`
-        violations = await Violation.query(violation_id=payload.violation_id)
-        if len(violations) != 1:
+        violation = await Violation.load(payload.violation_id)
+        if violation is None:
             raise conflict
 
-        violation = violations[0]
         if violation.vehicle.user != user:
             raise HTTPException(status_code=403, detail="Missing `CREATE_REFUTATION` permission")
 
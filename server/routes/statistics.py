@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BeforeValidator
+
+from ..config import ROLLUP_COMPACT_INTERVAL, STATISTICS_BUCKETS_MAX
+from ..models import DetectedStatistics, TransactionStatistics, User, ViolationStatistics
+from ..models.statistics import BUCKET_HOURS
+from ..utils import StatisticsBucket, hour_range
+
+
+__all__ = ()
+router = APIRouter(prefix="/statistics", tags=["statistics"])
+DESCRIPTION = (
+    "Buckets overlapping `[min_created_at, max_created_at]` are returned in ascending order of time, and buckets without "
+    "any {0} are omitted. `max_created_at` defaults to the current time. Days start at midnight UTC.\n\n"
+    f"Statistics are read from hourly rollups, which are updated every {ROLLUP_COMPACT_INTERVAL:g} seconds."
+)
+
+
+def __buckets(bucket: StatisticsBucket, min_created_at: Optional[datetime], max_created_at: Optional[datetime]) -> Tuple[int, int]:
+    min_hour, max_hour = hour_range(min_created_at, max_created_at)
+    width = BUCKET_HOURS[bucket]
+    if max_hour // width - min_hour // width >= STATISTICS_BUCKETS_MAX:
+        raise HTTPException(400, detail=f"The time range spans more than {STATISTICS_BUCKETS_MAX} buckets")
+
+    return min_hour, max_hour
+
+
+@router.get(
+    "/violations",
+    response_model=List[ViolationStatistics],
+    summary="Violation statistics",
+    description="Count the violations and sum their fines by creation time bucket and category.\n\n" + DESCRIPTION.format("violation"),
+    responses={
+        400: {
+            "description": f"The time range spans more than {STATISTICS_BUCKETS_MAX} buckets",
+        },
+        403: {
+            "description": "Missing `VIEW_USERS` permission",
+        },
+    },
+)
+async def get_violation_statistics(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    bucket: Annotated[StatisticsBucket, Query(description="The size of the time buckets")] = "day",
+    # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
+    category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by violation category"), BeforeValidator(int)] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+) -> List[ViolationStatistics]:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        min_hour, max_hour = __buckets(bucket, min_created_at, max_created_at)
+        return await ViolationStatistics.query(bucket=bucket, min_hour=min_hour, max_hour=max_hour, category=category)
+
+    raise HTTPException(403, detail="Missing `VIEW_USERS` permission")
+
+
+@router.get(
+    "/detected",
+    response_model=List[DetectedStatistics],
+    summary="Detected violation statistics",
+    description="Count the detected violations by creation time bucket and category.\n\n" + DESCRIPTION.format("detected violation"),
+    responses={
+        400: {
+            "description": f"The time range spans more than {STATISTICS_BUCKETS_MAX} buckets",
+        },
+        403: {
+            "description": "Missing `MANAGE_DETECTED` permission",
+        },
+    },
+)
+async def get_detected_statistics(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    bucket: Annotated[StatisticsBucket, Query(description="The size of the time buckets")] = "hour",
+    # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
+    category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by detected violation category"), BeforeValidator(int)] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+) -> List[DetectedStatistics]:
+    if user.permission_obj.administrator or user.permission_obj.manage_detected:
+        min_hour, max_hour = __buckets(bucket, min_created_at, max_created_at)
+        return await DetectedStatistics.query(bucket=bucket, min_hour=min_hour, max_hour=max_hour, category=category)
+
+    raise HTTPException(403, detail="Missing `MANAGE_DETECTED` permission")
+
+
+@router.get(
+    "/transactions",
+    response_model=List[TransactionStatistics],
+    summary="Transaction statistics",
+    description="Count the transactions and sum the fines they paid by time bucket.\n\n" + DESCRIPTION.format("transaction"),
+    responses={
+        400: {
+            "description": f"The time range spans more than {STATISTICS_BUCKETS_MAX} buckets",
+        },
+        403: {
+            "description": "Missing `VIEW_USERS` permission",
+        },
+    },
+)
+async def get_transaction_statistics(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    bucket: Annotated[StatisticsBucket, Query(description="The size of the time buckets")] = "day",
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+) -> List[TransactionStatistics]:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        min_hour, max_hour = __buckets(bucket, min_created_at, max_created_at)
+        return await TransactionStatistics.query(bucket=bucket, min_hour=min_hour, max_hour=max_hour)
+
+    raise HTTPException(403, detail="Missing `VIEW_USERS` permission")
@@ -3,11 +3,13 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import Transaction, User
-from ..utils import snowflake_range
+from ..config import DB_PAGINATION_MAX, DB_PAGINATION_QUERY, NEXT_CURSOR_HEADER
+from ..models import Count, Transaction, User
+from ..utils import EXPORT_MEDIA_TYPES, ExportFormat, decode_cursor, serialize_rows, snowflake_range
+from .filters import PlateMatchFilter
 
 
 __all__ = ()
@@ -16,27 +18,137 @@ router = APIRouter(prefix="/transactions", tags=["transactions"])
 
 @router.get(
     "/",
+    response_model=List[Transaction],
     summary="Query transactions",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} transactions from the database. The result is sorted by transaction ID in descending order.",
+    description=(
+        "Query up to `limit` transactions from the database. The result is sorted by transaction ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
 )
 async def get_transactions(
     user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
     transaction_id: Annotated[Optional[int], Query(description="Filter by transaction ID")] = None,
     violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
-    vehicle_plate: Annotated[
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    payer_id: Annotated[Optional[int], Query(description="Filter by payer ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for transaction ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for transaction ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    fields: Annotated[
         Optional[str],
         Query(
-            description="Filter by vehicle plate [pattern]"
-            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
         ),
     ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of transactions to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    page = await Transaction.project(
+        fields,
+        transaction_id=transaction_id,
+        violation_id=violation_id,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        user_id=user_id,
+        payer_id=payer_id,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+        before_id=decode_cursor(cursor, int),
+        limit=limit,
+    )
+    return page.to_response()
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count transactions",
+    description=(
+        "Count the transactions matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, a count restricted only by ID or creation time bounds (e.g. \"this month\" for an "
+        "administrator) is estimated from table statistics in constant time. Other counts are always exact, as "
+        "reported by `approximate` in the response."
+    ),
+)
+async def count_transactions(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    transaction_id: Annotated[Optional[int], Query(description="Filter by transaction ID")] = None,
+    violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    payer_id: Annotated[Optional[int], Query(description="Filter by payer ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for transaction ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for transaction ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    return await Transaction.count(
+        transaction_id=transaction_id,
+        violation_id=violation_id,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        user_id=user_id,
+        payer_id=payer_id,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+        approximate=approximate,
+    )
+
+
+@router.get(
+    "/export",
+    summary="Export transactions",
+    description=(
+        "Stream all matching transactions as flat rows of `view_transactions`, either as newline-delimited JSON or as CSV. "
+        "The result is sorted by transaction ID in descending order and is not paginated."
+    ),
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()},
+        },
+    },
+)
+async def export_transactions(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    format: Annotated[ExportFormat, Query(description="The output format")] = "ndjson",
+    transaction_id: Annotated[Optional[int], Query(description="Filter by transaction ID")] = None,
+    violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
     user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
     payer_id: Annotated[Optional[int], Query(description="Filter by payer ID")] = None,
     min_id: Annotated[Optional[int], Query(description="Minimum value for transaction ID in the result set.")] = None,
     max_id: Annotated[Optional[int], Query(description="Maximum value for transaction ID in the result set.")] = None,
     min_created_at: Optional[datetime] = None,
     max_created_at: Optional[datetime] = None,
-) -> List[Transaction]:
+) -> StreamingResponse:
     if user.permission_obj.administrator or user.permission_obj.view_users:
         related_to = None
     else:
@@ -46,13 +158,15 @@ async def get_transactions(
     min_id = max(min_id or _min_id, _min_id)
     max_id = min(max_id or _max_id, _max_id)
 
-    return await Transaction.query(
+    chunks = Transaction.export(
         transaction_id=transaction_id,
         violation_id=violation_id,
         vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
         user_id=user_id,
         payer_id=payer_id,
         min_id=min_id,
         max_id=max_id,
         related_to=related_to,
     )
+    return StreamingResponse(serialize_rows(chunks, format), media_type=EXPORT_MEDIA_TYPES[format])
@@ -4,14 +4,14 @@ from datetime import datetime, timedelta, timezone
 from typing import Annotated, List, Literal, Optional
 
 import jwt
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 from pyodbc import IntegrityError  # type: ignore
 from fastapi.security import OAuth2PasswordRequestForm
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import User
-from ..utils import snowflake_range
+from ..config import DB_PAGINATION_MAX, DB_PAGINATION_QUERY, NEXT_CURSOR_HEADER
+from ..models import Count, User
+from ..utils import decode_cursor, json_response, snowflake_range
 
 
 __all__ = ()
@@ -20,8 +20,12 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get(
     "/",
+    response_model=List[User],
     summary="Query users",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} users from the database. The result is sorted by user ID in descending order.",
+    description=(
+        "Query up to `limit` users from the database. The result is sorted by user ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
 )
 async def get_users(
     user: Annotated[User, Depends(User.oauth2_decode)],
@@ -38,7 +42,67 @@ async def get_users(
     max_id: Annotated[Optional[int], Query(description="Maximum value for user ID in the result set.")] = None,
     min_created_at: Optional[datetime] = None,
     max_created_at: Optional[datetime] = None,
-) -> List[User]:
+    fields: Annotated[
+        Optional[str],
+        Query(
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of users to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    page = await User.project(
+        fields,
+        user_id=user_id,
+        user_fullname=user_fullname,
+        user_phone=user_phone,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+        before_id=decode_cursor(cursor, int),
+        limit=limit,
+    )
+    return page.to_response()
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count users",
+    description=(
+        "Count the users matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, a count restricted only by ID or creation time bounds (e.g. \"this month\" for an "
+        "administrator) is estimated from table statistics in constant time. Other counts are always exact, as "
+        "reported by `approximate` in the response."
+    ),
+)
+async def count_users(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    user_id: Annotated[Optional[int], Query(description="Filter by user ID")] = None,
+    user_fullname: Annotated[
+        Optional[str],
+        Query(
+            description="Filter by full name [pattern]"
+            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
+        ),
+    ] = None,
+    user_phone: Annotated[Optional[str], Query(description="Filter by phone number")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for user ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for user ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
     if user.permission_obj.administrator or user.permission_obj.view_users:
         related_to = None
     else:
@@ -48,16 +112,48 @@ async def get_users(
     min_id = max(min_id or _min_id, _min_id)
     max_id = min(max_id or _max_id, _max_id)
 
-    return await User.query(
+    return await User.count(
         user_id=user_id,
         user_fullname=user_fullname,
         user_phone=user_phone,
         min_id=min_id,
         max_id=max_id,
         related_to=related_to,
+        approximate=approximate,
     )
 
 
+@router.get(
+    "/batch",
+    response_model=List[User],
+    summary="Get users by ID",
+    description=(
+        "Get the users with the given IDs (up to `DB_PAGINATION_MAX`) in a single query, e.g. the creators and owners "
+        "of a page of violations. The result is sorted by user ID in descending order, and IDs that do not exist or "
+        "are not visible to the current user are omitted."
+    ),
+)
+async def get_users_batch(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    ids: Annotated[List[int], Query(alias="id", description="The user IDs, e.g. `?id=1&id=2`", min_length=1, max_length=DB_PAGINATION_MAX)],
+    fields: Annotated[
+        Optional[str],
+        Query(
+            description="Comma-separated fields to return, e.g. `id,fullname`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    user_ids = list(dict.fromkeys(ids))
+    page = await User.project(fields, user_ids=user_ids, related_to=related_to, limit=len(user_ids))
+    return json_response(page.items)
+
+
 class __UserCreationPayload(BaseModel):
     """Payload for creating a new user"""
 
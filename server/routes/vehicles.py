@@ -2,11 +2,13 @@ from __future__ import annotations
 
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pyodbc import IntegrityError  # type: ignore
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import User, Vehicle
+from ..config import DB_PAGINATION_MAX, DB_PAGINATION_QUERY, NEXT_CURSOR_HEADER
+from ..models import Count, User, Vehicle
+from ..utils import decode_cursor, json_response, normalize_plate
+from .filters import PlateMatchFilter
 
 
 __all__ = ()
@@ -15,38 +17,122 @@ router = APIRouter(prefix="/vehicles", tags=["vehicles"])
 
 @router.get(
     "/",
+    response_model=List[Vehicle],
     summary="Query vehicles",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} vehicles from the database. The result is sorted by vehicle plate in ascending order.",
+    description=(
+        "Query up to `limit` vehicles from the database. The result is sorted by vehicle plate in ascending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
 )
 async def get_vehicles(
     user: Annotated[User, Depends(User.oauth2_decode)],
-    vehicle_plate: Annotated[
+    plate_match: PlateMatchFilter,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    vehicle_violations_count: Annotated[Optional[int], Query(description="Filter by violations count")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by user ID")] = None,
+    min_plate: Annotated[Optional[str], Query(description="Minimum value for vehicle plate in the result set (lexicography order).")] = None,
+    max_plate: Annotated[Optional[str], Query(description="Maximum value for vehicle plate in the result set (lexicography order).")] = None,
+    fields: Annotated[
         Optional[str],
         Query(
-            description="Filter by vehicle plate [pattern]"
-            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
         ),
     ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of vehicles to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    page = await Vehicle.project(
+        fields,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        vehicle_violations_count=vehicle_violations_count,
+        user_id=user_id,
+        min_plate=min_plate,
+        max_plate=max_plate,
+        related_to=related_to,
+        after_plate=decode_cursor(cursor, str),
+        limit=limit,
+    )
+    return page.to_response()
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count vehicles",
+    description=(
+        "Count the vehicles matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, an unfiltered count (for an administrator) is estimated from table statistics in "
+        "constant time. Other counts are always exact, as reported by `approximate` in the response."
+    ),
+)
+async def count_vehicles(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
     vehicle_violations_count: Annotated[Optional[int], Query(description="Filter by violations count")] = None,
     user_id: Annotated[Optional[int], Query(description="Filter by user ID")] = None,
     min_plate: Annotated[Optional[str], Query(description="Minimum value for vehicle plate in the result set (lexicography order).")] = None,
     max_plate: Annotated[Optional[str], Query(description="Maximum value for vehicle plate in the result set (lexicography order).")] = None,
-) -> List[Vehicle]:
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
     if user.permission_obj.administrator or user.permission_obj.view_users:
         related_to = None
     else:
         related_to = user.id
 
-    return await Vehicle.query(
+    return await Vehicle.count(
         vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
         vehicle_violations_count=vehicle_violations_count,
         user_id=user_id,
         min_plate=min_plate,
         max_plate=max_plate,
         related_to=related_to,
+        approximate=approximate,
     )
 
 
+@router.get(
+    "/batch",
+    response_model=List[Vehicle],
+    summary="Get vehicles by plate",
+    description=(
+        "Get the vehicles with the given plates (up to `DB_PAGINATION_MAX`) in a single query. Plates are matched "
+        "ignoring case and separators. The result is sorted by vehicle plate in ascending order, and plates that do "
+        "not exist or are not visible to the current user are omitted."
+    ),
+)
+async def get_vehicles_batch(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plates: Annotated[
+        List[str],
+        Query(alias="plate", description="The vehicle plates, e.g. `?plate=29T100001&plate=30A12345`", min_length=1, max_length=DB_PAGINATION_MAX),
+    ],
+    fields: Annotated[
+        Optional[str],
+        Query(
+            description="Comma-separated fields to return, e.g. `plate,user.id`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    vehicle_plates = list(dict.fromkeys(map(normalize_plate, plates)))
+    page = await Vehicle.project(fields, vehicle_plates=vehicle_plates, related_to=related_to, limit=len(vehicle_plates))
+    return json_response(page.items)
+
+
 @router.post(
     "/",
     summary="Register a new vehicle",
@@ -83,3 +169,5 @@ async def register_vehicle(
         await Vehicle.create(vehicle_plate=vehicle_plate, user_id=user_id)
     except IntegrityError:
         raise HTTPException(status_code=409, detail="Vehicle with this plate already exists.")
+
+    User.invalidate(user_id)
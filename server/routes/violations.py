@@ -3,13 +3,15 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Annotated, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BeforeValidator
 from pyodbc import IntegrityError  # type: ignore
 
-from ..config import DB_PAGINATION_QUERY
-from ..models import User, Violation
-from ..utils import snowflake_range
+from ..config import DB_PAGINATION_MAX, DB_PAGINATION_QUERY, NEXT_CURSOR_HEADER
+from ..models import Count, User, Violation
+from ..utils import EXPORT_MEDIA_TYPES, ExportFormat, decode_cursor, encode_cursor, etag_matches, serialize_rows, snowflake_range
+from .filters import PlateMatchFilter
 
 
 __all__ = ()
@@ -18,11 +20,16 @@ router = APIRouter(prefix="/violations", tags=["violations"])
 
 @router.get(
     "/",
+    response_model=List[Violation],
     summary="Query violations",
-    description=f"Query a maximum of {DB_PAGINATION_QUERY} violations from the database. The result is sorted by violation ID in descending order.",
+    description=(
+        "Query up to `limit` violations from the database. The result is sorted by violation ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page."
+    ),
 )
 async def get_violations(
     user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
     violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
     creator_id: Annotated[Optional[int], Query(description="Filter by creator ID")] = None,
     # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
@@ -36,19 +43,86 @@ async def get_violations(
         ),
     ] = None,
     violation_refutations_count: Annotated[Optional[int], Query(description="Filter by the number of refutations")] = None,
-    vehicle_plate: Annotated[
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for violation ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for violation ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+    fields: Annotated[
+        Optional[str],
+        Query(
+            description="Comma-separated fields to return, e.g. `id,vehicle.plate`. Nested fields are separated by dots, "
+            "and selecting a field selects all of its nested fields. By default, all fields are returned.",
+        ),
+    ] = None,
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of violations to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+) -> Response:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    page = await Violation.project(
+        fields,
+        violation_id=violation_id,
+        creator_id=creator_id,
+        violation_category=violation_category,
+        violation_fine_vnd=violation_fine_vnd,
+        violation_video_url=violation_video_url,
+        violation_refutations_count=violation_refutations_count,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        user_id=user_id,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+        before_id=decode_cursor(cursor, int),
+        limit=limit,
+    )
+    return page.to_response()
+
+
+@router.get(
+    "/count",
+    response_model=Count,
+    summary="Count violations",
+    description=(
+        "Count the violations matching the same filters as the list endpoint, without fetching them.\n\n"
+        "With `approximate`, a count restricted only by ID or creation time bounds (e.g. \"this month\" for an "
+        "administrator) is estimated from table statistics in constant time. Other counts are always exact, as "
+        "reported by `approximate` in the response."
+    ),
+)
+async def count_violations(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
+    creator_id: Annotated[Optional[int], Query(description="Filter by creator ID")] = None,
+    # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
+    violation_category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by violation category"), BeforeValidator(int)] = None,
+    violation_fine_vnd: Annotated[Optional[int], Query(description="Filter by the fine amount in VND")] = None,
+    violation_video_url: Annotated[
         Optional[str],
         Query(
-            description="Filter by vehicle plate [pattern]"
+            description="Filter by video URL [pattern]"
             "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
         ),
     ] = None,
+    violation_refutations_count: Annotated[Optional[int], Query(description="Filter by the number of refutations")] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
     user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
     min_id: Annotated[Optional[int], Query(description="Minimum value for violation ID in the result set.")] = None,
     max_id: Annotated[Optional[int], Query(description="Maximum value for violation ID in the result set.")] = None,
     min_created_at: Optional[datetime] = None,
     max_created_at: Optional[datetime] = None,
-) -> List[Violation]:
+    approximate: Annotated[bool, Query(description="Estimate the count from table statistics when possible")] = False,
+) -> Count:
     if user.permission_obj.administrator or user.permission_obj.view_users:
         related_to = None
     else:
@@ -58,7 +132,7 @@ async def get_violations(
     min_id = max(min_id or _min_id, _min_id)
     max_id = min(max_id or _max_id, _max_id)
 
-    return await Violation.query(
+    return await Violation.count(
         violation_id=violation_id,
         creator_id=creator_id,
         violation_category=violation_category,
@@ -66,13 +140,79 @@ async def get_violations(
         violation_video_url=violation_video_url,
         violation_refutations_count=violation_refutations_count,
         vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
         user_id=user_id,
         min_id=min_id,
         max_id=max_id,
         related_to=related_to,
+        approximate=approximate,
     )
 
 
+@router.get(
+    "/export",
+    summary="Export violations",
+    description=(
+        "Stream all matching violations as flat rows of `view_violations`, either as newline-delimited JSON or as CSV. "
+        "The result is sorted by violation ID in descending order and is not paginated."
+    ),
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()},
+        },
+    },
+)
+async def export_violations(
+    user: Annotated[User, Depends(User.oauth2_decode)],
+    plate_match: PlateMatchFilter,
+    format: Annotated[ExportFormat, Query(description="The output format")] = "ndjson",
+    violation_id: Annotated[Optional[int], Query(description="Filter by violation ID")] = None,
+    creator_id: Annotated[Optional[int], Query(description="Filter by creator ID")] = None,
+    # BeforeValidator(int): https://github.com/fastapi/fastapi/discussions/8966
+    violation_category: Annotated[Optional[Literal[0, 1, 2]], Query(description="Filter by violation category"), BeforeValidator(int)] = None,
+    violation_fine_vnd: Annotated[Optional[int], Query(description="Filter by the fine amount in VND")] = None,
+    violation_video_url: Annotated[
+        Optional[str],
+        Query(
+            description="Filter by video URL [pattern]"
+            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
+        ),
+    ] = None,
+    violation_refutations_count: Annotated[Optional[int], Query(description="Filter by the number of refutations")] = None,
+    vehicle_plate: Annotated[Optional[str], Query(description="Filter by vehicle plate, see `plate_match`")] = None,
+    user_id: Annotated[Optional[int], Query(description="Filter by violator ID")] = None,
+    min_id: Annotated[Optional[int], Query(description="Minimum value for violation ID in the result set.")] = None,
+    max_id: Annotated[Optional[int], Query(description="Maximum value for violation ID in the result set.")] = None,
+    min_created_at: Optional[datetime] = None,
+    max_created_at: Optional[datetime] = None,
+) -> StreamingResponse:
+    if user.permission_obj.administrator or user.permission_obj.view_users:
+        related_to = None
+    else:
+        related_to = user.id
+
+    _min_id, _max_id = snowflake_range(min_created_at, max_created_at)
+    min_id = max(min_id or _min_id, _min_id)
+    max_id = min(max_id or _max_id, _max_id)
+
+    chunks = Violation.export(
+        violation_id=violation_id,
+        creator_id=creator_id,
+        violation_category=violation_category,
+        violation_fine_vnd=violation_fine_vnd,
+        violation_video_url=violation_video_url,
+        violation_refutations_count=violation_refutations_count,
+        vehicle_plate=vehicle_plate,
+        plate_match=plate_match,
+        user_id=user_id,
+        min_id=min_id,
+        max_id=max_id,
+        related_to=related_to,
+    )
+    return StreamingResponse(serialize_rows(chunks, format), media_type=EXPORT_MEDIA_TYPES[format])
+
+
 @router.post(
     "/",
     summary="Add a new violation",
@@ -112,17 +252,34 @@ async def add_violation(
     "/{plate}",
     summary="Query violations by vehicle plate",
     description=(
-        f"Query a maximum of {DB_PAGINATION_QUERY} violations from the database. The result is sorted by violation ID in descending order.\n\n"
+        "Query up to `limit` violations from the database. The result is sorted by violation ID in descending order.\n\n"
+        f"If there may be more results, the `{NEXT_CURSOR_HEADER}` response header contains the cursor of the next page.\n\n"
+        "Results may be cached for a few seconds. Send the `ETag` of a previous response in the `If-None-Match` header "
+        "to receive an empty 304 response if the result has not changed.\n\n"
         "This endpoint does not require authorization."
     ),
+    response_model=List[Violation],
+    responses={
+        304: {
+            "description": "The result matches the `If-None-Match` header.",
+        },
+    },
 )
 async def get_violations_by_plate(
     plate: Annotated[
         str,
-        Path(
-            description="Filter by vehicle plate [pattern]"
-            "(https://learn.microsoft.com/en-us/sql/t-sql/language-elements/like-transact-sql?view=sql-server-ver16#pattern).",
-        ),
+        Path(description="The vehicle plate, matched regardless of case and separators (`29t1-000.01` matches `29T100001`)"),
     ],
-) -> List[Violation]:
-    return await Violation.query(vehicle_plate=plate)
+    cursor: Annotated[Optional[str], Query(description=f"Pagination cursor from the `{NEXT_CURSOR_HEADER}` header of the previous page.")] = None,
+    limit: Annotated[int, Query(description="The maximum number of violations to return.", ge=1, le=DB_PAGINATION_MAX)] = DB_PAGINATION_QUERY,
+    if_none_match: Annotated[Optional[str], Header(description="The `ETag` of a previous response.")] = None,
+) -> Response:
+    page = await Violation.query_plate(plate, before_id=decode_cursor(cursor, int), limit=limit)
+    headers = {"ETag": page.etag}
+    if page.last_id is not None:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(page.last_id)
+
+    if if_none_match is not None and etag_matches(if_none_match, page.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(page.body, media_type="application/json", headers=headers)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List
+
+
+__all__ = ("fold", "terms", "terms_json")
+# The length of the `term` column of IT3930_RefutationTerms, longer terms are truncated
+TERM_MAX_LENGTH = 64
+_TOKEN = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase `text` and strip its diacritics, so that "Khiếu nại" and "khieu nai" are the same.
+
+    "đ" is a letter of its own rather than "d" with a combining mark, so it is replaced explicitly.
+    """
+    decomposed = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def terms(text: str) -> Dict[str, int]:
+    """Split `text` into folded terms and count their occurrences."""
+    return Counter(token[:TERM_MAX_LENGTH] for token in _TOKEN.findall(fold(text)))
+
+
+def terms_json(text: str) -> str:
+    """The terms of `text` as the JSON array expected by the `@Terms` parameter of the refutation procedures."""
+    items: List[Dict[str, object]] = [{"term": term, "weight": weight} for term, weight in terms(text).items()]
+    return json.dumps(items, ensure_ascii=False)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, ClassVar, Dict, Iterator, Optional, Set, TYPE_CHECKING
+
+from .config import DB_PAGINATION_MAX, DETECTED_STREAM_LOOKBACK, DETECTED_STREAM_POLL_INTERVAL, DETECTED_STREAM_QUEUE_SIZE
+from .database import Database
+from .models import Detected
+from .utils import snowflake_range
+
+
+__all__ = ("DetectedHub",)
+# An item of a subscriber queue: a detected violation, or `None` if the subscriber fell behind and was dropped
+Event = Optional[Dict[str, Any]]
+
+
+class DetectedHub:
+    """Broadcast new detected violations to the stream subscribers of this process.
+
+    While there are subscribers, a single task polls `view_detected` for new rows every `DETECTED_STREAM_POLL_INTERVAL`
+    seconds, or right away after `notify`. Polling from the database (rather than publishing from `Detected.create`)
+    also delivers rows created by other worker processes. Snowflake IDs of concurrent processes are not committed in
+    order, so the last `DETECTED_STREAM_LOOKBACK` seconds of IDs are polled again and already delivered rows skipped.
+    """
+
+    instance: ClassVar[DetectedHub]
+    __slots__ = ("__subscribers", "__wakeup", "__task", "__start", "__cursor", "__seen")
+    if TYPE_CHECKING:
+        __subscribers: Set[asyncio.Queue[Event]]
+        __wakeup: asyncio.Event
+        __task: Optional[asyncio.Task[None]]
+        __start: int
+        __cursor: int
+        __seen: Set[int]
+
+    def __init__(self) -> None:
+        self.__subscribers = set()
+        self.__wakeup = asyncio.Event()
+        self.__task = None
+        self.__start = 0
+        self.__cursor = 0
+        self.__seen = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self.__subscribers)
+
+    def notify(self) -> None:
+        """Poll right away, e.g. after this process created detected violations."""
+        self.__wakeup.set()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue[Event]]:
+        """Receive the detected violations created from now on, in a bounded queue."""
+        queue: asyncio.Queue[Event] = asyncio.Queue(DETECTED_STREAM_QUEUE_SIZE)
+        self.__subscribers.add(queue)
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__run())
+
+        try:
+            yield queue
+        finally:
+            self.__subscribers.discard(queue)
+
+    async def __run(self) -> None:
+        # Only rows created after the first subscription are broadcast, subscribers replay older ones themselves
+        self.__start = self.__cursor = snowflake_range(datetime.now(timezone.utc), None)[0]
+        self.__seen = set()
+        while self.__subscribers:
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), DETECTED_STREAM_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+            self.__wakeup.clear()
+            try:
+                await self.__poll()
+            except Exception as e:
+                print(f"Failed to poll detected violations: {e!r}", file=sys.stderr)
+
+    async def __poll(self) -> None:
+        floor = max(self.__start, self.__cursor - (int(1000 * DETECTED_STREAM_LOOKBACK) << 16))
+        self.__seen = {id for id in self.__seen if id > floor}
+        after: Optional[int] = floor
+        while after is not None:
+            # Replicas may lag behind by more than the lookback
+            with Database.primary():
+                page = await Detected.since(after, limit=DB_PAGINATION_MAX)
+
+            for item in page.items:
+                if item["id"] not in self.__seen:
+                    self.__seen.add(item["id"])
+                    self.__cursor = max(self.__cursor, item["id"])
+                    self.__broadcast(item)
+
+            after = page.last_key
+
+    def __broadcast(self, item: Dict[str, Any]) -> None:
+        for queue in list(self.__subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Make room for the signal to disconnect, the client resumes from its last event
+                self.__subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+
+                queue.put_nowait(None)
+
+
+DetectedHub.instance = DetectedHub()
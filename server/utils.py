@@ -1,26 +1,114 @@
 from __future__ import annotations
 
+import asyncio
+import binascii
+import csv
+import hmac
+import io
+import json
 import secrets
-import string
+import threading
+from base64 import b64encode, urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from hashlib import sha512
-from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union, TYPE_CHECKING
+from functools import cache, partial
+from hashlib import pbkdf2_hmac, sha512
+from typing import Any, AsyncIterable, AsyncIterator, Callable, ClassVar, Dict, Iterable, List, Literal, Optional, Sequence, Set, Tuple, TypeVar, Union, TYPE_CHECKING
 
-from .config import EPOCH
+from fastapi import Response
+from pydantic_core import to_json
+
+from .config import EPOCH, NEXT_CURSOR_HEADER, PASSWORD_HASH_ITERATIONS, PASSWORD_HASH_WORKERS
 
 
 __all__ = ()
 T = TypeVar("T")
+ExportFormat = Literal["ndjson", "csv"]
+PlateMatch = Literal["exact", "prefix", "pattern"]
+StatisticsBucket = Literal["hour", "day"]
+PASSWORD_HASH_ALGORITHM = "pbkdf2_sha256"
+# Threads are only started when passwords are hashed
+_PASSWORD_EXECUTOR = ThreadPoolExecutor(PASSWORD_HASH_WORKERS, thread_name_prefix="password-hasher")
+EXPORT_MEDIA_TYPES: Dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a malformed pagination cursor."""
+
+
+def sql_type(value: Any) -> str:
+    """The SQL Server type that a parameter of this Python value is declared as by `SQLBuildHelper`.
+
+    Types only depend on the Python type (and, for strings, on whether they fit in 4000 characters), never on the value
+    itself, so that a statement is always compiled with the same parameter declarations.
+    """
+    if value is None:
+        return "SQL_VARIANT"
+
+    if isinstance(value, bool):
+        return "BIT"
+
+    if isinstance(value, int):
+        return "BIGINT"
+
+    if isinstance(value, float):
+        return "FLOAT"
+
+    if isinstance(value, str):
+        return "NVARCHAR(4000)" if len(value) <= 4000 else "NVARCHAR(MAX)"
+
+    if isinstance(value, bytes):
+        return "VARBINARY(MAX)"
+
+    if isinstance(value, datetime):
+        return "DATETIME2"
+
+    raise TypeError(f"Unsupported SQL parameter type: {type(value).__name__}")
+
+
+def parameterize(statement: str, values: Sequence[Any]) -> Tuple[str, str]:
+    """Replace the `?` placeholders of `statement` (outside string literals) by `@P1`, `@P2`, ... and declare them
+    according to `values`, for `sp_executesql`.
+    """
+    parts = statement.split("'")
+    index = 0
+    for i in range(0, len(parts), 2):
+        chunks = parts[i].split("?")
+        for j in range(1, len(chunks)):
+            index += 1
+            chunks[j] = f"@P{index}{chunks[j]}"
+
+        parts[i] = "".join(chunks)
+
+    if index != len(values):
+        raise ValueError(f"Statement has {index} placeholder(s) but {len(values)} value(s) were given")
+
+    return "'".join(parts), ", ".join(f"@P{i} {sql_type(value)}" for i, value in enumerate(values, start=1))
 
 
 class SQLBuildHelper:
+    """Build a SELECT statement from optional filters.
+
+    Conditions are always emitted in the order they were added, and the statement runs through `sp_executesql` with
+    parameter declarations from `sql_type`. Each combination of present filters is therefore a single statement shape
+    with a single cached plan, however the driver would have bound the values.
+
+    Conditions on `VARCHAR` columns should cast their parameters (e.g. `plate = CAST(? AS VARCHAR(8000))`), otherwise the
+    column is implicitly converted to `NVARCHAR` and its index cannot be seeked.
+    """
 
-    __slots__ = ("__pre_query", "__post_query", "__conditions", "__values")
+    # Hashes of the distinct statement shapes built by this process
+    shapes: ClassVar[Set[int]] = set()
+    __slots__ = ("__pre_query", "__post_query", "__conditions", "__values", "__recompile")
     if TYPE_CHECKING:
         __pre_query: Tuple[str, Tuple[Any, ...]]
         __post_query: Tuple[str, Tuple[Any, ...]]
         __conditions: List[str]
         __values: List[Any]
+        __recompile: bool
 
     def __init__(
         self,
@@ -31,14 +119,26 @@ class SQLBuildHelper:
         self.__post_query = (post_query, ()) if isinstance(post_query, str) else post_query
         self.__conditions = []
         self.__values = []
+        self.__recompile = False
 
-    def add_condition(self, condition: str, *values: Any, not_null_params: bool = True) -> SQLBuildHelper:
-        """Warning: `condition` is formatted directly into the SQL query."""
+    def add_condition(
+        self,
+        condition: str,
+        *values: Any,
+        not_null_params: bool = True,
+        recompile: bool = False,
+    ) -> SQLBuildHelper:
+        """Warning: `condition` is formatted directly into the SQL query.
+
+        Set `recompile` for conditions whose best plan depends on the value, e.g. LIKE patterns from clients that may or
+        may not start with a wildcard: the statement is then compiled for the actual values and its plan is not cached.
+        """
         if not_null_params and None in values:
             return self
 
         self.__conditions.append(f"({condition})")
         self.__values.extend(values)
+        self.__recompile = self.__recompile or recompile
         return self
 
     def execute(self, func: Callable[..., T]) -> T:
@@ -51,26 +151,184 @@ class SQLBuildHelper:
             parts.append(" AND ".join(self.__conditions))
 
         parts.append(post_query)
-        return func("\n".join(parts), *pre_query_values, *self.__values, *post_query_values)
+        if self.__recompile:
+            parts.append("OPTION (RECOMPILE)")
+
+        values = (*pre_query_values, *self.__values, *post_query_values)
+        statement, declarations = parameterize("\n".join(parts), values)
+        self.shapes.add(hash((statement, declarations)))
+        return func(
+            "EXECUTE sp_executesql ?, ?" + ", ?" * len(values),
+            statement,
+            declarations,
+            *values,
+        )
+
+
+def normalize_plate(plate: str) -> str:
+    """Normalize a vehicle plate like the `plate_key` columns of the database: uppercase, without separators.
+
+    `29T1-000.01` and `29t1 00001` both become `29T100001`.
+    """
+    return plate.replace("-", "").replace(".", "").replace(" ", "").upper()
+
+
+def plate_condition(plate: Optional[str], match: PlateMatch) -> Tuple[str, Optional[str]]:
+    """Build a condition on the `vehicle_plate` columns of the views and its parameter, for `SQLBuildHelper.add_condition`.
+
+    "exact" and "prefix" compare normalized plates against the indexed `vehicle_plate_key` column. "pattern" matches the
+    raw plate against a LIKE pattern, which scans the whole view.
+    """
+    if plate is None:
+        return "", None
+
+    if match == "exact":
+        return "vehicle_plate_key = CAST(? AS VARCHAR(8000))", normalize_plate(plate)
+
+    if match == "prefix":
+        # A LIKE without leading wildcards is a range seek, provided the prefix itself contains no wildcards
+        prefix = normalize_plate(plate)
+        for c in "[%_":
+            prefix = prefix.replace(c, f"[{c}]")
 
+        return "vehicle_plate_key LIKE CAST(? AS VARCHAR(8000))", prefix + "%"
+
+    return "vehicle_plate LIKE CAST(? AS VARCHAR(8000))", plate
+
+
+def json_array(values: Optional[Iterable[Any]]) -> Optional[str]:
+    """Encode `values` as a JSON array for an `OPENJSON` parameter. `None` stays `None`, so that the condition is skipped."""
+    if values is None:
+        return None
+
+    return json.dumps(list(values), ensure_ascii=False)
+
+
+def encode_cursor(value: Union[int, str]) -> str:
+    """Encode the sort key of the last row in a page into an opaque pagination cursor."""
+    return urlsafe_b64encode(str(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], type: Callable[[str], T]) -> Optional[T]:
+    """Decode a pagination cursor created by `encode_cursor` and convert its sort key using `type`.
+
+    Raises
+    -----
+    `InvalidCursor`
+        The cursor is malformed.
+    """
+    if cursor is None:
+        return None
 
-def hash_password(password: str, *, salt: Optional[str] = None) -> str:
-    """Hash a password using SHA-512 and a random salt."""
+    try:
+        return type(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+async def serialize_rows(chunks: AsyncIterable[List[Any]], format: ExportFormat) -> AsyncIterator[str]:
+    """Serialize chunks of `pyodbc.Row` objects into NDJSON lines or CSV records, one string per chunk.
+
+    Column names are taken from the cursor description of the first row. For CSV, they are written as the header.
+    """
+    columns: Optional[List[str]] = None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    async for rows in chunks:
+        if columns is None:
+            columns = [column[0] for column in rows[0].cursor_description]
+            if format == "csv":
+                writer.writerow(columns)
+
+        if format == "csv":
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+                buffer.write("\n")
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def json_response(content: Any, *, next_cursor: Optional[Union[int, str]] = None) -> Response:
+    """Serialize `content` to a JSON response with pydantic-core, bypassing the response validation of FastAPI.
+
+    Models are serialized with their own schema, so `content` must be trusted (e.g. built from database rows).
+    If `next_cursor` is given, it is encoded into the `NEXT_CURSOR_HEADER` header.
+    """
+    headers = {} if next_cursor is None else {NEXT_CURSOR_HEADER: encode_cursor(next_cursor)}
+    return Response(to_json(content), media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check whether an `If-None-Match` header value matches `etag` (using the weak comparison)."""
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def hash_password(password: str, *, salt: Optional[str] = None, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    """Hash a password using PBKDF2-HMAC-SHA256 and a random salt.
+
+    The result has the format `pbkdf2_sha256$<iterations>$<salt>$<base64 hash>` (88 characters with the default salt).
+    This is CPU-bound for a long time by design: in the API server, use `run_password_hasher`.
+    """
     if salt is None:
-        salt = secure_hex_string(8)
+        salt = secrets.token_urlsafe(16)
 
-    return sha512((password + salt).encode("utf-8")).hexdigest() + salt
+    digest = pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), iterations)
+    return f"{PASSWORD_HASH_ALGORITHM}${iterations}${salt}${b64encode(digest).decode('ascii')}"
 
 
 def check_password(password: str, *, hashed: str) -> bool:
-    """Check if a password matches a hashed password."""
-    salt = hashed[-8:]
-    return hashed == hash_password(password, salt=salt)
+    """Check if a password matches a hashed password, in either the current or the legacy (SHA-512 + salt) format."""
+    if "$" not in hashed:
+        salt = hashed[-8:]
+        return hmac.compare_digest(hashed, sha512((password + salt).encode("utf-8")).hexdigest() + salt)
+
+    try:
+        algorithm, iterations, salt, _ = hashed.split("$")
+        if algorithm != PASSWORD_HASH_ALGORITHM:
+            return False
+
+        return hmac.compare_digest(hashed, hash_password(password, salt=salt, iterations=int(iterations)))
+
+    except ValueError:
+        return False
+
+
+@cache
+def dummy_hashed_password() -> str:
+    """A hash of a random password with the current algorithm and cost, computed once.
+
+    Checking a password against it when a user does not exist takes as long as against a real hash, so that login
+    response times do not reveal which phone numbers are registered. Like hashing, the first call is CPU-bound for a long
+    time: call it from `run_password_hasher`.
+    """
+    return hash_password(secrets.token_urlsafe(16))
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    """Whether a hashed password uses the legacy format or an outdated cost, and should be replaced after a login."""
+    return not hashed.startswith(f"{PASSWORD_HASH_ALGORITHM}${PASSWORD_HASH_ITERATIONS}$")
+
+
+async def run_password_hasher(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """This function is a coroutine.
+
+    Run `hash_password` or `check_password` in a thread pool of `PASSWORD_HASH_WORKERS` threads, so that hashing never
+    blocks the event loop. hashlib releases the GIL while hashing, so the threads run in parallel with the loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_PASSWORD_EXECUTOR, partial(func, *args, **kwargs))
 
 
 def secure_hex_string(length: int) -> str:
     """Generate a secure random hexadecimal string."""
-    return "".join(secrets.choice(string.hexdigits) for _ in range(length))
+    return secrets.token_hex((length + 1) // 2)[:length]
 
 
 def since_epoch(dt: Optional[datetime] = None) -> timedelta:
@@ -107,3 +365,79 @@ def snowflake_range(min: Optional[datetime], max: Optional[datetime]) -> Tuple[i
     max_id = ((1 << 63) - 1) if max is None else int(1000 * since_epoch(max).total_seconds()) << 16
 
     return (min_id, max_id | 0xFFFF)
+
+
+def hour_range(min: Optional[datetime], max: Optional[datetime]) -> Tuple[int, int]:
+    """Get the first and last hours since the epoch (as in the hourly rollup tables) overlapping `[min, max]`.
+
+    `max` defaults to the current time.
+    """
+    hour = timedelta(hours=1)
+    min_hour = 0 if min is None or min < EPOCH else since_epoch(min) // hour
+    max_hour = since_epoch(max) // hour
+
+    return (min_hour, max_hour)
+
+
+def bucket_start(bucket: int, hours: int) -> datetime:
+    """Get the start of a time bucket of `hours` hours, numbered from the epoch (as in `hour / hours` in SQL)."""
+    return from_epoch(timedelta(hours=bucket * hours))
+
+
+class SnowflakeGenerator:
+    """Generate snowflake IDs locally, without a shared counter.
+
+    The lower 16 bits of an ID are split into a worker ID (upper `WORKER_BITS` bits) and a per-millisecond sequence number
+    (lower `SEQUENCE_BITS` bits), so generators with distinct worker IDs never produce the same ID. Worker ID 0 is reserved
+    for IDs generated by the `generate_id` stored procedure.
+
+    IDs from a single generator are strictly increasing: when the sequence of the current millisecond is exhausted or the
+    clock moves backwards, the generator borrows the next millisecond instead of blocking.
+    """
+
+    WORKER_BITS: ClassVar[int] = 6
+    SEQUENCE_BITS: ClassVar[int] = 10
+    __slots__ = ("__worker_id", "__timestamp", "__sequence", "__lock")
+    if TYPE_CHECKING:
+        __worker_id: int
+        __timestamp: int
+        __sequence: int
+        __lock: threading.Lock
+
+    def __init__(self, worker_id: int) -> None:
+        self.__worker_id = self.__check_worker_id(worker_id)
+        self.__timestamp = -1
+        self.__sequence = 0
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def __check_worker_id(cls, worker_id: int) -> int:
+        if not 0 < worker_id < 1 << cls.WORKER_BITS:
+            raise ValueError(f"Worker ID must be in range [1, {(1 << cls.WORKER_BITS) - 1}], got {worker_id}")
+
+        return worker_id
+
+    @property
+    def worker_id(self) -> int:
+        return self.__worker_id
+
+    def rebind(self, worker_id: int) -> None:
+        """Switch to another worker ID (e.g. after the lease was lost) without breaking monotonicity."""
+        with self.__lock:
+            self.__worker_id = self.__check_worker_id(worker_id)
+            self.__timestamp += 1
+            self.__sequence = 0
+
+    def generate(self) -> int:
+        with self.__lock:
+            timestamp = int(1000 * since_epoch().total_seconds())
+            if timestamp > self.__timestamp:
+                self.__timestamp = timestamp
+                self.__sequence = 0
+
+            else:
+                self.__sequence = (self.__sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self.__sequence == 0:
+                    self.__timestamp += 1
+
+            return (self.__timestamp << 16) | (self.__worker_id << self.SEQUENCE_BITS) | self.__sequence
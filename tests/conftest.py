@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import os
+
+
+# server.config reads these at import time. Tests never connect to a real database.
+for name, value in {
+    "PORT": "8000",
+    "MSSQL_HOST": "localhost",
+    "MSSQL_DATABASE": "test",
+    "MSSQL_USER": "test",
+    "MSSQL_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(name, value)
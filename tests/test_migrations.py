@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List
+
+import pytest
+from pyodbc import ProgrammingError  # type: ignore
+
+from server.migrations import migrate, migrations
+
+
+class FakeCursor:
+    """Run migrations against nothing. The script named `failing` raises an error only from its second result set."""
+
+    def __init__(self, failing: str) -> None:
+        self.failing = next(migration.sql for migration in migrations() if migration.name == failing)
+        self.executed: List[str] = []
+
+    async def __aenter__(self) -> FakeCursor:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def execute(self, sql: str, *params: Any) -> None:
+        self.executed.append(sql)
+
+    async def fetchall(self) -> List[Any]:
+        return []  # Nothing applied yet
+
+    async def fetchval(self) -> Any:
+        return 0  # Migration lock acquired
+
+    async def nextset(self) -> bool:
+        if self.executed[-1] == self.failing:
+            raise ProgrammingError("42S02", "[42S02] Invalid object name")
+
+        return False
+
+
+class FakePool:
+    def __init__(self, cursor: FakeCursor) -> None:
+        self.fake_cursor = cursor
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[FakePool]:
+        yield self
+
+    def cursor(self) -> FakeCursor:
+        return self.fake_cursor
+
+
+def test_error_in_later_result_set_is_not_recorded() -> None:
+    cursor = FakeCursor("schema.sql")
+    with pytest.raises(RuntimeError, match="schema.sql"):
+        asyncio.run(migrate(FakePool(cursor)))  # type: ignore[arg-type]
+
+    applied = cursor.executed.index(cursor.failing)
+    assert cursor.executed[applied - 1] == "BEGIN TRANSACTION"
+    assert "ROLLBACK TRANSACTION" in cursor.executed[applied + 1]
+    assert not any("INSERT INTO IT3930_Migrations" in sql for sql in cursor.executed)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from server import database
+from server.config import DB_READ_YOUR_WRITES_WINDOW, READ_PRIMARY_HEADER
+from server.database import Database
+from server.middleware import RECENT_WRITERS, ReadYourWritesMiddleware
+
+
+@pytest.fixture
+def reads(monkeypatch: pytest.MonkeyPatch) -> List[bool]:
+    """Whether each request to the test client would read from the primary."""
+    monkeypatch.setattr(Database, "replicated", property(lambda self: True))
+    RECENT_WRITERS.clear()
+    return []
+
+
+@pytest.fixture
+def client(reads: List[bool]) -> TestClient:
+    async def endpoint(request: Request) -> Response:
+        reads.append(database._READ_PRIMARY.get())
+        return Response(status_code=400 if "fail" in request.query_params else 200)
+
+    app = Starlette(routes=[Route("/", endpoint, methods=["GET", "POST"])])
+    app.add_middleware(ReadYourWritesMiddleware)
+    return TestClient(app)
+
+
+def auth(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_get_after_post_reads_from_primary(client: TestClient, reads: List[bool]) -> None:
+    assert client.get("/", headers=auth("a")).status_code == 200
+    assert client.post("/", headers=auth("a")).status_code == 200
+    client.get("/", headers=auth("a"))
+    client.get("/", headers=auth("b"))
+    client.get("/")
+
+    assert reads == [False, True, True, False, False]
+
+
+def test_failed_post_keeps_reading_from_replicas(client: TestClient, reads: List[bool]) -> None:
+    response = client.post("/?fail", headers=auth("a"))
+    client.get("/", headers=auth("a"))
+
+    assert READ_PRIMARY_HEADER not in response.headers
+    assert reads == [True, False]
+
+
+def test_echoed_header_reads_from_primary(client: TestClient, reads: List[bool]) -> None:
+    until = client.post("/").headers[READ_PRIMARY_HEADER]
+    assert 0 < float(until) - time.time() <= DB_READ_YOUR_WRITES_WINDOW
+
+    def get(until: Optional[str]) -> None:
+        client.get("/", headers={} if until is None else {READ_PRIMARY_HEADER: until})
+
+    get(until)
+    get(None)
+    get(str(time.time() - 1))
+    get(str(time.time() + 3600))
+    get("invalid")
+
+    assert reads == [True, True, False, False, False, False]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List, Optional, Set
+
+import pytest
+
+from server import retention
+from server.database import Database
+from server.retention import DetectedRetention
+from server.utils import snowflake_range, snowflake_time
+
+
+def month(id: int) -> datetime:
+    return snowflake_time(id).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class FakeDetected:
+    """IT3930_Detected and IT3930_DetectedArchive, partitioned by month like in `schema.sql`."""
+
+    def __init__(self, ids: List[int]) -> None:
+        self.detected: Set[int] = set(ids)
+        self.archived: Set[int] = set()
+        self.switched: List[datetime] = []
+        self.moved = 0
+        self.result: List[Any] = []
+
+    def cursor(self) -> FakeDetected:
+        return self
+
+    async def __aenter__(self) -> FakeDetected:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def execute(self, sql: str, *params: Any) -> None:
+        if "archive_detected" in sql:
+            # Whole partitions below @BeforeId, unless their archive partition is not empty
+            (before_id,) = params
+            months = sorted({month(id) for id in self.detected})
+            self.result = []
+            for start in months:
+                end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+                if snowflake_range(end, None)[0] <= before_id and not any(month(id) == start for id in self.archived):
+                    rows = {id for id in self.detected if month(id) == start}
+                    self.detected -= rows
+                    self.archived |= rows
+                    self.switched.append(start)
+                    self.result.append(SimpleNamespace(rows=len(rows)))
+
+        elif "purge_detected" in sql:
+            before_id, batch_size, archive = params
+            batch = sorted(id for id in self.detected if id < before_id)[:batch_size]
+            self.detected.difference_update(batch)
+            if archive:
+                self.archived.update(batch)
+
+            self.moved += len(batch)
+            self.result = [SimpleNamespace(purged=len(batch), last_id=batch[-1] if batch else None)]
+
+        else:
+            raise AssertionError(f"Unexpected statement {sql!r}")
+
+    async def fetchall(self) -> List[Any]:
+        return self.result
+
+
+def test_table_archive_switches_every_month(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Rows of a partially expired month must not be archived one by one, or that month could never be switched."""
+    day = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    database = FakeDetected([snowflake_range(day + timedelta(days=n), None)[0] for n in range(120)])
+    now: Optional[datetime] = None
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz: Any = None) -> FakeDatetime:
+            assert now is not None
+            return cls.fromtimestamp(now.timestamp(), tz)
+
+    @asynccontextmanager
+    async def session_lock(self: Database, resource: str) -> AsyncIterator[bool]:
+        yield True
+
+    @asynccontextmanager
+    async def acquire(self: Database, *, readonly: bool = False) -> AsyncIterator[FakeDetected]:
+        yield database
+
+    monkeypatch.setattr(Database, "session_lock", session_lock)
+    monkeypatch.setattr(Database, "acquire", acquire)
+    monkeypatch.setattr(retention, "datetime", FakeDatetime)
+    monkeypatch.setattr(retention, "DETECTED_RETENTION_ARCHIVE", "table")
+    monkeypatch.setattr(retention, "DETECTED_RETENTION_DAYS", 30)
+    monkeypatch.setattr(retention, "DETECTED_RETENTION_BATCH_DELAY", 0)
+
+    # Rows expire up to February 13th, then up to March 16th
+    now = datetime(2026, 3, 15, tzinfo=timezone.utc)
+    asyncio.run(DetectedRetention.instance.purge())
+    assert database.switched == [datetime(2026, 1, 1, tzinfo=timezone.utc)]
+
+    now = datetime(2026, 4, 15, tzinfo=timezone.utc)
+    asyncio.run(DetectedRetention.instance.purge())
+    assert database.switched == [datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 2, 1, tzinfo=timezone.utc)]
+
+    assert database.moved == 0
+    assert min(snowflake_time(id) for id in database.detected) >= datetime(2026, 3, 1, tzinfo=timezone.utc)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Set, Tuple
+
+import pytest
+from pyodbc import OperationalError  # type: ignore
+
+from server import database
+from server.database import Database
+from server.models import Detected, Violation
+
+
+class FakeConnection:
+    """A connection whose first statement times out on the client after the server has already executed it."""
+
+    def __init__(self) -> None:
+        self.executed: List[Tuple[Any, ...]] = []
+
+    def cursor(self) -> FakeConnection:
+        return self
+
+    async def __aenter__(self) -> FakeConnection:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def execute(self, sql: str, *params: Any) -> None:
+        self.executed.append(params)
+        if len(self.executed) == 1:
+            raise OperationalError("HYT00", "[HYT00] Query timeout expired")
+
+    async def fetchall(self) -> List[Any]:
+        return []
+
+
+@pytest.fixture
+def connection(monkeypatch: pytest.MonkeyPatch) -> FakeConnection:
+    connection = FakeConnection()
+    ids = itertools.count(1000)
+
+    @asynccontextmanager
+    async def acquire(self: Database, *, readonly: bool = False) -> AsyncIterator[FakeConnection]:
+        yield connection
+
+    monkeypatch.setattr(Database, "acquire", acquire)
+    monkeypatch.setattr(Database, "generate_id", lambda self: next(ids))
+    monkeypatch.setattr(database, "DB_RETRY_BASE_DELAY", 0)
+    return connection
+
+
+def test_replayed_insert_reuses_id(connection: FakeConnection) -> None:
+    id = asyncio.run(
+        Violation.create(creator_id=1, violation_category=0, vehicle_plate="29T100001", violation_fine_vnd=1, violation_video_url="x"),
+    )
+
+    assert len(connection.executed) == 2
+    assert connection.executed[0] == connection.executed[1]
+    assert connection.executed[1][-1] == id
+
+
+def test_replayed_batch_reuses_ids(connection: FakeConnection) -> None:
+    asyncio.run(Detected.create_many([(0, "29T100001", "x"), (1, "29T100002", "y")]))
+
+    assert len(connection.executed) == 2
+    assert connection.executed[0] == connection.executed[1]
+
+
+class FakePool:
+    """A connection pool that closes the connections in use once they are released, like aioodbc's."""
+
+    def __init__(self) -> None:
+        self.used: Set[FakeConnection] = set()
+        self.closing = False
+        self.closed = False
+        self.released = asyncio.Condition()
+
+    async def acquire(self) -> FakeConnection:
+        connection = FakeConnection()
+        self.used.add(connection)
+        return connection
+
+    async def release(self, connection: FakeConnection) -> None:
+        self.used.discard(connection)
+        async with self.released:
+            self.released.notify_all()
+
+    def close(self) -> None:
+        self.closing = True
+
+    async def wait_closed(self) -> None:
+        async with self.released:
+            await self.released.wait_for(lambda: not self.used)
+
+        self.closed = True
+
+
+def test_reconnect_does_not_wait_for_connections_in_use(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Replacing a broken pool must neither wait for long-running queries (e.g. exports) nor lease a worker ID again."""
+    pools: List[FakePool] = []
+
+    async def create_pool(**kwargs: Any) -> FakePool:
+        pools.append(FakePool())
+        return pools[-1]
+
+    async def connect(**kwargs: Any) -> None:
+        raise AssertionError("The worker ID lease must be kept")
+
+    monkeypatch.setattr(database.aioodbc, "create_pool", create_pool)
+    monkeypatch.setattr(database.aioodbc, "connect", connect)
+
+    async def main() -> None:
+        db = Database()
+        old = await create_pool()
+        db._Database__pool = old  # type: ignore[attr-defined]
+        db._Database__prepared.set()  # type: ignore[attr-defined]
+        generation = db.generation
+
+        async with db.acquire():
+            # Another query on the same pool loses its connection while this one streams an export
+            with pytest.raises(OperationalError):
+                async with db.acquire():
+                    raise OperationalError("08S01", "[08S01] Communication link failure")
+
+            await asyncio.wait_for(db.reconnect(generation), 1)
+            assert await db.pool() is pools[-1] is not old
+            assert old.closing and not old.closed
+            assert db.generation == generation + 1
+
+        await asyncio.sleep(0)
+        assert old.closed
+
+    asyncio.run(main())
+
+
+def test_stream_poll_retries(connection: FakeConnection) -> None:
+    """A transient error must not skip a poll of the detected violation stream for every subscriber."""
+    page = asyncio.run(Detected.since(0))
+
+    assert len(connection.executed) == 2
+    assert page.items == []
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from server import database
+from server.database import Database, DatabaseUnavailable
+from server.utils import SnowflakeGenerator
+
+
+def worker_id(id: int) -> int:
+    return (id >> SnowflakeGenerator.SEQUENCE_BITS) & ((1 << SnowflakeGenerator.WORKER_BITS) - 1)
+
+
+def test_generators_are_unique_and_increasing() -> None:
+    """Stress several generators (i.e. processes) from several threads each."""
+    generators = [SnowflakeGenerator(worker_id) for worker_id in range(1, 5)]
+    results: List[List[int]] = []
+    threads: List[threading.Thread] = []
+    for generator in generators:
+        for _ in range(4):
+            ids: List[int] = []
+            results.append(ids)
+            threads.append(threading.Thread(target=lambda g=generator, ids=ids: ids.extend(g.generate() for _ in range(20000))))
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    total = sum(len(ids) for ids in results)
+    assert len(set().union(*results)) == total
+    assert all(all(a < b for a, b in zip(ids, ids[1:])) for ids in results)
+
+
+def test_rebind_keeps_ids_increasing() -> None:
+    generator = SnowflakeGenerator(1)
+    before = [generator.generate() for _ in range(5000)]
+    generator.rebind(2)
+    after = [generator.generate() for _ in range(5000)]
+
+    ids = before + after
+    assert all(a < b for a, b in zip(ids, ids[1:]))
+    assert {worker_id(id) for id in after} == {2}
+
+
+class FakeServer:
+    """The session-owned application locks of a SQL Server instance."""
+
+    def __init__(self) -> None:
+        self.locks: Dict[str, FakeSession] = {}
+        self.sessions: List[FakeSession] = []
+
+    async def connect(self, **kwargs: Any) -> FakeSession:
+        session = FakeSession(self)
+        self.sessions.append(session)
+        return session
+
+
+class FakeSession:
+    """A connection whose session can be killed from the server side."""
+
+    def __init__(self, server: FakeServer) -> None:
+        self.server = server
+        self.alive = True
+        self.failing = False
+        self.result: Optional[Any] = None
+
+    def kill(self) -> None:
+        self.alive = False
+        for resource, owner in list(self.server.locks.items()):
+            if owner is self:
+                del self.server.locks[resource]
+
+    async def close(self) -> None:
+        self.kill()
+
+    def cursor(self) -> FakeSession:
+        return self
+
+    async def __aenter__(self) -> FakeSession:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def execute(self, sql: str, resource: str) -> None:
+        if self.failing:
+            raise TimeoutError("Query timeout expired")
+
+        if not self.alive:
+            raise ConnectionError("Communication link failure")
+
+        owner = self.server.locks.get(resource)
+        if "sp_getapplock" in sql:
+            if owner is None:
+                self.server.locks[resource] = self
+
+            self.result = 0 if self.server.locks[resource] is self else -1
+        elif "APPLOCK_MODE" in sql:
+            self.result = "Exclusive" if owner is self else "NoLock"
+        else:
+            raise AssertionError(f"Unexpected statement {sql!r}")
+
+    async def fetchval(self) -> Any:
+        return self.result
+
+
+def test_lost_lease_is_not_reused_concurrently(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A process whose lease session drops must stop generating IDs before another process starts using its worker ID."""
+    ttl = 0.3
+    server = FakeServer()
+    monkeypatch.setattr(database, "SNOWFLAKE_LEASE_TTL", ttl)
+    monkeypatch.setattr(database, "SNOWFLAKE_LEASE_CHECK_INTERVAL", ttl / 10)
+    monkeypatch.setattr(database.aioodbc, "connect", server.connect)
+
+    async def main() -> Tuple[List[Tuple[float, int]], List[Tuple[float, int]]]:
+        first, second = Database(), Database()
+        await first._Database__lease_worker_id()  # type: ignore[attr-defined]
+        first._Database__lease_watcher = asyncio.create_task(first._Database__watch_lease())  # type: ignore[attr-defined]
+
+        issued: Dict[Database, List[Tuple[float, int]]] = {first: [], second: []}
+
+        async def generate(db: Database, duration: float) -> None:
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                try:
+                    issued[db].append((time.monotonic(), db.generate_id()))
+                except (DatabaseUnavailable, RuntimeError):
+                    pass
+
+                await asyncio.sleep(0.001)
+
+        generating = asyncio.create_task(generate(first, 6 * ttl))
+        await asyncio.sleep(ttl)
+
+        # The lease session of the first process drops, and the second process leases the same worker ID right away
+        server.sessions[0].kill()
+        await asyncio.gather(generating, second._Database__lease_worker_id(), generate(second, 4 * ttl))  # type: ignore[attr-defined]
+
+        await first.close()
+        await second.close()
+        return issued[first], issued[second]
+
+    first, second = asyncio.run(main())
+
+    assert {worker_id(id) for _, id in second} == {1}
+    reused = [at for at, id in first if worker_id(id) == 1]
+    assert reused and max(reused) < min(at for at, _ in second)
+
+    # The first process leased another worker ID and went on
+    assert {worker_id(id) for _, id in first} == {1, 2}
+    ids = [id for _, id in first + second]
+    assert len(set(ids)) == len(ids)
+
+
+def test_failed_lease_checks_do_not_stop_ids(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Lease checks that fail under load must not fail inserts until the lease was last confirmed a TTL ago."""
+    ttl = 0.5
+    server = FakeServer()
+    monkeypatch.setattr(database, "SNOWFLAKE_LEASE_TTL", ttl)
+    monkeypatch.setattr(database, "SNOWFLAKE_LEASE_CHECK_INTERVAL", ttl / 10)
+    monkeypatch.setattr(database.aioodbc, "connect", server.connect)
+
+    async def main() -> None:
+        db = Database()
+        await db._Database__lease_worker_id()  # type: ignore[attr-defined]
+        db._Database__lease_watcher = asyncio.create_task(db._Database__watch_lease())  # type: ignore[attr-defined]
+
+        server.sessions[0].failing = True
+        end = time.monotonic() + ttl / 2
+        while time.monotonic() < end:
+            db.generate_id()
+            await asyncio.sleep(0.01)
+
+        server.sessions[0].failing = False
+        await asyncio.sleep(ttl)
+        assert worker_id(db.generate_id()) == 1
+        assert len(server.sessions) == 1
+
+        await db.close()
+
+    asyncio.run(main())